@@ -0,0 +1,375 @@
+"""Load test /validate against a fake Gemini endpoint and an SMTP sink.
+
+    python benchmark.py --sizes 20k,200k --concurrency 1,8,32 --requests 64 --latency 0.5
+    python benchmark.py ... --compare benchmarks/previous.json
+
+Generates synthetic .xaml / .bprelease files of the requested sizes (each
+request gets a unique file, so the review cache is not measuring itself),
+starts the API through server.py in a subprocess wired to the fakes, and
+drives it at fixed concurrency. Per scenario it reports RPS, end-to-end
+p50/p95/p99, p50/p95/p99 for every pipeline stage (from the timings=true
+breakdown) and the server's resident memory, and writes everything to a
+JSON file so runs can be compared.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+import httpx
+
+from fake_services import FakeGemini, SMTPSink
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TOOLS = {"uipath": ".xaml", "blueprism": ".bprelease"}
+
+
+# ===== synthetic workflows =====
+
+def make_xaml(target_bytes: int, seed: int) -> str:
+    rnd = random.Random(seed)
+    parts = [
+        '<Activity mc:Ignorable="sap sap2010" x:Class="Bench_%d" '
+        'xmlns="http://schemas.microsoft.com/netfx/2009/xaml/activities" '
+        'xmlns:ui="http://schemas.uipath.com/workflow/activities" '
+        'xmlns:x="http://schemas.microsoft.com/winfx/2006/xaml" '
+        'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+        'xmlns:sap="http://schemas.microsoft.com/netfx/2009/xaml/activities/presentation" '
+        'xmlns:sap2010="http://schemas.microsoft.com/netfx/2010/xaml/activities/presentation">\n'
+        '<Sequence DisplayName="Main" sap2010:WorkflowViewState.IdRef="Sequence_1">\n' % seed
+    ]
+    size, n = len(parts[0]), 0
+    while size < target_bytes:
+        n += 1
+        kind = rnd.choice(("assign", "click", "type", "log", "invoke"))
+        if kind == "assign":
+            part = (f'<Assign DisplayName="Assign {n}" sap2010:WorkflowViewState.IdRef="Assign_{n}">'
+                    f'<Assign.To><OutArgument x:TypeArguments="x:String">[var{n}]</OutArgument></Assign.To>'
+                    f'<Assign.Value><InArgument x:TypeArguments="x:String">"value {rnd.random():.6f}"'
+                    f'</InArgument></Assign.Value></Assign>\n')
+        elif kind in ("click", "type"):
+            tag = "ui:Click" if kind == "click" else "ui:TypeInto"
+            part = (f'<{tag} DisplayName="{kind.title()} {n}" sap2010:WorkflowViewState.IdRef="{kind}_{n}">'
+                    f'<ui:Target Selector="&lt;wnd app=\'app{n % 7}.exe\' /&gt;&lt;ctrl idx=\'{n}\' /&gt;" />'
+                    f'</{tag}>\n')
+        elif kind == "log":
+            part = f'<ui:LogMessage DisplayName="Log {n}" Level="Info" Message="[&quot;step {n}&quot;]" />\n'
+        else:
+            part = f'<ui:InvokeWorkflowFile DisplayName="Invoke {n}" WorkflowFileName="Sub\\Flow{n % 13}.xaml" />\n'
+        parts.append(part)
+        size += len(part)
+    parts.append("</Sequence>\n</Activity>\n")
+    return "".join(parts)
+
+
+def make_bprelease(target_bytes: int, seed: int) -> str:
+    rnd = random.Random(seed)
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<bpr:release xmlns:bpr="http://www.blueprism.co.uk/product/release">\n'
+        f'<bpr:name>Bench {seed}</bpr:name>\n<bpr:contents>\n'
+        f'<process name="Bench Process {seed}" version="1.0">\n'
+        '<subsheet subsheetid="main" type="Normal"><name>Main Page</name></subsheet>\n'
+    ]
+    size, n = len(parts[0]), 0
+    while size < target_bytes:
+        n += 1
+        kind = rnd.choice(("Calculation", "Action", "Decision", "Note"))
+        part = (f'<stage stageid="{n:08d}-0000-0000-0000-000000000000" name="{kind} {n}" type="{kind}">'
+                f'<subsheetid>main</subsheetid><display x="{rnd.randint(0, 900)}" y="{rnd.randint(0, 900)}" />'
+                f'<narrative>Step {n} {rnd.random():.6f}</narrative>'
+                f'<calculation expression="[Counter] + {n}" stage="Counter" /></stage>\n')
+        parts.append(part)
+        size += len(part)
+    parts.append("</process>\n</bpr:contents>\n</bpr:release>\n")
+    return "".join(parts)
+
+
+GENERATORS = {"uipath": make_xaml, "blueprism": make_bprelease}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {"k": 1024, "m": 1024 * 1024}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+# ===== measurement helpers =====
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 6)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "mean": round(sum(ordered) / len(ordered), 6)}
+
+
+def process_tree_rss(pid: int) -> int:
+    """Resident bytes of pid and its direct children (the server workers); 0 without /proc."""
+    total = 0
+    try:
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            if int(entry) == pid or int(fields[1]) == pid:
+                total += int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+    return total
+
+
+class MemorySampler:
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append(process_tree_rss(self.pid))
+            self._stop.wait(self.interval)
+
+    def summary(self) -> dict:
+        samples = [s for s in self.samples if s] or [0]
+        return {"rss_start": samples[0], "rss_peak": max(samples), "rss_end": samples[-1]}
+
+
+# ===== server under test =====
+
+def start_server(args, gemini: FakeGemini, smtp: SMTPSink, workdir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": HERE + os.pathsep + env.get("PYTHONPATH", ""),
+        "GEMINI_API_KEY": "fake",
+        "GEMINI_API_URL": f"{gemini.url}/v1beta/models/fake:generateContent",
+        "GEMINI_STREAM_URL": f"{gemini.url}/v1beta/models/fake:streamGenerateContent",
+        "GEMINI_API_MODEL": "fake",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp.server_address[1]),
+        "SMTP_STARTTLS": "0",
+        # Empty, not unset: load_config() would otherwise fill them in from .env and the
+        # server would try AUTH, which the sink doesn't speak
+        "SMTP_USER": "",
+        "SMTP_PASSWORD": "",
+        "EMAIL_FROM": "bench@example.com",
+        "CACHE_ENABLED": "1" if args.cache else "0",
+        "INCREMENTAL_REVIEW": "0",
+        "REVIEW_MODE": args.mode,
+    })
+    env.pop("MODEL_BACKENDS", None)
+    # Stores go to a scratch directory, not next to the real ones
+    cmd = [sys.executable, os.path.join(HERE, "server.py"), "--host", "127.0.0.1", "--port", str(args.port),
+           "--workers", str(args.workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=workdir, env=env)
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server under test did not become ready")
+
+
+# ===== load generation =====
+
+async def run_scenario(client: httpx.AsyncClient, server_pid: int, tool: str, size: int,
+                       concurrency: int, requests: int, email: bool, seed: int) -> dict:
+    generate = GENERATORS[tool]
+    # Built up front so file generation isn't timed
+    files = [(f"bench_{seed}_{i}{TOOLS[tool]}", generate(size, seed * 100000 + i)) for i in range(requests)]
+    latencies, stages, statuses = [], {}, {}
+    pending = iter(files)
+
+    async def worker():
+        for filename, content in pending:
+            data = {"timings": "true"}
+            if email:
+                data["to_emails"] = "bench@example.com"
+            start = time.perf_counter()
+            try:
+                resp = await client.post("/validate", data=data,
+                                         files={"file": (filename, content.encode("utf-8"), "application/xml")})
+                status = resp.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                resp = None
+            elapsed = time.perf_counter() - start
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+                for name, seconds in (resp.json().get("timings") or {}).items():
+                    stages.setdefault(name, []).append(seconds)
+
+    with MemorySampler(server_pid) as memory:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    return {
+        "name": f"{tool}-{size}-c{concurrency}",
+        "tool": tool,
+        "size": size,
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "status": statuses,
+        "wall_seconds": round(wall, 3),
+        "rps": round(len(latencies) / wall, 3) if wall else None,
+        "latency": percentiles(latencies),
+        "stages": {name: percentiles(values) for name, values in sorted(stages.items())},
+        "memory": memory.summary(),
+    }
+
+
+def compare(previous: dict, current: dict):
+    before = {s["name"]: s for s in previous.get("scenarios", [])}
+    print(f"\n{'scenario':<32}{'rps':>18}{'p50 (s)':>22}{'p95 (s)':>22}")
+    for s in current["scenarios"]:
+        old = before.get(s["name"])
+        if old is None:
+            continue
+
+        def delta(new, prev):
+            if not new or not prev:
+                return f"{new}"
+            return f"{new:.3f} ({(new - prev) / prev:+.0%})"
+
+        print(f"{s['name']:<32}{delta(s['rps'], old['rps']):>18}"
+              f"{delta(s['latency']['p50'], old['latency']['p50']):>22}"
+              f"{delta(s['latency']['p95'], old['latency']['p95']):>22}")
+
+
+async def wait_delivered(smtp: SMTPSink, expected: int, timeout: float = 30):
+    # The server sends from a background thread; give it time to flush before reading the sink
+    deadline = time.monotonic() + timeout
+    while smtp.stats["messages"] < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+
+
+async def run(args) -> dict:
+    gemini = FakeGemini(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate).start()
+    smtp = SMTPSink().start()
+    workdir = tempfile.mkdtemp(prefix="review-bench-")
+    server = start_server(args, gemini, smtp, workdir)
+
+    scenarios = []
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 4)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits,
+                                     timeout=args.timeout) as client:
+            await wait_ready(client)
+            seed = 1
+            for tool in args.tools:
+                for size in args.sizes:
+                    for concurrency in args.concurrency:
+                        result = await run_scenario(client, server.pid, tool, size, concurrency,
+                                                    args.requests, args.email, seed)
+                        seed += 1
+                        scenarios.append(result)
+                        lat = result["latency"]
+                        print(f"{result['name']:<32} ok={result['ok']}/{args.requests} rps={result['rps']} "
+                              f"p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} "
+                              f"rss_peak={result['memory']['rss_peak'] // (1024 * 1024)}MiB")
+            expected_emails = sum(s["ok"] for s in scenarios) if args.email else 0
+            await wait_delivered(smtp, expected_emails)
+    finally:
+        server.terminate()
+        try:
+            server.wait(30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        gemini.shutdown()
+        smtp.shutdown()
+
+    return {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "fake_gemini": gemini.stats,
+        "smtp_sink": smtp.stats,
+        "expected_emails": expected_emails,
+        "scenarios": scenarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /validate against local fakes")
+    parser.add_argument("--tools", default="uipath,blueprism", help="comma list of uipath, blueprism")
+    parser.add_argument("--sizes", default="20k,200k", help="comma list of file sizes (k/m suffix)")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma list of concurrent clients")
+    parser.add_argument("--requests", type=int, default=64, help="requests per scenario")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model mean latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--mode", default="llm", choices=("llm", "static", "hybrid"))
+    parser.add_argument("--email", action="store_true", help="send each report to the SMTP sink")
+    parser.add_argument("--cache", action="store_true", help="leave the review cache enabled")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--out", default=None, help="result file (default benchmarks/bench-<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier result file to diff against")
+    args = parser.parse_args()
+    args.tools = [t.strip() for t in args.tools.split(",") if t.strip()]
+    args.sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    for tool in args.tools:
+        if tool not in GENERATORS:
+            parser.error(f"unknown tool '{tool}'")
+
+    results = asyncio.run(run(args))
+
+    out = args.out or os.path.join("benchmarks", time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+    delivered = results["smtp_sink"]["messages"]
+    if delivered != results["expected_emails"]:
+        # Reviews still return 200 when delivery fails, so the sink is the only witness
+        print(f"EMAIL DELIVERY FAILED: {delivered} of {results['expected_emails']} messages reached the SMTP sink")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
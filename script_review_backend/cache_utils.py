@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from config import load_config
+
+load_config()
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "review_cache.sqlite3")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 7 * 24 * 3600))
+CACHE_MEMORY_ENTRIES = int(os.getenv("CACHE_MEMORY_ENTRIES", 256))
+CACHE_DISK_MAX_BYTES = int(os.getenv("CACHE_DISK_MAX_BYTES", 512 * 1024 * 1024))
+
+
+def normalize_content(content: str) -> str:
+    # Line endings and trailing whitespace differ between environments, not reviews
+    lines = (content or "").replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def make_cache_key(content: str, tool_type: str, model: str, prompt_version: str) -> str:
+    h = hashlib.sha256()
+    for part in (normalize_content(content), tool_type or "", model or "", prompt_version or ""):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class MemoryLRU:
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache:
+    def __init__(self, path: str, ttl: int, max_bytes: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS review_cache (
+                    key TEXT PRIMARY KEY,
+                    json_obj TEXT NOT NULL,
+                    excel BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_review_cache_accessed ON review_cache(accessed)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT json_obj, excel, created FROM review_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] + self.ttl < now:
+                conn.execute("DELETE FROM review_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE review_cache SET accessed = ? WHERE key = ?", (now, key))
+            return json.loads(row[0]), bytes(row[1])
+
+    def set(self, key: str, value):
+        json_obj, excel_bytes = value
+        payload = json.dumps(json_obj)
+        size = len(payload) + len(excel_bytes)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO review_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload, excel_bytes, size, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now: float):
+        conn.execute("DELETE FROM review_cache WHERE created < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM review_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until we're back under budget
+        for key, size in conn.execute("SELECT key, size FROM review_cache ORDER BY accessed").fetchall():
+            conn.execute("DELETE FROM review_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM review_cache")
+
+
+class ReviewCache:
+    """Two-tier (memory LRU + SQLite) cache of (json_obj, excel_bytes) per review key."""
+
+    def __init__(self, path: str = CACHE_DB_PATH, ttl: int = CACHE_TTL_SECONDS,
+                 memory_entries: int = CACHE_MEMORY_ENTRIES, disk_max_bytes: int = CACHE_DISK_MAX_BYTES):
+        self.memory = MemoryLRU(memory_entries, ttl)
+        self.disk = SQLiteCache(path, ttl, disk_max_bytes)
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        value = self.disk.get(key)
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, json_obj: dict, excel_bytes: bytes):
+        value = (json_obj, excel_bytes)
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ReviewCache()
+    return _cache
@@ -0,0 +1,327 @@
+import os
+from xml.parsers import expat
+
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", 60000))
+
+# Elements that form natural review boundaries
+UIPATH_BOUNDARIES = {"Sequence", "Flowchart", "StateMachine", "InvokeWorkflowFile"}
+BLUEPRISM_BOUNDARIES = {"process", "object"}
+
+
+class _Node:
+    __slots__ = ("name", "label", "start", "end", "children", "page")
+
+    def __init__(self, name, label, start):
+        self.name = name
+        self.label = label
+        self.start = start
+        self.end = start
+        self.children = []
+        self.page = None
+
+
+def local_name(name: str) -> str:
+    return name.rsplit(":", 1)[-1]
+
+
+def tag_end(data: bytes, pos: int) -> int:
+    # Index just past the '>' closing the tag that starts at pos (quote aware)
+    quote = None
+    for i in range(pos, len(data)):
+        c = data[i]
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in (0x22, 0x27):
+            quote = c
+        elif c == 0x3E:
+            return i + 1
+    return len(data)
+
+
+def element_end(data: bytes, start: int, index: int) -> int:
+    """End offset of an element given expat's CurrentByteIndex in its end handler.
+
+    For <a/> expat reports the offset just past "/>", for </a> the offset of "<".
+    """
+    if index == tag_end(data, start) and data[index - 2:index] == b"/>":
+        return index
+    return tag_end(data, index)
+
+
+def _parse_spans(data: bytes, tool_type: str):
+    """Single streaming pass with expat, keeping only boundary elements and their byte spans."""
+    blue_prism = tool_type == "Blue Prism"
+    boundaries = BLUEPRISM_BOUNDARIES if blue_prism else UIPATH_BOUNDARIES
+
+    root = _Node("root", "workflow", 0)
+    root.end = len(data)
+    stack = [root]          # open boundary (and BP stage) nodes
+    open_tags = []          # (local_name, node or None) for every open element
+    pages = {}              # BP subsheetid -> page name
+    text = []
+    state = {"subsheet": None}
+
+    parser = expat.ParserCreate(encoding="utf-8")
+
+    def start(name, attrs):
+        local = local_name(name)
+        node = None
+        if local in boundaries:
+            label = attrs.get("DisplayName") or attrs.get("name") or attrs.get("WorkflowFileName") or ""
+            node = _Node(local, f"{local} '{label}'" if label else local, parser.CurrentByteIndex)
+        elif blue_prism and local == "stage" and stack[-1].name in BLUEPRISM_BOUNDARIES:
+            node = _Node(local, attrs.get("name", ""), parser.CurrentByteIndex)
+        elif blue_prism and local == "subsheet":
+            state["subsheet"] = attrs.get("subsheetid")
+        if node is not None:
+            stack[-1].children.append(node)
+            stack.append(node)
+        open_tags.append((local, node))
+        text.clear()
+
+    def end(name):
+        local, node = open_tags.pop()
+        if blue_prism:
+            value = "".join(text).strip()
+            if local == "subsheetid" and stack[-1].name == "stage":
+                stack[-1].page = value
+            elif local == "name" and state["subsheet"] and open_tags and open_tags[-1][0] == "subsheet":
+                pages[state["subsheet"]] = value
+            elif local == "subsheet":
+                state["subsheet"] = None
+        text.clear()
+        if node is not None:
+            node.end = element_end(data, node.start, parser.CurrentByteIndex)
+            stack.pop()
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = text.append
+    parser.Parse(data, True)
+    return root, pages
+
+
+def _split_text(label: str, text: str, max_chars: int) -> list:
+    # Only for content that isn't XML at all: cut on line boundaries
+    if len(text) <= max_chars:
+        return [{"label": label, "content": text}]
+    chunks, buf, size = [], [], 0
+    lines = []
+    for line in text.splitlines(keepends=True):
+        lines.extend(line[i:i + max_chars] for i in range(0, len(line), max_chars))
+    for line in lines:
+        if buf and size + len(line) > max_chars:
+            chunks.append("".join(buf))
+            buf, size = [], 0
+        buf.append(line)
+        size += len(line)
+    if buf:
+        chunks.append("".join(buf))
+    return [{"label": f"{label} (part {i + 1}/{len(chunks)})", "content": c} for i, c in enumerate(chunks)]
+
+
+def _child_spans(data: bytes):
+    """(end of the root element's start tag, [(start, end, label)] of its direct children)."""
+    parser = expat.ParserCreate(encoding="utf-8")
+    state = {"depth": 0, "head": 0, "child": None}
+    children = []
+
+    def start(name, attrs):
+        state["depth"] += 1
+        if state["depth"] == 1:
+            state["head"] = tag_end(data, parser.CurrentByteIndex)
+        elif state["depth"] == 2:
+            local = local_name(name)
+            label = attrs.get("DisplayName") or attrs.get("name") or ""
+            state["child"] = (parser.CurrentByteIndex, f"{local} '{label}'" if label else local)
+
+    def end(name):
+        if state["depth"] == 2:
+            child_start, label = state["child"]
+            children.append((child_start, element_end(data, child_start, parser.CurrentByteIndex), label))
+        state["depth"] -= 1
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.Parse(data, True)
+    return state["head"], children
+
+
+def _group(label: str, pieces: list, max_chars: int, head: str = "", tail: str = "") -> list:
+    """Pack consecutive whole elements [(label, markup)] into chunks of at most max_chars,
+    each wrapped in head/tail (the parent's own start and end tags) so it stays well-formed.
+    A single element that is too big on its own is split with _split_element."""
+    room = max(max_chars - len(head) - len(tail), max_chars // 2)
+    out, buf, size = [], [], 0
+
+    def flush():
+        if buf:
+            out.append([head + "".join(buf) + tail])
+            buf.clear()
+
+    for piece_label, piece in pieces:
+        if len(piece) > room:
+            flush()
+            size = 0
+            out.extend(_split_element(f"{label}/{piece_label}", piece.strip(), max_chars))
+            continue
+        if buf and size + len(piece) > room:
+            flush()
+            size = 0
+        buf.append(piece)
+        size += len(piece)
+    flush()
+
+    groups = sum(1 for item in out if isinstance(item, list))
+    chunks, n = [], 0
+    for item in out:
+        if isinstance(item, list):
+            n += 1
+            chunks.append({"label": label if groups == 1 else f"{label} (part {n}/{groups})", "content": item[0]})
+        else:
+            chunks.append(item)
+    return chunks
+
+
+def _split_element(label: str, text: str, max_chars: int) -> list:
+    """Split one element's markup between its child elements, never inside a tag.
+
+    Every chunk is the element's start tag, a run of whole children and its end
+    tag. Children still over max_chars are split the same way; an element
+    without children is kept whole even if it is over the limit.
+    """
+    if len(text) <= max_chars:
+        return [{"label": label, "content": text}]
+    data = text.encode("utf-8")
+    try:
+        head_end, children = _child_spans(data)
+    except expat.ExpatError:
+        return _split_text(label, text, max_chars)
+    if not children:
+        return [{"label": label, "content": text}]
+    # Text between children travels with the child that follows it
+    pieces, pos = [], head_end
+    for start, end, child_label in children:
+        pieces.append((child_label, data[pos:end].decode("utf-8")))
+        pos = end
+    return _group(label, pieces, max_chars, data[:head_end].decode("utf-8"), data[pos:].decode("utf-8"))
+
+
+def _residual(data: bytes, node: _Node, removed: list) -> str:
+    # Parent markup with split-out children replaced by a short placeholder; adjacent
+    # children (e.g. the stages of a Blue Prism process) share one
+    runs = []
+    for child in removed:
+        if runs and not data[runs[-1][-1].end:child.start].strip():
+            runs[-1].append(child)
+        else:
+            runs.append([child])
+    parts, pos = [], node.start
+    for run in runs:
+        parts.append(data[pos:run[0].start].decode("utf-8"))
+        if len(run) == 1:
+            parts.append(f"<!-- split out: {run[0].label} -->")
+        else:
+            parts.append(f"<!-- split out: {run[0].label} ... {run[-1].label} ({len(run)} elements) -->")
+        pos = run[-1].end
+    parts.append(data[pos:node.end].decode("utf-8"))
+    return "".join(parts)
+
+
+def _emit(data: bytes, node: _Node, path: str, pages: dict, max_chars: int, out: list):
+    label = f"{path}/{node.label}" if path else node.label
+    child_path = "" if node.name == "root" else label
+    if node.end - node.start <= max_chars or not node.children:
+        out.extend(_split_element(label, data[node.start:node.end].decode("utf-8"), max_chars))
+        return
+
+    stages = [c for c in node.children if c.name == "stage"]
+    nested = [c for c in node.children if c.name != "stage"]
+
+    for child in nested:
+        _emit(data, child, child_path, pages, max_chars, out)
+
+    # Blue Prism: group a process/object's stages by page (subsheet)
+    by_page = {}
+    for stage in stages:
+        by_page.setdefault(stage.page, []).append(stage)
+    for page_id, members in by_page.items():
+        page_label = f"{child_path}/page '{pages.get(page_id, page_id or 'Main')}'"
+        # Stages are packed whole; the page is a list of stages, not one element
+        out.extend(_group(page_label, [(f"stage '{s.label}'", data[s.start:s.end].decode("utf-8")) for s in members],
+                          max_chars))
+
+    removed = sorted(node.children, key=lambda c: c.start)
+    rest = _residual(data, node, removed)
+    if rest.strip():
+        out.extend(_split_element(f"{label} (own activities)", rest, max_chars))
+
+
+def _pack(chunks: list, max_chars: int) -> list:
+    # Coalesce neighbouring small pieces so we don't spend a model call on each one
+    packed, labels = [], []
+    for chunk in chunks:
+        body = f"<!-- part: {chunk['label']} -->\n{chunk['content']}\n"
+        if packed and len(packed[-1]["content"]) + len(body) <= max_chars:
+            packed[-1]["content"] += body
+            labels[-1].append(chunk["label"])
+        else:
+            packed.append({"label": chunk["label"], "content": body})
+            labels.append([chunk["label"]])
+    for chunk, names in zip(packed, labels):
+        if len(names) > 1:
+            chunk["label"] = f"{names[0]} (+{len(names) - 1} more)"
+    return packed
+
+
+def chunk_workflow(content: str, tool_type: str, max_chars: int = CHUNK_MAX_CHARS) -> list:
+    """Split a workflow into [{"label", "content"}] along Sequence/Flowchart/InvokeWorkflowFile
+    (UiPath) or process/object/page (Blue Prism) boundaries, each at most max_chars."""
+    if len(content) <= max_chars:
+        return [{"label": "workflow", "content": content}]
+
+    # Leave room for the part headers _pack() adds
+    budget = max(max_chars - 256, max_chars // 2)
+    data = content.encode("utf-8")
+    try:
+        root, pages = _parse_spans(data, tool_type)
+    except expat.ExpatError:
+        return _pack(_split_text("workflow", content, budget), max_chars)
+
+    out = []
+    _emit(data, root, "", pages, budget, out)
+    return _pack(out, max_chars)
+
+
+def merge_results(tool_type: str, parts: list) -> dict:
+    """Merge per-chunk review dicts [(label, size, json_obj)] into one report.
+
+    Issues/recommendations are de-duplicated and tagged with the chunk they came
+    from; compliance_score is the size-weighted mean of the chunk scores.
+    """
+    issues, recs = [], []
+    seen_issues, seen_recs = set(), set()
+    weighted, total = 0.0, 0
+
+    for label, size, json_obj in parts:
+        for issue in json_obj.get("issues", []):
+            if issue not in seen_issues:
+                seen_issues.add(issue)
+                issues.append(f"[{label}] {issue}")
+        for rec in json_obj.get("recommendations", []):
+            if rec not in seen_recs:
+                seen_recs.add(rec)
+                recs.append(rec)
+        try:
+            weighted += float(json_obj.get("compliance_score")) * size
+            total += size
+        except (TypeError, ValueError):
+            pass
+
+    return {
+        "tool": tool_type,
+        "compliance_score": round(weighted / total) if total else 0,
+        "issues": issues,
+        "recommendations": recs,
+    }
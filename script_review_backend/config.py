@@ -0,0 +1,20 @@
+"""Process-wide configuration bootstrap.
+
+Modules read their settings from os.environ at import time; load_config()
+makes sure .env has been merged into the environment first, exactly once per
+process however many modules call it.
+"""
+_loaded = False
+
+
+def load_config(path: str = None):
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        # .env support is optional; plain environment variables still work
+        return
+    load_dotenv(path)
@@ -0,0 +1,114 @@
+"""Explicit caching of the prompt prefix shared by many review requests.
+
+Every review prompt starts with the same reviewer instructions, and files
+reviewed as one project also share a summary of that project. A
+SharedContext is that prefix. Backends with an explicit context-caching API
+(Gemini cachedContents) upload it once and send each request with only the
+workflow-specific part plus a handle; other backends just prepend it.
+Handles live in SQLite so every worker process and scan_project run reuses
+the same upload until it expires.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from config import load_config
+
+from cache_utils import CACHE_DB_PATH
+from minify_utils import estimate_tokens
+
+load_config()
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE", "1") == "1"
+CONTEXT_CACHE_DB_PATH = os.getenv("CONTEXT_CACHE_DB_PATH", CACHE_DB_PATH)
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", 3600))
+# Providers refuse to cache short prefixes (Gemini: 1024-4096 tokens depending on the model)
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", 1024))
+# A handle this close to expiry is replaced instead of used
+EXPIRY_MARGIN_SECONDS = 60
+
+
+class SharedContext:
+    """Prompt prefix common to many requests, identified by a digest of its text.
+
+    `cache_only` is appended when the prefix is uploaded as cached content but
+    left out when it has to be sent inline (e.g. a project summary: worth it once
+    per project, not with every file).
+    """
+
+    def __init__(self, text: str, cache_only: str = ""):
+        self.inline = text
+        self.cache_only = cache_only
+        self.text = text + cache_only
+        self.digest = hashlib.sha256(self.text.encode("utf-8")).hexdigest()[:32]
+        self.tokens = estimate_tokens(self.text)
+
+    @property
+    def cacheable(self) -> bool:
+        return CONTEXT_CACHE_ENABLED and self.tokens >= CONTEXT_CACHE_MIN_TOKENS
+
+
+def compose(prompt: str, context: SharedContext = None) -> str:
+    """The full prompt, for backends (or fallbacks) that can't reference a cached prefix."""
+    return context.inline + prompt if context is not None else prompt
+
+
+class ContextStore:
+    """Provider handles for uploaded shared contexts, per (digest, scope)."""
+
+    def __init__(self, path: str = CONTEXT_CACHE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS context_handles (
+                    digest TEXT NOT NULL,
+                    scope TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    PRIMARY KEY (digest, scope)
+                )"""
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, digest: str, scope: str):
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT name FROM context_handles WHERE digest = ? AND scope = ? AND expires > ?",
+                (digest, scope, time.time() + EXPIRY_MARGIN_SECONDS),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, digest: str, scope: str, name: str, expires: float):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM context_handles WHERE expires <= ?", (time.time(),))
+            conn.execute(
+                "INSERT OR REPLACE INTO context_handles VALUES (?, ?, ?, ?)", (digest, scope, name, expires)
+            )
+
+    def drop(self, digest: str, scope: str, name: str = None):
+        # With a name, only that handle: another worker may already have replaced it
+        with self._lock, self._connect() as conn:
+            if name is None:
+                conn.execute("DELETE FROM context_handles WHERE digest = ? AND scope = ?", (digest, scope))
+            else:
+                conn.execute(
+                    "DELETE FROM context_handles WHERE digest = ? AND scope = ? AND name = ?", (digest, scope, name)
+                )
+
+
+_store = None
+
+
+def get_context_store():
+    global _store
+    if not CONTEXT_CACHE_ENABLED:
+        return None
+    if _store is None:
+        _store = ContextStore()
+    return _store
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from xml.parsers import expat
+from config import load_config
+
+from chunk_utils import local_name, element_end
+
+load_config()
+
+INCREMENTAL_REVIEW = os.getenv("INCREMENTAL_REVIEW", "1") == "1"
+INCREMENTAL_MAX_CHANGED_RATIO = float(os.getenv("INCREMENTAL_MAX_CHANGED_RATIO", 0.5))
+VERSION_DB_PATH = os.getenv("VERSION_DB_PATH", "workflow_versions.sqlite3")
+
+
+class _Activity:
+    __slots__ = ("key", "start", "end", "children")
+
+    def __init__(self, key, start):
+        self.key = key
+        self.start = start
+        self.end = start
+        self.children = []
+
+
+def _activity_label(local: str, attrs: dict, tool_type: str):
+    # UiPath activities carry a DisplayName; Blue Prism's unit of work is the stage
+    if tool_type == "Blue Prism":
+        if local in ("stage", "process", "object", "subsheet"):
+            return f"{local} '{attrs.get('name') or attrs.get('subsheetid') or ''}'"
+        return None
+    if "DisplayName" in attrs:
+        return f"{local} '{attrs['DisplayName']}'"
+    return None
+
+
+def parse_activities(content: str, tool_type: str):
+    """Return (data, [activities]) with path keys and byte spans for every activity element."""
+    data = content.encode("utf-8")
+    root = _Activity("", 0)
+    root.end = len(data)
+    stack = [root]
+    open_tags = []
+    seen = {}
+
+    parser = expat.ParserCreate(encoding="utf-8")
+
+    def start(name, attrs):
+        label = _activity_label(local_name(name), attrs, tool_type)
+        if label is None:
+            open_tags.append(False)
+            return
+        parent = stack[-1]
+        base = f"{parent.key}/{label}" if parent.key else label
+        # Disambiguate identically named siblings
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        node = _Activity(f"{base}#{n}" if n else base, parser.CurrentByteIndex)
+        parent.children.append(node)
+        stack.append(node)
+        open_tags.append(True)
+
+    def end(name):
+        if open_tags.pop():
+            node = stack.pop()
+            node.end = element_end(data, node.start, parser.CurrentByteIndex)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.Parse(data, True)
+
+    # Markup outside any activity (arguments, imports, process header) is its own segment
+    root.key = "(root)"
+    activities = []
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        activities.append(node)
+        pending.extend(node.children)
+    return data, activities
+
+
+def own_content(data: bytes, node: _Activity) -> str:
+    # The activity's markup with nested activities cut out
+    parts, pos = [], node.start
+    for child in sorted(node.children, key=lambda c: c.start):
+        parts.append(data[pos:child.start].decode("utf-8"))
+        parts.append(f"<!-- {child.key.rsplit('/', 1)[-1]} -->")
+        pos = child.end
+    parts.append(data[pos:node.end].decode("utf-8"))
+    return "".join(parts)
+
+
+def segment_hashes(content: str, tool_type: str):
+    """{activity path: sha1 of its own markup} plus the parsed spans for later slicing."""
+    data, activities = parse_activities(content, tool_type)
+    hashes = {}
+    for node in activities:
+        hashes[node.key] = hashlib.sha1(own_content(data, node).encode("utf-8")).hexdigest()
+    return hashes, data, activities
+
+
+def diff_segments(old: dict, new: dict):
+    changed = [key for key, h in new.items() if old.get(key) != h]
+    removed = [key for key in old if key not in new]
+    return sorted(changed), sorted(removed)
+
+
+def changed_context(data: bytes, activities: list, changed: list) -> str:
+    """Changed activities, each with its path (the context) and its own markup."""
+    by_key = {node.key: node for node in activities}
+    parts = []
+    for key in changed:
+        parts.append(f"<!-- activity: {key} -->\n{own_content(data, by_key[key])}")
+    return "\n".join(parts)
+
+
+def merge_incremental(previous: dict, update: dict) -> dict:
+    """Previous findings minus the ones the model marked resolved, plus new findings."""
+    resolved = set(update.get("resolved_issues", []))
+    issues = [i for i in previous.get("issues", []) if i not in resolved]
+    for issue in update.get("issues", []):
+        if issue not in issues:
+            issues.append(issue)
+    recs = list(previous.get("recommendations", []))
+    for rec in update.get("recommendations", []):
+        if rec not in recs:
+            recs.append(rec)
+    return {
+        "tool": previous.get("tool") or update.get("tool"),
+        "compliance_score": update.get("compliance_score", previous.get("compliance_score")),
+        "issues": issues,
+        "recommendations": recs,
+    }
+
+
+class VersionStore:
+    """Last reviewed version (activity hashes + result) per workflow identity."""
+
+    def __init__(self, path: str = VERSION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS workflow_versions (
+                    workflow_id TEXT PRIMARY KEY,
+                    tag TEXT NOT NULL,
+                    segments TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, workflow_id: str, tag: str):
+        """tag = tool/model/prompt version; a mismatch means the old review can't be reused."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT segments, result FROM workflow_versions WHERE workflow_id = ? AND tag = ?",
+                (workflow_id, tag),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, workflow_id: str, tag: str, segments: dict, result: dict):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workflow_versions VALUES (?, ?, ?, ?, ?)",
+                (workflow_id, tag, json.dumps(segments), json.dumps(result), time.time()),
+            )
+
+
+_store = None
+
+
+def get_version_store():
+    global _store
+    if not INCREMENTAL_REVIEW:
+        return None
+    if _store is None:
+        _store = VersionStore()
+    return _store
@@ -1,65 +1,61 @@
-# import os
-# import smtplib
-# from email.message import EmailMessage
-# from dotenv import load_dotenv
-# load_dotenv()
+import os
+import time
+import queue
+import logging
+import threading
+from email.message import EmailMessage
+from config import load_config
 
-# SMTP_HOST = os.getenv("SMTP_HOST")
-# SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-# SMTP_USER = os.getenv("SMTP_USER")
-# SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
-# EMAIL_FROM = os.getenv("EMAIL_FROM", SMTP_USER)
+from metrics_utils import record, RETRIES
 
+load_config()
 
-# def send_email(to_email: str, subject: str, body: str, attachment_bytes: bytes, filename: str):
-#     print('send mail')
-#     msg = EmailMessage()
-#     msg["From"] = EMAIL_FROM
-#     msg["To"] = to_email
-#     msg["Subject"] = subject
-#     msg.set_content(body)
+logger = logging.getLogger(__name__)
 
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = os.getenv("SMTP_PORT")
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+EMAIL_FROM = os.getenv("EMAIL_FROM", SMTP_USER)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
 
-#     msg.add_attachment(
-#     attachment_bytes,
-#     maintype="application",
-#     subtype="vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-#     filename=filename,
-#     )
+# Background sender settings
+SMTP_SENDER_THREADS = int(os.getenv("SMTP_SENDER_THREADS", 2))
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", 20))
+SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", 4))
+SMTP_RETRY_BACKOFF = float(os.getenv("SMTP_RETRY_BACKOFF", 1.0))
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", 60))
 
+# smtplib is imported on first use: most workers never send mail before their first report
 
-#     with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-#         server.starttls()
-#         server.login(SMTP_USER, SMTP_PASSWORD)
-#         server.send_message(msg)
 
-import os
-import smtplib
-from email.message import EmailMessage
-from dotenv import load_dotenv
+def permanent_errors() -> tuple:
+    # Configuration problems (no STARTTLS / AUTH on the server, rejected credentials)
+    # fail the same way on every attempt. SMTPNotSupportedError is an OSError, so
+    # these have to be caught before transient_errors()
+    import smtplib
+    return (smtplib.SMTPNotSupportedError, smtplib.SMTPAuthenticationError)
 
-load_dotenv()
 
-SMTP_HOST = os.getenv("SMTP_HOST")
-SMTP_PORT = os.getenv("SMTP_PORT")
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+def transient_errors() -> tuple:
+    # Dropped connections / network failures are retried on a fresh connection
+    # (smtplib.SMTPException subclasses OSError, so response errors are handled first)
+    import smtplib
+    return (smtplib.SMTPServerDisconnected, OSError)
 
 
-def send_email(
+def build_message(
     to_list: list,
     cc_list: list,
-    bcc_list: list,
     subject: str,
     body: str,
     attachment_bytes: bytes,
-    filename: str
-):
-    print("send_email() function CALLED")
-
-    # Build email
+    filename: str,
+    mimetype: tuple = ("application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+) -> EmailMessage:
     msg = EmailMessage()
-    msg["From"] = SMTP_USER
+    msg["From"] = EMAIL_FROM
     msg["To"] = ", ".join(to_list)
 
     if cc_list:
@@ -71,16 +67,187 @@ def send_email(
     # Attachment
     msg.add_attachment(
         attachment_bytes,
-        maintype="application",
-        subtype="vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        maintype=mimetype[0],
+        subtype=mimetype[1],
         filename=filename,
     )
+    return msg
+
+
+def connect_smtp(host=None, port=None) -> "smtplib.SMTP":
+    import smtplib
+    server = smtplib.SMTP(host or SMTP_HOST, int(port or SMTP_PORT or 587), timeout=SMTP_TIMEOUT)
+    if SMTP_STARTTLS:
+        server.starttls()
+    if SMTP_USER and SMTP_PASSWORD:
+        server.login(SMTP_USER, SMTP_PASSWORD)
+    return server
+
+
+def send_email(
+    to_list: list,
+    cc_list: list,
+    bcc_list: list,
+    subject: str,
+    body: str,
+    attachment_bytes: bytes,
+    filename: str
+):
+    """Send one message synchronously on a fresh connection."""
+    logger.debug("send_email() function CALLED")
+
+    msg = build_message(to_list, cc_list, subject, body, attachment_bytes, filename)
 
     # All recipients
     recipients = to_list + cc_list + bcc_list
 
     # Send
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
+    with connect_smtp() as server:
         server.send_message(msg, to_addrs=recipients)
+
+
+class EmailSender:
+    """Background SMTP delivery.
+
+    Each worker thread keeps its own authenticated connection open between
+    messages, drains up to SMTP_BATCH_SIZE queued messages per wake-up, and
+    retries transient failures with exponential backoff.
+    """
+
+    def __init__(self, host=None, port=None, threads: int = SMTP_SENDER_THREADS,
+                 batch_size: int = SMTP_BATCH_SIZE, max_retries: int = SMTP_MAX_RETRIES,
+                 backoff: float = SMTP_RETRY_BACKOFF, idle_seconds: float = SMTP_IDLE_SECONDS):
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_seconds = idle_seconds
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0}
+        self._queue = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.threads):
+                t = threading.Thread(target=self._run, name=f"email-sender-{i}", daemon=True)
+                t.start()
+                self._workers.append(t)
+
+    def stop(self, timeout: float = 30):
+        # Pending messages are delivered before the workers exit
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(None)
+        for t in workers:
+            t.join(timeout)
+
+    def submit(self, msg: EmailMessage, recipients: list):
+        self.start()
+        self._bump("queued")
+        self._queue.put((msg, recipients))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _bump(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _run(self):
+        server = None
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_seconds)
+            except queue.Empty:
+                server = self._close(server)
+                continue
+
+            batch = [item]
+            while item is not None and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            for entry in batch:
+                if entry is None:
+                    self._close(server)
+                    return
+                server = self._deliver(server, *entry)
+
+    def _deliver(self, server, msg: EmailMessage, recipients: list):
+        import smtplib
+        for attempt in range(self.max_retries + 1):
+            try:
+                start = time.perf_counter()
+                if server is None:
+                    server = connect_smtp(self.host, self.port)
+                server.send_message(msg, to_addrs=recipients)
+                record("smtp", time.perf_counter() - start)
+                self._bump("sent")
+                return server
+            except smtplib.SMTPRecipientsRefused as e:
+                error = e
+                break
+            except permanent_errors() as e:
+                server = self._close(server)
+                error = e
+                break
+            except smtplib.SMTPResponseException as e:
+                # 4xx = try again later, 5xx = permanent
+                server = self._close(server)
+                error = e
+                if not 400 <= e.smtp_code < 500:
+                    break
+            except transient_errors() as e:
+                server = self._close(server)
+                error = e
+            if attempt < self.max_retries:
+                self._bump("retries")
+                RETRIES.labels("smtp").inc()
+                time.sleep(self.backoff * (2 ** attempt))
+
+        self._bump("failed")
+        logger.error("Email to %s failed: %s", ", ".join(recipients), error)
+        return server
+
+    @staticmethod
+    def _close(server):
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        return None
+
+
+_sender = None
+
+
+def get_sender() -> EmailSender:
+    global _sender
+    if _sender is None:
+        _sender = EmailSender()
+    return _sender
+
+
+def queue_email(
+    to_list: list,
+    cc_list: list,
+    bcc_list: list,
+    subject: str,
+    body: str,
+    attachment_bytes: bytes,
+    filename: str,
+    mimetype: tuple = ("application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+):
+    """Hand a message to the background sender and return immediately."""
+    msg = build_message(to_list, cc_list, subject, body, attachment_bytes, filename, mimetype)
+    get_sender().submit(msg, to_list + cc_list + bcc_list)
@@ -1,39 +1,131 @@
-import pandas as pd
+import io
+import re
+import csv
+import json
+from itertools import zip_longest
 
-def write_results_to_excel(json_obj: dict, out_path):
+RESULT_COLUMNS = ["Tool", "Compliance Score", "Issue", "Recommendation"]
+SUMMARY_COLUMNS = ["File", "Tool", "Compliance Score", "Issues", "Recommendations", "Error"]
+
+REPORT_FORMATS = {
+    "xlsx": ("application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("text", "csv"),
+    "json": ("application", "json"),
+}
+
+
+def _result_rows(json_obj: dict):
+    """Yield one row per issue/recommendation pair; tool + score only on the first row."""
     tool = json_obj.get("tool")
     score = json_obj.get("compliance_score")
     issues = json_obj.get("issues", [])
     recs = json_obj.get("recommendations", [])
 
-    # Determine how many rows needed
-    max_len = max(len(issues), len(recs))
+    if not issues and not recs:
+        yield [tool, score, "", ""]
+        return
 
-    # Pad the lists so they align row-by-row
-    issues = issues + [""] * (max_len - len(issues))
-    recs = recs + [""] * (max_len - len(recs))
+    for i, (issue, rec) in enumerate(zip_longest(issues, recs, fillvalue="")):
+        if i == 0:
+            yield [tool, score, issue, rec]
+        else:
+            yield ["", "", issue, rec]
 
-    rows = []
 
-    for i in range(max_len):
-        if i == 0:
-            # Fill tool + score ONLY in the first row
-            rows.append({
-                "Tool": tool,
-                "Compliance Score": score,
-                "Issue": issues[i],
-                "Recommendation": recs[i]
-            })
+def _summary_row(item: dict) -> list:
+    json_obj = item.get("result") or {}
+    return [
+        item.get("filename"),
+        json_obj.get("tool", ""),
+        json_obj.get("compliance_score", ""),
+        len(json_obj.get("issues", [])),
+        len(json_obj.get("recommendations", [])),
+        item.get("error", ""),
+    ]
+
+
+def _sheet_name(filename: str, used: set) -> str:
+    # Excel sheet names: max 31 chars, no []:*?/\ and unique per workbook
+    base = re.sub(r"[\[\]:*?/\\]", "_", (filename or "Sheet").rsplit("/", 1)[-1])[:31] or "Sheet"
+    name, n = base, 1
+    while name.lower() in used or name.lower() == "summary":
+        suffix = f"~{n}"
+        name = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(name.lower())
+    return name
+
+
+def _write_sheet(workbook, name: str, header: list, rows):
+    # constant_memory mode flushes each row as soon as the next one starts
+    sheet = workbook.add_worksheet(name)
+    bold = workbook.add_format({"bold": True})
+    sheet.write_row(0, 0, header, bold)
+    for r, row in enumerate(rows, start=1):
+        sheet.write_row(r, 0, row)
+
+
+def _workbook(out_path):
+    # Imported on first report so API workers don't pay for it at startup
+    import xlsxwriter
+    return xlsxwriter.Workbook(out_path, {"constant_memory": True})
+
+
+def write_results_to_excel(json_obj: dict, out_path):
+    workbook = _workbook(out_path)
+    _write_sheet(workbook, "Results", RESULT_COLUMNS, _result_rows(json_obj))
+    workbook.close()
+
+
+def write_batch_results_to_excel(results: list, out_path):
+    """results: [{"filename", "result"} or {"filename", "error"}] -> Summary + one sheet per file."""
+    workbook = _workbook(out_path)
+    _write_sheet(workbook, "Summary", SUMMARY_COLUMNS, (_summary_row(item) for item in results))
+
+    used = set()
+    for item in results:
+        if "result" in item:
+            _write_sheet(workbook, _sheet_name(item.get("filename"), used), RESULT_COLUMNS,
+                         _result_rows(item["result"]))
+    workbook.close()
+
+
+def write_results_to_csv(json_obj: dict, out):
+    writer = csv.writer(out)
+    writer.writerow(RESULT_COLUMNS)
+    writer.writerows(_result_rows(json_obj))
+
+
+def write_batch_results_to_csv(results: list, out):
+    # One flat table: File column + the per-file result rows (errors get a single row)
+    writer = csv.writer(out)
+    writer.writerow(["File"] + RESULT_COLUMNS + ["Error"])
+    for item in results:
+        if "result" in item:
+            writer.writerows([item.get("filename")] + row + [""] for row in _result_rows(item["result"]))
         else:
-            # Leave tool + score empty for remaining rows
-            rows.append({
-                "Tool": "",
-                "Compliance Score": "",
-                "Issue": issues[i],
-                "Recommendation": recs[i]
-            })
-
-    df = pd.DataFrame(rows)
-
-    with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Results")
+            writer.writerow([item.get("filename"), "", "", "", "", item.get("error", "")])
+
+
+def report_bytes(data, fmt: str = "xlsx", batch: bool = False) -> bytes:
+    """Render a single result (or a batch result list) as xlsx, csv or json bytes."""
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format '{fmt}' (expected one of {', '.join(REPORT_FORMATS)})")
+
+    if fmt == "json":
+        return json.dumps(data, indent=2).encode("utf-8")
+
+    if fmt == "csv":
+        out = io.StringIO(newline="")
+        if batch:
+            write_batch_results_to_csv(data, out)
+        else:
+            write_results_to_csv(data, out)
+        return out.getvalue().encode("utf-8")
+
+    out = io.BytesIO()
+    if batch:
+        write_batch_results_to_excel(data, out_path=out)
+    else:
+        write_results_to_excel(data, out_path=out)
+    return out.getvalue()
@@ -0,0 +1,308 @@
+"""Local stand-ins for Gemini and SMTP, for benchmarks and offline runs.
+
+    python fake_services.py --gemini-port 8765 --smtp-port 8025 --latency 0.8 --failure-rate 0.02
+
+FakeGemini answers generateContent / streamGenerateContent (and the
+OpenAI-compatible /v1/chat/completions) with a fixed, valid review after a
+tunable latency, and fails a tunable share of calls with 429 or 503. It also
+implements the cachedContents API (create / get / delete, referenced via
+"cachedContent" on generate calls, 404 once expired) and can charge a prefill
+delay per 1000 uncached prompt characters, so context caching shows up in
+token counts and time-to-first-token.
+SMTPSink accepts and counts messages without delivering them.
+"""
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_REVIEW = {
+    "tool": "UiPath",
+    "compliance_score": 72,
+    "issues": [
+        "Hard-coded credentials in Assign activity",
+        "No Try Catch around application interactions",
+        "Selectors use volatile idx attributes",
+    ],
+    "recommendations": [
+        "Move credentials to Orchestrator assets",
+        "Wrap UI automation in Try Catch with retry scope",
+        "Anchor selectors on stable attributes",
+    ],
+}
+
+
+class FakeGemini(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5,
+                 jitter: float = 0.2, failure_rate: float = 0.0, chunks: int = 8,
+                 prefill: float = 0.0, min_cache_tokens: int = 0):
+        super().__init__((host, port), _GeminiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.chunks = chunks
+        self.prefill = prefill                      # seconds per 1000 uncached prompt chars
+        self.min_cache_tokens = min_cache_tokens    # the real API refuses to cache short prefixes
+        self.caches = {}                            # name -> (text, expires)
+        self.stats = {"calls": 0, "failures": 0, "prompt_chars": 0,
+                      "cache_creates": 0, "cached_calls": 0, "cached_chars": 0, "cache_misses": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def bump(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def delay(self, prompt_chars: int = 0) -> float:
+        return max(0.0, random.gauss(self.latency, self.jitter)) + self.prefill * prompt_chars / 1000
+
+    def cached_text(self, name: str):
+        with self._lock:
+            entry = self.caches.get(name)
+            if entry and entry[1] <= time.time():
+                del self.caches[name]
+                entry = None
+        return entry[0] if entry else None
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-gemini", daemon=True).start()
+        return self
+
+
+class _GeminiHandler(BaseHTTPRequestHandler):
+    server: FakeGemini
+    # Keep-alive, like the real endpoint, so the client's connection pool is exercised
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        server = self.server
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            request = {}
+        prompt = "".join(p.get("text", "") for c in request.get("contents", []) for p in c.get("parts", []))
+        prompt += "".join(m.get("content", "") for m in request.get("messages", []))
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/cachedContents"):
+            self._create_cache(request, prompt)
+            return
+
+        server.bump("calls")
+        server.bump("prompt_chars", len(prompt))
+        cached = ""
+        if request.get("cachedContent"):
+            cached = server.cached_text(request["cachedContent"])
+            if cached is None:
+                server.bump("cache_misses")
+                self._error(404, "NOT_FOUND", f"CachedContent not found: {request['cachedContent']}")
+                return
+            server.bump("cached_calls")
+            server.bump("cached_chars", len(cached))
+
+        time.sleep(server.delay(len(prompt)))
+        if random.random() < server.failure_rate:
+            server.bump("failures")
+            status = random.choice((429, 503))
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        text = json.dumps(FAKE_REVIEW)
+        # Like the real API, promptTokenCount includes the cached tokens
+        usage = {"promptTokenCount": (len(cached) + len(prompt)) // 4, "candidatesTokenCount": len(text) // 4}
+        if cached:
+            usage["cachedContentTokenCount"] = len(cached) // 4
+        if path.endswith("/chat/completions"):
+            self._openai(request, text, usage)
+        elif ":streamGenerateContent" in path:
+            self._stream(text, usage)
+        else:
+            self._json({"candidates": [{"content": {"parts": [{"text": text}]}}], "usageMetadata": usage})
+
+    def _create_cache(self, request: dict, text: str):
+        server = self.server
+        if len(text) // 4 < server.min_cache_tokens:
+            self._error(400, "INVALID_ARGUMENT",
+                        f"Cached content is too small, min_total_token_count={server.min_cache_tokens}")
+            return
+        ttl = float(str(request.get("ttl", "3600s")).rstrip("s"))
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        with server._lock:
+            server.caches[name] = (text, time.time() + ttl)
+        server.bump("cache_creates")
+        self._json({
+            "name": name,
+            "model": request.get("model"),
+            "expireTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl)),
+            "usageMetadata": {"totalTokenCount": len(text) // 4},
+        })
+
+    def _cache_name(self) -> str:
+        path = self.path.split("?", 1)[0]
+        return path[path.find("cachedContents/"):] if "cachedContents/" in path else ""
+
+    def do_GET(self):
+        name = self._cache_name()
+        text = self.server.cached_text(name) if name else None
+        if text is None:
+            self._error(404, "NOT_FOUND", f"CachedContent not found: {name}")
+            return
+        self._json({"name": name, "usageMetadata": {"totalTokenCount": len(text) // 4}})
+
+    def do_DELETE(self):
+        name = self._cache_name()
+        with self.server._lock:
+            found = self.server.caches.pop(name, None)
+        if found is None:
+            self._error(404, "NOT_FOUND", f"CachedContent not found: {name}")
+            return
+        self._json({})
+
+    def _error(self, status: int, reason: str, message: str):
+        self._json({"error": {"code": status, "message": message, "status": reason}}, status)
+
+    def _json(self, obj: dict, status: int = 200):
+        payload = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, text: str, usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        step = max(1, len(text) // self.server.chunks)
+        for i in range(0, len(text), step):
+            event = {"candidates": [{"content": {"parts": [{"text": text[i:i + step]}]}}], "usageMetadata": usage}
+            self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+        self.close_connection = True
+
+    def _openai(self, request: dict, text: str, usage: dict):
+        usage = {"prompt_tokens": usage["promptTokenCount"], "completion_tokens": usage["candidatesTokenCount"]}
+        if not request.get("stream"):
+            self._json({"choices": [{"message": {"content": text}}], "usage": usage})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        step = max(1, len(text) // self.server.chunks)
+        for i in range(0, len(text), step):
+            event = {"choices": [{"delta": {"content": text[i:i + step]}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server: speaks enough of RFC 5321 for smtplib, keeps counts only."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _SMTPHandler)
+        self.stats = {"messages": 0, "recipients": 0, "bytes": 0, "connections": 0}
+        self._lock = threading.Lock()
+
+    def bump(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="smtp-sink", daemon=True).start()
+        return self
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    server: SMTPSink
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        self.server.bump("connections")
+        self.reply("220 smtp-sink ready")
+        recipients = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250-smtp-sink")
+                self.reply("250 SIZE 104857600")
+            elif command.startswith("MAIL"):
+                recipients = 0
+                self.reply("250 OK")
+            elif command.startswith("RCPT"):
+                recipients += 1
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    size += len(data)
+                self.server.bump("messages")
+                self.server.bump("recipients", recipients)
+                self.server.bump("bytes", size)
+                self.reply("250 OK queued")
+            elif command in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Gemini endpoint and an SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--gemini-port", type=int, default=8765)
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of calls answered 429/503")
+    parser.add_argument("--prefill", type=float, default=0.0, help="extra seconds per 1000 uncached prompt chars")
+    parser.add_argument("--min-cache-tokens", type=int, default=0, help="smallest prefix cachedContents accepts")
+    args = parser.parse_args()
+
+    gemini = FakeGemini(args.host, args.gemini_port, args.latency, args.jitter, args.failure_rate,
+                        prefill=args.prefill, min_cache_tokens=args.min_cache_tokens).start()
+    smtp = SMTPSink(args.host, args.smtp_port).start()
+    print(f"GEMINI_API_URL={gemini.url}/v1beta/models/fake:generateContent")
+    print(f"SMTP_HOST={args.host} SMTP_PORT={args.smtp_port} SMTP_STARTTLS=0")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"gemini={gemini.stats} smtp={smtp.stats}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 def detect_tool_type(filename: str, content:str) -> str:
-    print("Inside file utils")
+    logger.debug("Inside file utils")
     name = (filename or "").lower()
     content = (content or "").lower()
 
@@ -12,18 +15,126 @@ def detect_tool_type(filename: str, content:str) -> str:
 
     return "Incorrect file"
 
-def extract_json_from_text(text: str) -> dict:
-    start = text.find("{")
-    if start == -1:
-        raise ValueError("JSON not found")
+STREAMED_ARRAYS = ("issues", "recommendations")
+
+
+class JSONStreamParser:
+    """Incremental, string-aware scanner for the first JSON object in model output.
+
+    feed() can be called with arbitrary text fragments; it returns the events
+    completed by that fragment:
+      ("item", key, value)  - one element of the "issues"/"recommendations" arrays
+      ("field", key, value) - any other top-level value
+      ("done", None, obj)   - the whole object, once its closing brace arrives
+    Each character is scanned once, and braces/brackets inside strings are ignored.
+    """
+
+    def __init__(self, arrays=STREAMED_ARRAYS):
+        self.arrays = set(arrays)
+        self.text = []
+        self.pos = 0
+        self.start = None
+        self.depth = 0
+        self.in_str = False
+        self.escape = False
+        self.str_start = None
+        self.key = None
+        self.in_value = False      # depth-1 parser is past the ':' of a key
+        self.value_start = None
+        self.in_array = False      # inside one of self.arrays
+        self.item_start = None
+        self.result = None
+
+    def _slice(self, a, b):
+        return "".join(self.text[a:b])
+
+    def _emit(self, events, kind, key, raw):
+        try:
+            events.append((kind, key, json.loads(raw)))
+        except ValueError:
+            pass
 
+    def feed(self, fragment: str) -> list:
+        events = []
+        if self.result is not None:
+            return events
+        self.text.extend(fragment)
 
-    stack = 0
-    for i in range(start, len(text)):
-        if text[i] == "{": stack += 1
-        elif text[i] == "}": stack -= 1
-        if stack == 0:
-            return json.loads(text[start:i+1])
+        for i in range(self.pos, len(self.text)):
+            c = self.text[i]
 
+            if self.start is None:
+                if c == "{":
+                    self.start, self.depth = i, 1
+                continue
 
-    raise ValueError("Unbalanced JSON")
\ No newline at end of file
+            if self.in_str:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_str = False
+                    if self.depth == 1 and not self.in_value:
+                        self.key = json.loads(self._slice(self.str_start, i + 1))
+                continue
+
+            if c.isspace():
+                continue
+
+            # First character of a top-level value / array element
+            if c not in ",:]}":
+                if self.depth == 1 and self.in_value and self.value_start is None:
+                    self.value_start = i
+                elif self.depth == 2 and self.in_array and self.item_start is None:
+                    self.item_start = i
+
+            if c == '"':
+                self.in_str, self.str_start = True, i
+            elif c in "{[":
+                if self.depth == 1 and c == "[" and self.key in self.arrays:
+                    self.in_array = True
+                self.depth += 1
+            elif c in "}]":
+                if self.depth == 2 and self.in_array and self.item_start is not None:
+                    self._emit(events, "item", self.key, self._slice(self.item_start, i))
+                    self.item_start = None
+                if self.depth == 1 and self.value_start is not None:
+                    self._emit(events, "field", self.key, self._slice(self.value_start, i))
+                    self.value_start = None
+                self.depth -= 1
+                if self.depth == 1:
+                    if self.in_array:
+                        self.in_array = False
+                    elif self.value_start is not None:
+                        self._emit(events, "field", self.key, self._slice(self.value_start, i + 1))
+                    self.value_start = None
+                elif self.depth == 0:
+                    self.result = json.loads(self._slice(self.start, i + 1))
+                    events.append(("done", None, self.result))
+                    self.pos = i + 1
+                    return events
+            elif c == ",":
+                if self.depth == 1:
+                    if self.value_start is not None:
+                        self._emit(events, "field", self.key, self._slice(self.value_start, i))
+                        self.value_start = None
+                    self.in_value = False
+                elif self.depth == 2 and self.in_array and self.item_start is not None:
+                    self._emit(events, "item", self.key, self._slice(self.item_start, i))
+                    self.item_start = None
+            elif c == ":" and self.depth == 1:
+                self.in_value = True
+
+        self.pos = len(self.text)
+        return events
+
+
+def extract_json_from_text(text: str) -> dict:
+    parser = JSONStreamParser()
+    parser.feed(text)
+    if parser.result is not None:
+        return parser.result
+    if parser.start is None:
+        raise ValueError("JSON not found")
+    raise ValueError("Unbalanced JSON")
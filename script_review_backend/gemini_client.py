@@ -1,18 +1,37 @@
 import os 
 import json
-import requests
+import asyncio
 import logging
-from dotenv import load_dotenv
+from config import load_config
 
-load_dotenv()
+from metrics_utils import TOKENS
+
+load_config()
 
 logger = logging.getLogger(__name__)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_API_MODEL = os.getenv("GEMINI_API_MODEL")
+GEMINI_API_MODEL = os.getenv("GEMINI_API_MODEL", os.getenv("GEMINI_MODEL"))
 GEMINI_API_URL = os.getenv("GEMINI_API_URL")
+GEMINI_STREAM_URL = os.getenv(
+    "GEMINI_STREAM_URL",
+    (GEMINI_API_URL or "").replace(":generateContent", ":streamGenerateContent"),
+)
+
+# Connection pool / concurrency settings for the shared HTTP client
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", 50))
+GEMINI_MAX_KEEPALIVE = int(os.getenv("GEMINI_MAX_KEEPALIVE", 20))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 32))
+# Server worker processes (set by server.py); the concurrency budget is shared between them
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", 10))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", 120))
+
+# Bump whenever REVIEW_INSTRUCTIONS / WORKFLOW_SECTION change so cached reviews are invalidated
+PROMPT_VERSION = "2"
 
-PROMPT_TEMPLATE = """
+# The same for every file of a tool; sent as a cached shared prefix where the backend supports it
+REVIEW_INSTRUCTIONS = """
 You are an expert RPA code reviewer specializing in %s development.
 Analyze the following workflow file.
 
@@ -23,42 +42,185 @@ Respond ONLY with valid JSON in this exact schema:
   "issues": ["issue1", "issue2"],
   "recommendations": ["rec1", "rec2"]
 }
+"""
 
+# The per-request part
+WORKFLOW_SECTION = """
 Workflow content:
 %s
 """
 
-def call_gemini_api(prompt: str) -> str:
-    print('Inside Gemini client')
-    if not GEMINI_API_KEY or not GEMINI_API_URL:
+# Follow-up review of a new version: only changed activities are sent
+INCREMENTAL_PROMPT_TEMPLATE = """
+You are an expert RPA code reviewer specializing in %s development.
+A previous version of this workflow was already reviewed:
+- previous compliance_score: %s
+- previous issues: %s
+
+Only the activities below changed (each is preceded by its path in the workflow;
+nested activities are shown as placeholder comments). Removed activities: %s
+
+Review ONLY these changes. Respond ONLY with valid JSON in this exact schema:
+{
+  "tool": "<UiPath or Blue Prism>",
+  "compliance_score": 0,
+  "issues": ["new issue introduced by the changes"],
+  "recommendations": ["rec1"],
+  "resolved_issues": ["previous issue text that no longer applies, copied verbatim"]
+}
+compliance_score is the updated score for the WHOLE workflow.
+
+Changed activities:
+%s
+"""
+
+
+def cached_contents_url(api_url: str):
+    # .../v1beta/models/<model>:generateContent -> .../v1beta/cachedContents
+    base, sep, _ = (api_url or "").partition("/models/")
+    return f"{base}/cachedContents" if sep else None
+
+
+def model_resource(api_url: str, model: str = None):
+    """"models/<name>" as cachedContents expects it, from the model setting or the endpoint URL."""
+    if not model:
+        _, sep, rest = (api_url or "").partition("/models/")
+        model = rest.split(":", 1)[0] if sep else None
+    if not model:
+        return None
+    return model if model.startswith("models/") else f"models/{model}"
+
+
+GEMINI_CACHE_URL = os.getenv("GEMINI_CACHE_URL", cached_contents_url(GEMINI_API_URL))
+
+_client = None
+_semaphore = None
+
+
+def get_client() -> "httpx.AsyncClient":
+    # One pooled client per process so connections are kept alive between calls
+    global _client
+    if _client is None or _client.is_closed:
+        # Deferred to the first model call; main.warm_imports() usually loads it earlier
+        import httpx
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=GEMINI_MAX_CONNECTIONS,
+                max_keepalive_connections=GEMINI_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(GEMINI_READ_TIMEOUT, connect=GEMINI_CONNECT_TIMEOUT),
+        )
+    return _client
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, GEMINI_MAX_CONCURRENCY // WEB_CONCURRENCY))
+    return _semaphore
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _payload(prompt: str, cached_content: str = None) -> dict:
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if cached_content:
+        # The cached prefix is a user turn; this request continues it
+        payload["contents"][0]["role"] = "user"
+        payload["cachedContent"] = cached_content
+    return payload
+
+
+async def call_gemini_api(prompt: str, api_url: str = None, api_key: str = None,
+                          cached_content: str = None) -> str:
+    logger.debug("Inside Gemini client")
+    api_url = api_url or GEMINI_API_URL
+    api_key = api_key or GEMINI_API_KEY
+    if not api_key or not api_url:
         raise ValueError("Gemini API configuration missing")
 
     # Google Gemini API requires key in URL
-    url = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
+    url = f"{api_url}?key={api_key}"
 
     headers = {
         "Content-Type": "application/json"
     }
 
     # Correct request body structure
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": prompt}
-                ]
-            }
-        ]
-    }
+    payload = _payload(prompt, cached_content)
 
-    logger.info("Calling Gemini API -> %s", url)
-    resp = requests.post(url, headers=headers, json=payload)
+    logger.info("Calling Gemini API -> %s", api_url)
+    async with get_semaphore():
+        resp = await get_client().post(url, headers=headers, json=payload)
     resp.raise_for_status()
 
     data = resp.json()
 
+    _record_usage(data)
+
     # Correct response extraction
     try:
         return data["candidates"][0]["content"]["parts"][0]["text"]
     except Exception:
         return str(data)
+
+
+def _record_usage(data: dict):
+    usage = data.get("usageMetadata") or {}
+    TOKENS.labels("in").inc(usage.get("promptTokenCount", 0))
+    TOKENS.labels("out").inc(usage.get("candidatesTokenCount", 0))
+    # Part of "in" that was served from an explicit context cache
+    TOKENS.labels("cached").inc(usage.get("cachedContentTokenCount", 0))
+
+
+async def create_cached_content(text: str, model: str, ttl: int, cache_url: str = None,
+                                api_key: str = None) -> dict:
+    """Upload a shared prompt prefix once; returns the cachedContents resource ({"name", "expireTime", ...})."""
+    cache_url = cache_url or GEMINI_CACHE_URL
+    api_key = api_key or GEMINI_API_KEY
+    if not api_key or not cache_url or not model:
+        raise ValueError("Gemini context cache configuration missing")
+
+    payload = {
+        "model": model,
+        "contents": [{"role": "user", "parts": [{"text": text}]}],
+        "ttl": f"{int(ttl)}s",
+    }
+    logger.info("Creating Gemini cached content (%d chars) -> %s", len(text), cache_url)
+    async with get_semaphore():
+        resp = await get_client().post(f"{cache_url}?key={api_key}", json=payload)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def stream_gemini_api(prompt: str, stream_url: str = None, api_key: str = None,
+                            cached_content: str = None):
+    """Async generator yielding text fragments as Gemini produces them (SSE stream)."""
+    stream_url = stream_url or GEMINI_STREAM_URL
+    api_key = api_key or GEMINI_API_KEY
+    if not api_key or not stream_url:
+        raise ValueError("Gemini API configuration missing")
+
+    url = f"{stream_url}?alt=sse&key={api_key}"
+    payload = _payload(prompt, cached_content)
+
+    logger.info("Streaming Gemini API -> %s", stream_url)
+    async with get_semaphore():
+        async with get_client().stream("POST", url, json=payload) as resp:
+            resp.raise_for_status()
+            usage = {}
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = json.loads(line[5:])
+                # Usage totals are cumulative; only the last event counts
+                usage = data.get("usageMetadata") or usage
+                for part in ((data.get("candidates") or [{}])[0].get("content") or {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+            _record_usage({"usageMetadata": usage})
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from config import load_config
+
+load_config()
+
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "1") == "1"
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "review_history.sqlite3")
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", 500))
+
+# workflow_id is NULL for uploads without one: a bare filename such as Main.xaml is
+# shared by unrelated projects, so it can't identify a workflow
+REVIEWS_TABLE = """CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    workflow_id TEXT,
+    filename TEXT,
+    tool TEXT,
+    compliance_score REAL,
+    issues TEXT NOT NULL,
+    recommendations TEXT NOT NULL,
+    issue_count INTEGER NOT NULL,
+    recommendation_count INTEGER NOT NULL,
+    file_hash TEXT,
+    mode TEXT,
+    cached INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL
+)"""
+
+GROUP_BY = {
+    "tool": "tool",
+    "workflow": "workflow_id",
+    "day": "date(created, 'unixepoch')",
+    "month": "strftime('%Y-%m', created, 'unixepoch')",
+}
+
+
+def _filters(workflow_id=None, tool=None, min_score=None, max_score=None, since=None, until=None):
+    clauses, params = [], []
+    for clause, value in (
+        ("workflow_id = ?", workflow_id),
+        ("tool = ?", tool),
+        ("compliance_score >= ?", min_score),
+        ("compliance_score <= ?", max_score),
+        ("created >= ?", since),
+        ("created < ?", until),
+    ):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    return clauses, params
+
+
+class HistoryStore:
+    """Every review ever returned, indexed for audit queries and trends."""
+
+    def __init__(self, path: str = HISTORY_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(REVIEWS_TABLE.format(name="reviews"))
+            required = {row[1]: row[3] for row in conn.execute("PRAGMA table_info(reviews)")}
+            if required.get("workflow_id"):
+                # Older tables required a workflow_id; uploads without one are now stored as NULL
+                conn.execute(REVIEWS_TABLE.format(name="reviews_migrated"))
+                conn.execute("INSERT INTO reviews_migrated SELECT * FROM reviews")
+                conn.execute("DROP TABLE reviews")
+                conn.execute("ALTER TABLE reviews_migrated RENAME TO reviews")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_workflow ON reviews(workflow_id, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_tool ON reviews(tool, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_score ON reviews(compliance_score)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_created ON reviews(created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_hash ON reviews(file_hash)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add(self, workflow_id: str, filename: str, json_obj: dict, file_hash: str = None,
+            mode: str = None, cached: bool = False) -> int:
+        issues = json_obj.get("issues", [])
+        recs = json_obj.get("recommendations", [])
+        score = json_obj.get("compliance_score")
+        with self._lock, self._connect() as conn:
+            cur = conn.execute(
+                """INSERT INTO reviews (workflow_id, filename, tool, compliance_score, issues, recommendations,
+                                        issue_count, recommendation_count, file_hash, mode, cached, created)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (workflow_id, filename, json_obj.get("tool"),
+                 score if isinstance(score, (int, float)) else None,
+                 json.dumps(issues), json.dumps(recs), len(issues), len(recs),
+                 file_hash, mode, int(bool(cached)), time.time()),
+            )
+            return cur.lastrowid
+
+    @staticmethod
+    def _row(row, full: bool = True) -> dict:
+        item = dict(row)
+        item["cached"] = bool(item["cached"])
+        if full:
+            item["issues"] = json.loads(item["issues"])
+            item["recommendations"] = json.loads(item["recommendations"])
+        return item
+
+    def get(self, review_id: int):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT * FROM reviews WHERE id = ?", (review_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def query(self, limit: int = 50, cursor: int = None, full: bool = False, **filters) -> dict:
+        """Newest first; pass the returned next_cursor back for the following page."""
+        clauses, params = _filters(**filters)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        columns = "*" if full else (
+            "id, workflow_id, filename, tool, compliance_score, issue_count, recommendation_count, "
+            "file_hash, mode, cached, created"
+        )
+        sql = f"SELECT {columns} FROM reviews"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        limit = max(1, min(limit, HISTORY_PAGE_MAX))
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(sql, params + [limit + 1]).fetchall()
+        items = [self._row(r, full) if full else {**dict(r), "cached": bool(r["cached"])} for r in rows[:limit]]
+        return {"items": items, "next_cursor": items[-1]["id"] if len(rows) > limit else None}
+
+    def stats(self, group_by: str = "tool", **filters) -> list:
+        if group_by not in GROUP_BY:
+            raise ValueError(f"Unknown group_by '{group_by}' (expected one of {', '.join(GROUP_BY)})")
+        clauses, params = _filters(**filters)
+        key = GROUP_BY[group_by]
+        sql = (f"SELECT {key} AS grp, COUNT(*) AS reviews, AVG(compliance_score) AS avg_score, "
+               f"MIN(compliance_score) AS min_score, MAX(compliance_score) AS max_score, "
+               f"AVG(issue_count) AS avg_issues, COUNT(DISTINCT workflow_id) AS workflows FROM reviews")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " GROUP BY grp ORDER BY grp"
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [{group_by: r["grp"], **{k: r[k] for k in r.keys() if k != "grp"}} for r in rows]
+
+    def regressions(self, since: float, until: float = None, min_drop: float = 1, tool: str = None,
+                    mode: str = None, limit: int = 100) -> list:
+        """Workflows whose latest score in [since, until) is below their baseline.
+
+        Baseline: the last review before `since`, or the first review inside the
+        window for workflows first seen in it. Scores are only compared within one
+        review mode; static and hybrid scores aren't comparable with llm ones.
+        Reviews without a workflow_id have no identity to compare and are left out.
+        """
+        until = until or time.time()
+        clauses, params = [], []
+        for clause, value in (("tool = ?", tool), ("mode = ?", mode)):
+            if value:
+                clauses.append(f"AND {clause}")
+                params.append(value)
+        extra = " ".join(clauses)
+        sql = f"""
+            WITH windowed AS (
+                SELECT workflow_id, mode, compliance_score, created,
+                       ROW_NUMBER() OVER (PARTITION BY workflow_id, mode ORDER BY created DESC, id DESC) AS newest,
+                       ROW_NUMBER() OVER (PARTITION BY workflow_id, mode ORDER BY created, id) AS oldest
+                FROM reviews
+                WHERE created >= ? AND created < ? AND compliance_score IS NOT NULL
+                  AND workflow_id IS NOT NULL {extra}
+            ),
+            latest AS (SELECT workflow_id, mode, compliance_score, created FROM windowed WHERE newest = 1),
+            first_in AS (SELECT workflow_id, mode, compliance_score FROM windowed WHERE oldest = 1),
+            before AS (
+                SELECT workflow_id, mode, compliance_score FROM (
+                    SELECT workflow_id, mode, compliance_score,
+                           ROW_NUMBER() OVER (PARTITION BY workflow_id, mode ORDER BY created DESC, id DESC) AS rn
+                    FROM reviews
+                    WHERE created < ? AND compliance_score IS NOT NULL {extra}
+                      AND workflow_id IN (SELECT workflow_id FROM latest)
+                ) WHERE rn = 1
+            )
+            SELECT l.workflow_id, l.mode, COALESCE(b.compliance_score, f.compliance_score) AS baseline_score,
+                   l.compliance_score AS latest_score, l.created AS latest_review
+            FROM latest l
+            JOIN first_in f ON f.workflow_id = l.workflow_id AND f.mode IS l.mode
+            LEFT JOIN before b ON b.workflow_id = l.workflow_id AND b.mode IS l.mode
+            WHERE COALESCE(b.compliance_score, f.compliance_score) - l.compliance_score >= ?
+            ORDER BY COALESCE(b.compliance_score, f.compliance_score) - l.compliance_score DESC
+            LIMIT ?
+        """
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(sql, [since, until] + params + [since] + params + [min_drop, limit]).fetchall()
+        return [{**dict(r), "drop": r["baseline_score"] - r["latest_score"]} for r in rows]
+
+
+_store = None
+
+
+def get_history_store():
+    global _store
+    if not HISTORY_ENABLED:
+        return None
+    if _store is None:
+        _store = HistoryStore()
+    return _store
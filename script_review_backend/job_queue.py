@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+from config import load_config
+
+load_config()
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+# A running job whose owner hasn't heartbeated for this long is considered orphaned
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))
+
+# Identifies this process among the server workers sharing the job table
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobStore:
+    """SQLite-backed job table; queued/running jobs survive process restarts."""
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    filename TEXT,
+                    content TEXT,
+                    options TEXT,
+                    result TEXT,
+                    excel BLOB,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, filename: str, content: str, options: dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, filename, content, options, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, filename, content, json.dumps(options), now, now),
+            )
+        return job_id
+
+    def claim(self, owner: str = WORKER_ID):
+        """Atomically move the oldest queued job to running and return it (or None).
+
+        BEGIN IMMEDIATE serialises claims across server processes, so each job
+        is handed to exactly one worker.
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, filename, content, options FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, updated = ? WHERE id = ?",
+                (RUNNING, owner, time.time(), row[0]),
+            )
+            conn.execute("COMMIT")
+        return {"id": row[0], "filename": row[1], "content": row[2], "options": json.loads(row[3] or "{}")}
+
+    def complete(self, job_id: str, result: dict, excel_bytes: bytes):
+        with self._lock, self._connect() as conn:
+            # Drop the uploaded content once the job is finished
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, excel = ?, content = NULL, updated = ? WHERE id = ?",
+                (DONE, json.dumps(result), excel_bytes, time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, content = NULL, updated = ? WHERE id = ?",
+                (FAILED, error, time.time(), job_id),
+            )
+
+    def heartbeat(self, owner: str = WORKER_ID):
+        # Renew the lease on every job this process is running
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE jobs SET updated = ? WHERE status = ? AND owner = ?", (time.time(), RUNNING, owner))
+
+    def requeue_running(self, older_than: float = None, owner: str = None) -> int:
+        """Put running jobs back in the queue.
+
+        older_than: only jobs whose lease expired that many seconds ago (left
+        behind by a crashed worker); owner: only jobs held by that worker.
+        """
+        query, params = "UPDATE jobs SET status = ?, owner = NULL, updated = ? WHERE status = ?", [QUEUED, time.time(), RUNNING]
+        if older_than is not None:
+            query += " AND updated < ?"
+            params.append(time.time() - older_than)
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        with self._lock, self._connect() as conn:
+            cur = conn.execute(query, params)
+            return cur.rowcount
+
+    def ping(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("SELECT 1 FROM jobs LIMIT 1").fetchall()
+
+    def get(self, job_id: str):
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, filename, result, error, created, updated FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "filename": row[2],
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "created": row[5],
+            "updated": row[6],
+        }
+
+    def get_excel(self, job_id: str):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT excel FROM jobs WHERE id = ? AND status = ?", (job_id, DONE)).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
+
+
+class JobRunner:
+    """Pool of asyncio workers draining the JobStore with a user supplied handler.
+
+    Several server processes can each run a JobRunner on the same store; running
+    jobs are leased to their process and only requeued once the lease expires.
+    """
+
+    def __init__(self, store: JobStore, handler, workers: int = JOB_WORKERS, owner: str = WORKER_ID):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.owner = owner
+        self.active = 0
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._heartbeat = None
+        self._stopping = False
+
+    def start(self):
+        requeued = self.store.requeue_running(older_than=JOB_LEASE_SECONDS)
+        if requeued:
+            logger.info("Requeued %d interrupted job(s)", requeued)
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._heartbeat = asyncio.create_task(self._keep_leases())
+
+    async def stop(self, drain_timeout: float = 0):
+        """Stop claiming jobs; let running ones finish for up to drain_timeout seconds.
+
+        Jobs still running after that are cancelled and handed back to the queue
+        immediately rather than waiting for their lease to expire.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if drain_timeout > 0 and self._tasks:
+            await asyncio.wait(self._tasks, timeout=drain_timeout)
+        for task in self._tasks + [self._heartbeat]:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._heartbeat is not None:
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+        self._tasks, self._heartbeat = [], None
+        await asyncio.to_thread(self.store.requeue_running, None, self.owner)
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def _keep_leases(self):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, self.owner)
+                requeued = await asyncio.to_thread(self.store.requeue_running, JOB_LEASE_SECONDS)
+                if requeued:
+                    self._wakeup.set()
+            except sqlite3.Error as e:
+                logger.warning("Job lease heartbeat failed: %s", e)
+
+    async def _worker(self):
+        while not self._stopping:
+            job = await asyncio.to_thread(self.store.claim, self.owner)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.active += 1
+            try:
+                result, excel_bytes = await self.handler(job)
+                await asyncio.to_thread(self.store.complete, job["id"], result, excel_bytes)
+            except asyncio.CancelledError:
+                # Leave the job "running"; stop() requeues it (or its lease expires)
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self.store.fail, job["id"], str(e))
+            finally:
+                self.active -= 1
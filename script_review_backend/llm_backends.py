@@ -0,0 +1,406 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+
+from config import load_config
+
+from gemini_client import (
+    GEMINI_API_KEY, GEMINI_API_MODEL, GEMINI_API_URL, GEMINI_STREAM_URL, GEMINI_CACHE_URL,
+    call_gemini_api, stream_gemini_api, create_cached_content, cached_contents_url, model_resource,
+    get_client, get_semaphore,
+)
+from metrics_utils import RETRIES, TOKENS, LLM_CALLS, CONTEXT_CACHE
+from rate_limiter import RateLimited, build_limiter, estimate_cost
+from context_cache import CONTEXT_CACHE_TTL, SharedContext, compose, get_context_store
+
+load_config()
+
+logger = logging.getLogger(__name__)
+
+# JSON list of backends, tried in order, e.g.
+# [{"name": "gemini", "type": "gemini"},
+#  {"name": "local", "type": "openai", "url": "http://127.0.0.1:11434/v1", "model": "llama3"}]
+MODEL_BACKENDS = os.getenv("MODEL_BACKENDS")
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", 0))   # 0 disables hedging
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", 0.5))
+LLM_MAX_BACKOFF = float(os.getenv("LLM_MAX_BACKOFF", 30))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open probe after reset_seconds."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.max_failures = failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            # Let exactly one request through to test the backend
+            self.probing = True
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.max_failures or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+# httpx is imported where it's needed: by then the first request has already loaded it,
+# and a worker that never calls a model doesn't pay for it at startup
+def is_retryable(error: Exception) -> bool:
+    import httpx
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def retry_delay(attempt: int, error: Exception = None) -> float:
+    import httpx
+    delay = LLM_RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+    if isinstance(error, httpx.HTTPStatusError):
+        retry_after = error.response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+    return min(delay, LLM_MAX_BACKOFF)
+
+
+class ModelBackend:
+    # Whether the backend can reference an uploaded SharedContext instead of resending it
+    caches_context = False
+
+    def __init__(self, name: str, model: str = None, rpm: float = 0, tpm: float = 0):
+        self.name = name
+        self.model = model or name
+        self.breaker = CircuitBreaker()
+        # Quota budget (requests/tokens per minute); None means use the LLM_* env defaults
+        self.limiter = build_limiter(name, rpm, tpm)
+
+    async def admit(self, prompt: str, context: SharedContext = None):
+        if self.limiter is not None:
+            # Cached prefix tokens still count against the provider's input quota
+            await self.limiter.acquire(estimate_cost(prompt) + (context.tokens if context else 0))
+
+    def throttled(self, error: Exception, delay: float):
+        import httpx
+        # Honour the provider's Retry-After for every caller of this backend, not just this one
+        if self.limiter is not None and isinstance(error, httpx.HTTPStatusError) \
+                and error.response.status_code == 429:
+            self.limiter.pause(delay)
+
+    async def generate(self, prompt: str, context: SharedContext = None) -> str:
+        """Answer `prompt` preceded by the shared `context` prefix (if any)."""
+        raise NotImplementedError
+
+    async def stream(self, prompt: str, context: SharedContext = None):
+        # Backends without native streaming deliver the whole answer as one fragment
+        yield await self.generate(prompt, context)
+
+
+class GeminiBackend(ModelBackend):
+    def __init__(self, name: str = "gemini", url: str = None, stream_url: str = None,
+                 api_key: str = None, model: str = None, rpm: float = None, tpm: float = None):
+        super().__init__(name, model or GEMINI_API_MODEL, rpm, tpm)
+        self.url = url or GEMINI_API_URL
+        self.stream_url = stream_url or (url.replace(":generateContent", ":streamGenerateContent") if url else GEMINI_STREAM_URL)
+        self.api_key = api_key or GEMINI_API_KEY
+        self.cache_url = cached_contents_url(url) if url else GEMINI_CACHE_URL
+        self.cache_model = model_resource(self.url, model or GEMINI_API_MODEL)
+        # Handles are only valid for the model (and project/key) they were created with
+        self.cache_scope = f"{self.cache_url}:{self.cache_model}"
+        self._context_locks = {}
+        self._uncacheable = set()
+
+    @property
+    def caches_context(self) -> bool:
+        return bool(self.cache_url and self.cache_model)
+
+    async def context_handle(self, context: SharedContext):
+        """cachedContents name for `context`, uploading it on first use; None to send it inline."""
+        if context is None or not context.cacheable or context.digest in self._uncacheable:
+            return None
+        store = get_context_store()
+        if store is None or not self.cache_url or not self.cache_model:
+            return None
+        name = await asyncio.to_thread(store.get, context.digest, self.cache_scope)
+        if name is None:
+            # One upload per context per process; concurrent requests for it wait here
+            async with self._context_locks.setdefault(context.digest, asyncio.Lock()):
+                name = await asyncio.to_thread(store.get, context.digest, self.cache_scope)
+                if name is None:
+                    try:
+                        created = await create_cached_content(
+                            context.text, self.cache_model, CONTEXT_CACHE_TTL, self.cache_url, self.api_key
+                        )
+                    except Exception as e:
+                        # e.g. below the model's minimum cacheable size; don't try again for this context
+                        logger.warning("Context caching unavailable on %s, sending prefix inline: %s", self.name, e)
+                        CONTEXT_CACHE.labels("failed").inc()
+                        self._uncacheable.add(context.digest)
+                        return None
+                    name = created["name"]
+                    await asyncio.to_thread(
+                        store.put, context.digest, self.cache_scope, name, time.time() + CONTEXT_CACHE_TTL
+                    )
+                    CONTEXT_CACHE.labels("created").inc()
+                    return name
+        CONTEXT_CACHE.labels("hit").inc()
+        return name
+
+    async def _expired(self, context: SharedContext, name: str, error: Exception) -> bool:
+        # 403/404: the cached content expired early or was deleted; forget it and go inline
+        import httpx
+        if not isinstance(error, httpx.HTTPStatusError) or error.response.status_code not in (403, 404):
+            return False
+        await asyncio.to_thread(get_context_store().drop, context.digest, self.cache_scope, name)
+        CONTEXT_CACHE.labels("expired").inc()
+        return True
+
+    async def generate(self, prompt: str, context: SharedContext = None) -> str:
+        name = await self.context_handle(context)
+        if name is not None:
+            try:
+                return await call_gemini_api(prompt, self.url, self.api_key, name)
+            except Exception as e:
+                if not await self._expired(context, name, e):
+                    raise
+        return await call_gemini_api(compose(prompt, context), self.url, self.api_key)
+
+    async def stream(self, prompt: str, context: SharedContext = None):
+        name = await self.context_handle(context)
+        if name is not None:
+            started = False
+            try:
+                async for fragment in stream_gemini_api(prompt, self.stream_url, self.api_key, name):
+                    started = True
+                    yield fragment
+                return
+            except Exception as e:
+                if started or not await self._expired(context, name, e):
+                    raise
+        async for fragment in stream_gemini_api(compose(prompt, context), self.stream_url, self.api_key):
+            yield fragment
+
+
+class OpenAICompatibleBackend(ModelBackend):
+    """Any /v1/chat/completions server - vLLM, llama.cpp, Ollama, LM Studio or a test fake."""
+
+    def __init__(self, name: str, url: str, model: str, api_key: str = None,
+                 rpm: float = 0, tpm: float = 0):
+        super().__init__(name, model, rpm, tpm)
+        self.url = url.rstrip("/") + "/chat/completions"
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    def _payload(self, prompt: str, stream: bool) -> dict:
+        return {"model": self.model, "messages": [{"role": "user", "content": prompt}], "stream": stream}
+
+    async def generate(self, prompt: str, context: SharedContext = None) -> str:
+        # No explicit caching API here; servers with automatic prefix caching (vLLM, llama.cpp)
+        # still benefit because the shared prefix always comes first
+        prompt = compose(prompt, context)
+        async with get_semaphore():
+            resp = await get_client().post(self.url, headers=self.headers, json=self._payload(prompt, False))
+        resp.raise_for_status()
+        data = resp.json()
+        usage = data.get("usage") or {}
+        TOKENS.labels("in").inc(usage.get("prompt_tokens", 0))
+        TOKENS.labels("out").inc(usage.get("completion_tokens", 0))
+        return data["choices"][0]["message"]["content"]
+
+    async def stream(self, prompt: str, context: SharedContext = None):
+        prompt = compose(prompt, context)
+        async with get_semaphore():
+            async with get_client().stream("POST", self.url, headers=self.headers,
+                                           json=self._payload(prompt, True)) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:") or line[5:].strip() == "[DONE]":
+                        continue
+                    delta = (json.loads(line[5:]).get("choices") or [{}])[0].get("delta") or {}
+                    if delta.get("content"):
+                        yield delta["content"]
+
+
+BACKEND_TYPES = {"gemini": GeminiBackend, "openai": OpenAICompatibleBackend}
+
+
+def build_backends(config: str = MODEL_BACKENDS) -> list:
+    if not config:
+        return [GeminiBackend()]
+    backends = []
+    for spec in json.loads(config):
+        spec = dict(spec)
+        kind = spec.pop("type", "gemini")
+        if "api_key_env" in spec:
+            spec["api_key"] = os.getenv(spec.pop("api_key_env"))
+        backends.append(BACKEND_TYPES[kind](**spec))
+    return backends
+
+
+class BackendPool:
+    """Ordered model backends with retry, failover, hedging and circuit breaking."""
+
+    def __init__(self, backends: list, hedge_after: float = LLM_HEDGE_AFTER_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.backends = backends
+        self.hedge_after = hedge_after
+        self.max_retries = max_retries
+
+    @property
+    def model_tag(self) -> str:
+        # Goes into the review cache key
+        return "+".join(b.model or b.name for b in self.backends)
+
+    @property
+    def caches_context(self) -> bool:
+        return any(b.caches_context for b in self.backends)
+
+    def _available(self) -> list:
+        return [b for b in self.backends if b.breaker.state != "open"]
+
+    async def _call(self, backend: ModelBackend, prompt: str, context: SharedContext = None) -> str:
+        for attempt in range(self.max_retries + 1):
+            # Quota wait happens before the breaker probe so a queued call doesn't hold it
+            await backend.admit(prompt, context)
+            if not backend.breaker.allow():
+                raise CircuitOpenError(f"Model backend '{backend.name}' circuit is open")
+            try:
+                result = await backend.generate(prompt, context)
+            except asyncio.CancelledError:
+                # Losing hedge; not the backend's fault
+                backend.breaker.probing = False
+                raise
+            except Exception as e:
+                backend.breaker.failure()
+                LLM_CALLS.labels(backend.name, "error").inc()
+                delay = retry_delay(attempt, e)
+                backend.throttled(e, delay)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                RETRIES.labels("llm").inc()
+                await asyncio.sleep(delay)
+                continue
+            backend.breaker.success()
+            LLM_CALLS.labels(backend.name, "ok").inc()
+            return result
+
+    async def generate(self, prompt: str, context: SharedContext = None) -> str:
+        candidates = self._available()
+        if not candidates:
+            raise CircuitOpenError("All model backends are unavailable (circuits open)")
+
+        queue = list(candidates)
+        first = queue.pop(0)
+        pending = {asyncio.create_task(self._call(first, prompt, context))}
+        hedged = self.hedge_after <= 0
+        errors = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=None if hedged else self.hedge_after,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # Slow primary: fire a duplicate at the next backend (or the same one)
+                    hedged = True
+                    backend = queue.pop(0) if queue else first
+                    LLM_CALLS.labels(backend.name, "hedge").inc()
+                    pending.add(asyncio.create_task(self._call(backend, prompt, context)))
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+                if not pending and queue:
+                    # Fail over to the next backend
+                    pending.add(asyncio.create_task(self._call(queue.pop(0), prompt, context)))
+        finally:
+            for task in pending:
+                task.cancel()
+        raise errors[-1]
+
+    async def stream(self, prompt: str, context: SharedContext = None):
+        """Fail over between backends until one starts producing output."""
+        errors = []
+        for backend in self._available():
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await backend.admit(prompt, context)
+                except RateLimited as e:
+                    errors.append(e)
+                    break
+                if not backend.breaker.allow():
+                    break
+                started = False
+                try:
+                    async for fragment in backend.stream(prompt, context):
+                        started = True
+                        yield fragment
+                except Exception as e:
+                    backend.breaker.failure()
+                    LLM_CALLS.labels(backend.name, "error").inc()
+                    if started:
+                        raise
+                    errors.append(e)
+                    delay = retry_delay(attempt, e)
+                    backend.throttled(e, delay)
+                    if not is_retryable(e) or attempt == self.max_retries:
+                        break
+                    RETRIES.labels("llm").inc()
+                    await asyncio.sleep(delay)
+                    continue
+                backend.breaker.success()
+                LLM_CALLS.labels(backend.name, "ok").inc()
+                return
+        raise errors[-1] if errors else CircuitOpenError("All model backends are unavailable (circuits open)")
+
+
+_pool = None
+
+
+def get_pool() -> BackendPool:
+    global _pool
+    if _pool is None:
+        _pool = BackendPool(build_backends())
+    return _pool
+
+
+async def generate_text(prompt: str, context: SharedContext = None) -> str:
+    return await get_pool().generate(prompt, context)
+
+
+async def stream_text(prompt: str, context: SharedContext = None):
+    async for fragment in get_pool().stream(prompt, context):
+        yield fragment
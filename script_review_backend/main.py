@@ -1,72 +1,452 @@
-import io
-from typing import Optional
+import os
+import math
+import time
+import json
+import asyncio
+from datetime import datetime
+from typing import List, Optional
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 import logging
 logger = logging.getLogger(__name__)
 
-from gemini_client import PROMPT_TEMPLATE, call_gemini_api
-from file_utils import detect_tool_type, extract_json_from_text
-from excel_utils import write_results_to_excel
-from email_utils import send_email   # FIXED IMPORT
+from config import load_config
+load_config()
+
+from gemini_client import close_client
+from excel_utils import REPORT_FORMATS, report_bytes
+from email_utils import queue_email, get_sender
+from review_service import split_emails, review_content, review_many, resolve_mode, stream_review
+from upload_utils import UploadTooLarge, read_upload, read_archive, is_archive
+from job_queue import JobStore, JobRunner, WORKER_ID
+from rate_limiter import RateLimited, set_priority
+from history_store import get_history_store
+from project_context import files_context
+from metrics_utils import start_timings, stage, metrics_payload, REQUEST_SECONDS
 
 app = FastAPI(title="RPA Script Validator (Modular)")
 
+# Seconds a stopping worker waits for in-flight background jobs before handing them back
+DRAIN_SECONDS = float(os.getenv("DRAIN_SECONDS", 30))
+
+job_store = JobStore()
+
+# Lifecycle of this worker process: starting -> ready -> draining
+server_state = {"status": "starting", "started": time.time()}
+
+# Dependencies only needed once work arrives; loaded in the background after the
+# worker reports ready so neither startup nor the first request waits for them
+WARM_IMPORTS = os.getenv("WARM_IMPORTS", "1") == "1"
+# (only modules nothing else imports eagerly: fastapi already loads email.message, for example)
+DEFERRED_MODULES = ("httpx", "xlsxwriter", "smtplib")
+
+
+def warm_imports():
+    start = time.perf_counter()
+    for name in DEFERRED_MODULES:
+        try:
+            __import__(name)
+        except ImportError as e:
+            logger.warning("Could not preload %s: %s", name, e)
+    logger.info("Preloaded deferred modules in %.3fs", time.perf_counter() - start)
+
+
+@app.middleware("http")
+async def observe_latency(request, call_next):
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        # Label by route template so /jobs/{job_id} doesn't explode cardinality
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(getattr(route, "path", "unmatched")).observe(time.perf_counter() - start)
+
+
+def _rate_limited(e: RateLimited) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+async def run_review_job(job: dict):
+    # Queued jobs yield model quota to interactive requests
+    set_priority("background")
+    opts = job["options"]
+    json_obj, excel_bytes, meta = await review_content(
+        job["filename"], job["content"], opts.get("mode"), opts.get("workflow_id")
+    )
+
+    if opts.get("to_emails"):
+        fmt = opts.get("report_format") or "xlsx"
+        queue_email(
+            to_list=split_emails(opts.get("to_emails")),
+            cc_list=split_emails(opts.get("cc_emails")),
+            bcc_list=split_emails(opts.get("bcc_emails")),
+            subject=f"Validation results for {job['filename']}",
+            body="Attached are the script validation results.",
+            attachment_bytes=excel_bytes if fmt == "xlsx" else report_bytes(json_obj, fmt),
+            filename=f"validation_{job['filename']}.{fmt}",
+            mimetype=REPORT_FORMATS[fmt],
+        )
+
+    return {"result": json_obj, **meta}, excel_bytes
+
+
+job_runner = JobRunner(job_store, run_review_job)
+
+
+@app.on_event("startup")
+async def startup():
+    job_runner.start()
+    get_sender().start()
+    server_state["status"] = "ready"
+    if WARM_IMPORTS:
+        asyncio.get_running_loop().run_in_executor(None, warm_imports)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Readiness fails from here on; running jobs get DRAIN_SECONDS to finish,
+    # queued email is flushed before the process exits
+    server_state["status"] = "draining"
+    await job_runner.stop(drain_timeout=DRAIN_SECONDS)
+    await close_client()
+    await asyncio.to_thread(get_sender().stop)
+
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and serving the event loop."""
+    return {
+        "status": "ok",
+        "worker": WORKER_ID,
+        "uptime": round(time.time() - server_state["started"], 1),
+    }
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: accepts new work (started, not draining, shared job store reachable)."""
+    checks = {"state": server_state["status"]}
+    ok = server_state["status"] == "ready"
+    try:
+        await asyncio.to_thread(job_store.ping)
+        checks["job_store"] = "ok"
+    except Exception as e:
+        ok = False
+        checks["job_store"] = str(e)
+    checks["running_jobs"] = job_runner.active
+    checks["pending_email"] = get_sender().pending()
+    return JSONResponse(status_code=200 if ok else 503, content={"ready": ok, "worker": WORKER_ID, **checks})
+
+
+@app.get("/metrics")
+async def metrics():
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
+
 @app.post("/validate")
 async def validate_workflow(
     file: UploadFile = File(...),
     to_emails: Optional[str] = Form(None),    # comma-separated
     cc_emails: Optional[str] = Form(None),    # comma-separated
     bcc_emails: Optional[str] = Form(None),   # comma-separated
+    async_job: bool = Form(False),            # queue and return a job id immediately
+    mode: Optional[str] = Form(None),         # llm | static | hybrid
+    report_format: str = Form("xlsx"),        # xlsx | csv | json (email attachment)
+    timings: bool = Form(False),              # include per-stage timing breakdown
+    workflow_id: Optional[str] = Form(None),  # identity across versions; enables incremental review
 ):
-    print(file)
-    print(to_emails)
+    logger.debug("validate %s to=%s", file.filename, to_emails)
+    stage_timings = start_timings()
 
-    # ===== READ FILE =====
-    raw = await file.read()
     try:
-        content = raw.decode("utf-8")
-    except:
-        content = raw.decode("latin1")
+        mode = resolve_mode(mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report_format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown report format '{report_format}'")
 
-    # ===== DETECT TOOL TYPE =====
-    tool_type = detect_tool_type(file.filename, content)
+    # ===== READ FILE (chunked, size-limited) =====
+    try:
+        content = await read_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-    # ===== PREPARE PROMPT =====
-    prompt = PROMPT_TEMPLATE % (tool_type, content)
+    # ===== QUEUE AS BACKGROUND JOB (if requested) =====
+    if async_job:
+        job_id = await asyncio.to_thread(job_store.enqueue, file.filename, content, {
+            "to_emails": to_emails,
+            "cc_emails": cc_emails,
+            "bcc_emails": bcc_emails,
+            "mode": mode,
+            "report_format": report_format,
+            "workflow_id": workflow_id,
+        })
+        job_runner.notify()
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
 
-    # ===== CALL GEMINI =====
+    # ===== REVIEW (cache -> Gemini -> Excel) =====
     try:
-        raw_response = call_gemini_api(prompt)
-        json_obj = extract_json_from_text(raw_response)
+        json_obj, excel_bytes, meta = await review_content(file.filename, content, mode, workflow_id)
+    except RateLimited as e:
+        raise _rate_limited(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    # ===== CREATE EXCEL IN MEMORY =====
-    output = io.BytesIO()
-    write_results_to_excel(json_obj, out_path=output)
-    excel_bytes = output.getvalue()
-
-    # ===== SEND EMAIL (if provided) =====
+    # ===== QUEUE EMAIL (if provided) - delivered in the background =====
     if to_emails:
-        print("working to send mail")
-        to_list = [e.strip() for e in to_emails.split(",") if e.strip()]
-        cc_list = [e.strip() for e in cc_emails.split(",")] if cc_emails else []
-        bcc_list = [e.strip() for e in bcc_emails.split(",")] if bcc_emails else []
+        try:
+            with stage("email_queue"):
+                queue_email(
+                    to_list=split_emails(to_emails),
+                    cc_list=split_emails(cc_emails),
+                    bcc_list=split_emails(bcc_emails),
+                    subject=f"Validation results for {file.filename}",
+                    body="Attached are the script validation results.",
+                    attachment_bytes=excel_bytes if report_format == "xlsx" else report_bytes(json_obj, report_format),
+                    filename=f"validation_{file.filename}.{report_format}",
+                    mimetype=REPORT_FORMATS[report_format],
+                )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Email sending failed: {str(e)}")
+        meta["email"] = "queued"
+
+    if timings:
+        meta["timings"] = stage_timings
+    return {"result": json_obj, **meta}
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/validate-stream")
+async def validate_stream(
+    file: UploadFile = File(...),
+    to_emails: Optional[str] = Form(None),    # comma-separated
+    cc_emails: Optional[str] = Form(None),    # comma-separated
+    bcc_emails: Optional[str] = Form(None),   # comma-separated
+    mode: Optional[str] = Form(None),         # llm | static | hybrid
+    report_format: str = Form("xlsx"),        # xlsx | csv | json (email attachment)
+):
+    """Same review as /validate, delivered as Server-Sent Events.
 
+    Events: meta, issue, recommendation (one per finding, as soon as it is
+    parsed from the model stream), result (final merged report) or error.
+    """
+    try:
+        mode = resolve_mode(mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report_format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown report format '{report_format}'")
+
+    # ===== READ FILE (chunked, size-limited) =====
+    try:
+        content = await read_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    filename = file.filename
+
+    async def events():
         try:
-            print('calling send mail')
-            send_email(
-                to_list=to_list,
-                cc_list=cc_list,
-                bcc_list=bcc_list,
-                subject=f"Validation results for {file.filename}",
-                body="Attached are the script validation results.",
-                attachment_bytes=excel_bytes,
-                filename=f"validation_{file.filename}.xlsx",
+            async for event, data in stream_review(filename, content, mode):
+                if event == "result" and to_emails:
+                    queue_email(
+                        to_list=split_emails(to_emails),
+                        cc_list=split_emails(cc_emails),
+                        bcc_list=split_emails(bcc_emails),
+                        subject=f"Validation results for {filename}",
+                        body="Attached are the script validation results.",
+                        attachment_bytes=report_bytes(data["result"], report_format),
+                        filename=f"validation_{filename}.{report_format}",
+                        mimetype=REPORT_FORMATS[report_format],
+                    )
+                    data["email"] = "queued"
+                yield _sse(event, data)
+        except RateLimited as e:
+            yield _sse("error", {"detail": str(e), "retry_after": math.ceil(e.retry_after)})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/validate-batch")
+async def validate_batch(
+    files: List[UploadFile] = File(...),      # workflow files and/or .zip archives
+    to_emails: Optional[str] = Form(None),    # comma-separated
+    cc_emails: Optional[str] = Form(None),    # comma-separated
+    bcc_emails: Optional[str] = Form(None),   # comma-separated
+    mode: Optional[str] = Form(None),         # llm | static | hybrid
+    report_format: str = Form("xlsx"),        # xlsx | csv | json (email attachment)
+):
+    try:
+        mode = resolve_mode(mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report_format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown report format '{report_format}'")
+
+    # ===== READ + UNPACK FILES =====
+    entries = []
+    for file in files:
+        try:
+            if is_archive(file.filename):
+                # Read straight from the spooled upload; members are decoded one at a time
+                entries.extend(await asyncio.to_thread(read_archive, file.file))
+            else:
+                entries.append((file.filename, await read_upload(file)))
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not read {file.filename}: {str(e)}")
+
+    if not entries:
+        raise HTTPException(status_code=400, detail="No workflow files found in upload")
+
+    # ===== REVIEW ALL (bounded concurrency, below interactive requests for quota) =====
+    set_priority("batch")
+    # The files are one project: summarise it once and share it across every prompt
+    project = await asyncio.to_thread(files_context, entries) if mode != "static" else ""
+    results = await review_many(entries, mode=mode, project=project)
+
+    # ===== COMBINED REPORT (summary + one sheet per file) =====
+    report = await asyncio.to_thread(report_bytes, results, report_format, True)
+
+    # ===== QUEUE ONE EMAIL (if provided) =====
+    if to_emails:
+        try:
+            queue_email(
+                to_list=split_emails(to_emails),
+                cc_list=split_emails(cc_emails),
+                bcc_list=split_emails(bcc_emails),
+                subject=f"Validation results for {len(results)} workflow files",
+                body="Attached are the script validation results (one sheet per file plus a summary).",
+                attachment_bytes=report,
+                filename=f"validation_batch.{report_format}",
+                mimetype=REPORT_FORMATS[report_format],
             )
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Email sending failed: {str(e)}")
 
-    return {"result": json_obj}
+    failed = sum(1 for r in results if "error" in r)
+    return {"results": results, "total": len(results), "failed": failed, "email": "queued" if to_emails else None}
+
+
+def _history():
+    history = get_history_store()
+    if history is None:
+        raise HTTPException(status_code=404, detail="Review history is disabled (HISTORY_ENABLED=0)")
+    return history
+
+
+def _timestamp(value: Optional[str], name: str):
+    # Epoch seconds or ISO 8601 ("2024-05-01", "2024-05-01T12:00:00")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be epoch seconds or an ISO date")
+
+
+@app.get("/reviews")
+async def list_reviews(
+    workflow_id: Optional[str] = None,
+    tool: Optional[str] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    since: Optional[str] = None,              # epoch seconds or ISO date
+    until: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[int] = None,             # next_cursor from the previous page
+    full: bool = False,                       # include issue/recommendation texts
+):
+    history = _history()
+    return await asyncio.to_thread(
+        history.query, limit, cursor, full,
+        workflow_id=workflow_id, tool=tool, min_score=min_score, max_score=max_score,
+        since=_timestamp(since, "since"), until=_timestamp(until, "until"),
+    )
+
+
+@app.get("/reviews/stats")
+async def review_stats(
+    group_by: str = "tool",                   # tool | workflow | day | month
+    workflow_id: Optional[str] = None,
+    tool: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+):
+    history = _history()
+    try:
+        groups = await asyncio.to_thread(
+            history.stats, group_by, workflow_id=workflow_id, tool=tool,
+            since=_timestamp(since, "since"), until=_timestamp(until, "until"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"group_by": group_by, "groups": groups}
+
+
+@app.get("/reviews/regressions")
+async def review_regressions(
+    since: str,                               # start of the period, e.g. first day of the month
+    until: Optional[str] = None,
+    min_drop: float = 1,
+    tool: Optional[str] = None,
+    mode: Optional[str] = None,                # llm | static | hybrid (scores are compared per mode)
+    limit: int = 100,
+):
+    history = _history()
+    rows = await asyncio.to_thread(
+        history.regressions, _timestamp(since, "since"), _timestamp(until, "until"), min_drop, tool, mode, limit,
+    )
+    return {"regressions": rows, "total": len(rows)}
+
+
+@app.get("/reviews/{review_id}")
+async def get_review(review_id: int):
+    review = await asyncio.to_thread(_history().get, review_id)
+    if review is None:
+        raise HTTPException(status_code=404, detail="Review not found")
+    return review
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("result")
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "done":
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": job["status"]})
+    return job["result"]
+
+
+@app.get("/jobs/{job_id}/excel")
+async def job_excel(job_id: str):
+    excel_bytes = await asyncio.to_thread(job_store.get_excel, job_id)
+    if excel_bytes is None:
+        raise HTTPException(status_code=404, detail="No Excel report for this job (unknown or not finished)")
+    return Response(
+        content=excel_bytes,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="validation_{job_id}.xlsx"'},
+    )
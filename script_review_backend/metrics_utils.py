@@ -0,0 +1,63 @@
+import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+
+logger = logging.getLogger("review.metrics")
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "review_stage_seconds", "Time spent per pipeline stage", ["stage"], buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "review_request_seconds", "End-to-end request latency", ["endpoint"], buckets=STAGE_BUCKETS
+)
+TOKENS = Counter("gemini_tokens_total", "Gemini tokens by direction (in/out/cached)", ["direction"])
+CACHE = Counter("review_cache_total", "Review cache lookups", ["result"])
+CONTEXT_CACHE = Counter("context_cache_total", "Shared prompt context handles (hit/created/failed/expired)", ["result"])
+RETRIES = Counter("retries_total", "Retried operations", ["component"])
+BYTES = Counter("bytes_processed_total", "Bytes processed per stage", ["stage"])
+ADMISSION = Counter("llm_admission_total", "Quota admission decisions (admitted/shed)", ["backend", "priority", "outcome"])
+LLM_CALLS = Counter("llm_backend_calls_total", "Model backend calls by outcome (ok/error/hedge)", ["backend", "outcome"])
+
+# Per-request stage timings; set by start_timings() at the top of a request
+_timings = contextvars.ContextVar("review_timings", default=None)
+
+
+def start_timings() -> dict:
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def record(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        # Parallel spans (e.g. chunked Gemini calls) add up
+        timings[stage] = round(timings.get(stage, 0.0) + seconds, 6)
+    logger.debug("stage=%s seconds=%.6f", stage, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def metrics_payload():
+    # Multi-worker mode (server.py): every process writes to PROMETHEUS_MULTIPROC_DIR
+    # and whichever worker serves /metrics aggregates all of them
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,70 @@
+import os
+import re
+
+MINIFY_ENABLED = os.getenv("MINIFY_ENABLED", "1") == "1"
+
+# Rough chars-per-token ratio for Gemini on XML-heavy input
+CHARS_PER_TOKEN = 4
+
+# ===== UiPath (.xaml) designer noise =====
+XAML_BLOCKS = [
+    # View state dictionaries (positions, expanded/collapsed flags)
+    re.compile(r"<sap2010:WorkflowViewState\.ViewStateManager>.*?</sap2010:WorkflowViewState\.ViewStateManager>", re.S),
+    re.compile(r"<sap:WorkflowViewStateService\.ViewState>.*?</sap:WorkflowViewStateService\.ViewState>", re.S),
+    # Namespace / assembly lists used only by the expression compiler
+    re.compile(r"<TextExpression\.NamespacesForImplementation>.*?</TextExpression\.NamespacesForImplementation>", re.S),
+    re.compile(r"<TextExpression\.ReferencesForImplementation>.*?</TextExpression\.ReferencesForImplementation>", re.S),
+]
+XAML_ATTRS = re.compile(
+    r'\s(?:xmlns(?::[\w.]+)?|mc:Ignorable|sap2010:WorkflowViewState\.IdRef|sap:VirtualizedContainerService\.HintSize'
+    r'|sap2010:ExpressionActivityEditor\.ExpressionActivityEditor)="[^"]*"'
+)
+
+# ===== Blue Prism (.bprelease) designer noise =====
+BP_BLOCKS = [
+    re.compile(r"<view>.*?</view>", re.S),
+    re.compile(r"<(display|font|loginhibit|preconditions|postconditions)\b[^>]*/>"),
+    re.compile(r"<narrative\s*/>|<narrative>\s*</narrative>"),
+]
+BP_ATTRS = re.compile(r'\sxmlns(?::[\w.]+)?="[^"]*"')
+
+BETWEEN_TAGS = re.compile(r">\s+<")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def minify_workflow(content: str, tool_type: str):
+    """Strip designer metadata the reviewer doesn't need.
+
+    Returns (minified_content, stats) where stats reports byte and estimated
+    token savings for the file.
+    """
+    minified = content or ""
+
+    if MINIFY_ENABLED:
+        if tool_type == "UiPath":
+            for pattern in XAML_BLOCKS:
+                minified = pattern.sub("", minified)
+            minified = XAML_ATTRS.sub("", minified)
+        elif tool_type == "Blue Prism":
+            for pattern in BP_BLOCKS:
+                minified = pattern.sub("", minified)
+            minified = BP_ATTRS.sub("", minified)
+        minified = BETWEEN_TAGS.sub("><", minified).strip()
+
+    original_bytes = len((content or "").encode("utf-8"))
+    minified_bytes = len(minified.encode("utf-8"))
+    original_tokens = estimate_tokens(content or "")
+    minified_tokens = estimate_tokens(minified)
+
+    stats = {
+        "original_bytes": original_bytes,
+        "minified_bytes": minified_bytes,
+        "saved_bytes": original_bytes - minified_bytes,
+        "original_tokens_est": original_tokens,
+        "minified_tokens_est": minified_tokens,
+        "saved_tokens_est": original_tokens - minified_tokens,
+    }
+    return minified, stats
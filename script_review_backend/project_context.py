@@ -0,0 +1,103 @@
+"""Summary of a whole project, shared by every file reviewed from it.
+
+A workflow is reviewed better when the model knows the rest of the project:
+its dependencies (project.json) and which workflows exist, what arguments
+they take and what they invoke. The summary is built once per project and
+becomes part of the cached prompt prefix (see context_cache), so it is
+uploaded once instead of with every file. It is left out when the prefix
+can't be cached (too short, or no backend with a context-caching API).
+"""
+import os
+import json
+from xml.parsers import expat
+from config import load_config
+
+from chunk_utils import local_name
+from file_utils import detect_tool_type
+
+load_config()
+
+PROJECT_CONTEXT = os.getenv("PROJECT_CONTEXT", "1") == "1"
+PROJECT_CONTEXT_MAX_CHARS = int(os.getenv("PROJECT_CONTEXT_MAX_CHARS", 40000))
+
+MANIFEST_KEYS = ("name", "description", "main", "dependencies", "entryPoints", "expressionLanguage",
+                 "targetFramework")
+
+PROJECT_HEADER = """
+Project context (shared by every file of this project). Use it to judge how the
+workflow fits into the project - argument usage, invoked workflows, dependencies -
+but review only the workflow given below.
+"""
+
+
+def workflow_signature(content: str, tool_type: str) -> str:
+    """One line describing a workflow's interface: UiPath arguments and invoked files,
+    or the processes/objects in a Blue Prism release. Empty if it can't be parsed."""
+    arguments, invokes, items = [], [], []
+
+    def start(name, attrs):
+        local = local_name(name)
+        if tool_type == "UiPath":
+            if local == "Property" and attrs.get("Name"):
+                arguments.append(f"{attrs['Name']}: {attrs.get('Type', '?')}")
+            elif local == "InvokeWorkflowFile" and attrs.get("WorkflowFileName"):
+                invokes.append(attrs["WorkflowFileName"])
+        elif local in ("process", "object") and attrs.get("name"):
+            items.append(f"{local} '{attrs['name']}'")
+
+    parser = expat.ParserCreate(encoding="utf-8")
+    parser.StartElementHandler = start
+    try:
+        parser.Parse(content.encode("utf-8"), True)
+    except expat.ExpatError:
+        return ""
+    parts = []
+    if arguments:
+        parts.append("arguments " + ", ".join(arguments))
+    if invokes:
+        parts.append("invokes " + ", ".join(dict.fromkeys(invokes)))
+    if items:
+        parts.append(", ".join(items))
+    return "; ".join(parts)
+
+
+def load_manifest(root: str):
+    """The relevant part of a UiPath project.json in `root`, or None."""
+    try:
+        with open(os.path.join(root, "project.json"), encoding="utf-8-sig") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return {k: manifest[k] for k in MANIFEST_KEYS if k in manifest} or None
+
+
+def build_project_context(signatures: list, manifest: dict = None,
+                          max_chars: int = PROJECT_CONTEXT_MAX_CHARS) -> str:
+    """Project summary from [(filename, signature)]; empty when there's no project to speak of."""
+    if len(signatures) < 2 and not manifest:
+        return ""
+    lines = [PROJECT_HEADER]
+    if manifest:
+        lines.append("project.json: " + json.dumps(manifest, sort_keys=True))
+    lines.append("Workflows in this project:")
+    size = sum(len(line) + 1 for line in lines)
+    # Stable order so the same project always produces the same (cacheable) text
+    ordered = sorted(signatures)
+    for i, (filename, signature) in enumerate(ordered):
+        line = f"- {filename}" + (f" ({signature})" if signature else "")
+        if size + len(line) + 1 > max_chars:
+            lines.append(f"- ... and {len(ordered) - i} more")
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def files_context(files: list, manifest: dict = None) -> str:
+    """build_project_context() for in-memory [(filename, content)], e.g. an uploaded archive."""
+    if not PROJECT_CONTEXT:
+        return ""
+    return build_project_context(
+        [(name, workflow_signature(content, detect_tool_type(name, content))) for name, content in files],
+        manifest,
+    )
@@ -0,0 +1,225 @@
+import os
+import time
+import heapq
+import sqlite3
+import asyncio
+import itertools
+import threading
+import contextvars
+from config import load_config
+
+from minify_utils import estimate_tokens
+from metrics_utils import record, ADMISSION
+
+load_config()
+
+# Provider quota; 0 disables that budget. Both are per minute, shared by every
+# worker process through RATE_DB_PATH.
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+# Output tokens count against the quota too; charged up front per call
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", 1024))
+RATE_DB_PATH = os.getenv("RATE_DB_PATH", "rate_limits.sqlite3")
+RATE_POLL_SECONDS = float(os.getenv("RATE_POLL_SECONDS", 0.25))
+
+# Admission priorities, highest first, with the longest a call may queue for
+# quota before it is shed with a Retry-After
+PRIORITIES = ("interactive", "batch", "background")
+MAX_WAIT_SECONDS = {
+    "interactive": float(os.getenv("LLM_MAX_WAIT_INTERACTIVE", 20)),
+    "batch": float(os.getenv("LLM_MAX_WAIT_BATCH", 300)),
+    "background": float(os.getenv("LLM_MAX_WAIT_BACKGROUND", 3600)),
+}
+
+_priority = contextvars.ContextVar("admission_priority", default="interactive")
+
+
+def set_priority(priority: str):
+    """Admission priority for model calls made from the current request/task."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}' (expected one of {', '.join(PRIORITIES)})")
+    _priority.set(priority)
+
+
+def get_priority() -> str:
+    return _priority.get()
+
+
+def estimate_cost(prompt: str) -> int:
+    return estimate_tokens(prompt) + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+class RateLimited(RuntimeError):
+    """Shed: the call would wait longer than its priority allows."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateStore:
+    """Token buckets in SQLite so all server workers draw from one quota."""
+
+    def __init__(self, path: str = RATE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS rate_buckets (
+                    name TEXT PRIMARY KEY,
+                    requests REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    paused_until REAL NOT NULL DEFAULT 0
+                )"""
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def take(self, name: str, rpm: float, tpm: float, cost: float, dry_run: bool = False) -> float:
+        """Take one request and `cost` tokens; returns 0 on success, else seconds to wait.
+
+        A call larger than the whole token budget is let through once the bucket
+        is full (driving it negative), otherwise it could never run.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT requests, tokens, updated, paused_until FROM rate_buckets WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                requests, tokens, paused_until = rpm, tpm, 0.0
+            else:
+                elapsed = max(0.0, now - row[2])
+                requests = min(rpm, row[0] + elapsed * rpm / 60)
+                tokens = min(tpm, row[1] + elapsed * tpm / 60)
+                paused_until = row[3]
+
+            need = cost if dry_run else min(cost, tpm)
+            wait = paused_until - now
+            if rpm and requests < 1:
+                wait = max(wait, (1 - requests) * 60 / rpm)
+            if tpm and tokens < need:
+                wait = max(wait, (need - tokens) * 60 / tpm)
+
+            if wait <= 0 and not dry_run:
+                requests -= 1 if rpm else 0
+                tokens -= cost if tpm else 0
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?, ?, ?)",
+                (name, requests, tokens, now, paused_until),
+            )
+            conn.execute("COMMIT")
+        return max(0.0, wait)
+
+    def pause(self, name: str, seconds: float):
+        # Provider said 429 + Retry-After: nobody sends until then
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO rate_buckets VALUES (?, 0, 0, ?, 0)", (name, now))
+            conn.execute(
+                "UPDATE rate_buckets SET paused_until = MAX(paused_until, ?) WHERE name = ?", (now + seconds, name)
+            )
+
+
+class RateLimiter:
+    """Requests/min + tokens/min budget for one model backend.
+
+    Callers queue in priority order (interactive before batch before
+    background, FIFO within a priority); only the head of the queue draws from
+    the bucket, so a burst is smoothed to the quota instead of turning into
+    429s. A call whose expected wait exceeds its priority's limit is shed with
+    RateLimited(retry_after).
+    """
+
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0, store: RateStore = None):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.store = store or get_rate_store()
+        self._queue = []
+        self._wakeups = {}
+        self._seq = itertools.count()
+
+    def _backlog(self, rank: int) -> float:
+        # Tokens queued ahead of (or level with) a new caller of this rank
+        return sum(cost for r, _, cost in self._queue if r <= rank)
+
+    async def acquire(self, cost: float, priority: str = None):
+        priority = priority or get_priority()
+        rank = PRIORITIES.index(priority)
+        max_wait = MAX_WAIT_SECONDS[priority]
+        start = time.monotonic()
+        deadline = start + max_wait
+
+        ahead = sum(1 for r, _, _ in self._queue if r <= rank)
+        estimate = await asyncio.to_thread(
+            self.store.take, self.name, self.rpm, self.tpm, self._backlog(rank) + cost, True
+        )
+        if self.rpm:
+            estimate = max(estimate, ahead * 60 / self.rpm)
+        if estimate > max_wait:
+            ADMISSION.labels(self.name, priority, "shed").inc()
+            raise RateLimited(f"Model quota exhausted for '{self.name}' ({priority})", estimate)
+
+        ticket = (rank, next(self._seq), cost)
+        wakeup = self._wakeups[ticket] = asyncio.Event()
+        heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if self._queue[0] is not ticket:
+                    # Woken when the callers ahead have gone
+                    wakeup.clear()
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    wait = RATE_POLL_SECONDS
+                else:
+                    wait = await asyncio.to_thread(self.store.take, self.name, self.rpm, self.tpm, cost)
+                    if wait == 0:
+                        ADMISSION.labels(self.name, priority, "admitted").inc()
+                        record("quota_wait", time.monotonic() - start)
+                        return
+                    # Another worker process may take the tokens first; poll at least every RATE_POLL_SECONDS
+                    await asyncio.sleep(max(0.0, min(wait, RATE_POLL_SECONDS, remaining)))
+                if time.monotonic() >= deadline:
+                    ADMISSION.labels(self.name, priority, "shed").inc()
+                    raise RateLimited(f"Model quota exhausted for '{self.name}' ({priority})", wait)
+        finally:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            del self._wakeups[ticket]
+            if self._queue:
+                self._wakeups[self._queue[0]].set()
+
+    def pause(self, seconds: float):
+        self.store.pause(self.name, seconds)
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+
+_store = None
+
+
+def get_rate_store() -> RateStore:
+    global _store
+    if _store is None:
+        _store = RateStore()
+    return _store
+
+
+def build_limiter(name: str, rpm: float = None, tpm: float = None):
+    """None when neither budget is configured (no limiting, no SQLite round trip)."""
+    rpm = LLM_REQUESTS_PER_MINUTE if rpm is None else rpm
+    tpm = LLM_TOKENS_PER_MINUTE if tpm is None else tpm
+    if not rpm and not tpm:
+        return None
+    return RateLimiter(name, rpm, tpm)
@@ -0,0 +1,392 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from functools import lru_cache
+from xml.parsers import expat
+
+from gemini_client import REVIEW_INSTRUCTIONS, WORKFLOW_SECTION, PROMPT_VERSION, INCREMENTAL_PROMPT_TEMPLATE
+from llm_backends import generate_text, stream_text, get_pool
+from context_cache import SharedContext
+from file_utils import detect_tool_type, extract_json_from_text, JSONStreamParser
+from excel_utils import report_bytes
+from cache_utils import get_cache, make_cache_key
+from minify_utils import minify_workflow
+from chunk_utils import CHUNK_MAX_CHARS, chunk_workflow, merge_results
+from metrics_utils import stage, CACHE, BYTES
+from diff_utils import (
+    INCREMENTAL_MAX_CHANGED_RATIO, get_version_store, segment_hashes, diff_segments,
+    changed_context, merge_incremental,
+)
+from history_store import get_history_store
+from similarity_utils import SIMILARITY_REVIEW, SIMILARITY_THRESHOLD, minhash_sketch, get_similarity_index
+from rule_engine import (
+    REVIEW_MODE, REVIEW_MODES, run_rules, findings_to_result, residual_content, residual_note, merge_hybrid,
+)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+
+logger = logging.getLogger(__name__)
+
+
+def split_emails(text):
+    return [e.strip() for e in text.split(",") if e.strip()] if text else []
+
+
+@lru_cache(maxsize=64)
+def review_context(tool_type: str, project: str = "") -> SharedContext:
+    """Prompt prefix shared by every review of `tool_type` files (of one project, if given).
+
+    The project summary is only included when the prefix can be served from a
+    context cache; sent inline it would cost its tokens again for every file.
+    """
+    instructions = REVIEW_INSTRUCTIONS % tool_type
+    if project:
+        context = SharedContext(instructions, cache_only=project)
+        if context.cacheable and get_pool().caches_context:
+            return context
+    return SharedContext(instructions)
+
+
+async def _review_prompt(tool_type: str, content: str, note: str = "", project: str = "") -> dict:
+    # Only the workflow-specific part; the instructions go as a (cached) shared prefix
+    prompt = WORKFLOW_SECTION % content + note
+    BYTES.labels("prompt").inc(len(prompt))
+    with stage("llm"):
+        raw_response = await generate_text(prompt, review_context(tool_type, project))
+    with stage("json_extract"):
+        return extract_json_from_text(raw_response)
+
+
+async def review_chunks(tool_type: str, content: str, note: str = "", project: str = "") -> dict:
+    with stage("chunk"):
+        # A full expat pass; large workflows would stall every other request on the loop
+        chunks = await asyncio.to_thread(chunk_workflow, content, tool_type)
+    if len(chunks) == 1:
+        return await _review_prompt(tool_type, content, note, project)
+
+    # Chunks run in parallel; the shared model client bounds how many are actually in flight
+    total = len(chunks)
+    results = await asyncio.gather(*(
+        _review_prompt(tool_type, f"(Part {i + 1} of {total}: {c['label']})\n{c['content']}", note, project)
+        for i, c in enumerate(chunks)
+    ))
+    return merge_results(tool_type, [
+        (c["label"], len(c["content"]), r) for c, r in zip(chunks, results)
+    ])
+
+
+def resolve_mode(mode) -> str:
+    mode = (mode or REVIEW_MODE).lower()
+    if mode not in REVIEW_MODES:
+        raise ValueError(f"Unknown review mode '{mode}' (expected one of {', '.join(REVIEW_MODES)})")
+    return mode
+
+
+def preprocess(filename: str, content: str, mode: str) -> dict:
+    """CPU-only front half of a review: detect, minify and (unless llm mode) static rules.
+
+    Takes and returns plain data so callers can run it in a thread or process pool;
+    it must not run on the event loop.
+    """
+    # ===== DETECT TOOL TYPE =====
+    with stage("detect"):
+        tool_type = detect_tool_type(filename, content)
+    file_hash = hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+    # ===== STRIP DESIGNER METADATA =====
+    with stage("minify"):
+        content, minify_stats = minify_workflow(content, tool_type)
+
+    # ===== STATIC RULES =====
+    findings = residual = None
+    if mode != "llm":
+        with stage("static_rules"):
+            findings = run_rules(content, tool_type)
+            if mode == "hybrid":
+                # Only what the rules didn't settle goes to the model
+                residual = residual_content(content, tool_type, findings)
+
+    # ===== NEAR-DUPLICATE SKETCH =====
+    sketch = None
+    if mode == "llm" and SIMILARITY_REVIEW:
+        with stage("sketch"):
+            sketch = minhash_sketch(content)
+    return {"tool_type": tool_type, "content": content, "minify": minify_stats, "findings": findings,
+            "residual": residual, "file_hash": file_hash, "sketch": sketch}
+
+
+async def _prepare(prepared: dict, mode: str, project: str = ""):
+    """Shared front half of a review: byte counters and cache lookup for a preprocessed file."""
+    tool_type, content, minify_stats = prepared["tool_type"], prepared["content"], prepared["minify"]
+    BYTES.labels("workflow").inc(minify_stats["original_bytes"])
+    BYTES.labels("minified").inc(minify_stats["minified_bytes"])
+    meta = {"cached": False, "mode": mode, "minify": minify_stats}
+
+    # ===== CHECK CACHE =====
+    cache = get_cache()
+    prompt_version = f"{PROMPT_VERSION}:{mode}"
+    context = review_context(tool_type, project) if project and mode != "static" else None
+    if context is not None and context.cache_only:
+        # The project summary is part of the prompt, so it's part of the key
+        prompt_version += ":" + context.digest
+    cache_key = make_cache_key(content, tool_type, get_pool().model_tag, prompt_version)
+    with stage("cache_lookup"):
+        cached = await asyncio.to_thread(cache.get, cache_key) if cache else None
+    CACHE.labels("hit" if cached else "miss").inc()
+    meta["cached"] = bool(cached)
+
+    return tool_type, content, meta, cache_key, cached
+
+
+async def _record_history(workflow_id: str, filename: str, prepared: dict, json_obj: dict, meta: dict):
+    history = get_history_store()
+    if history is None:
+        return
+    try:
+        with stage("history"):
+            await asyncio.to_thread(
+                history.add, workflow_id, filename, json_obj, prepared.get("file_hash"), meta["mode"], meta["cached"],
+            )
+    except Exception:
+        # History is for audits; a failed write must not fail the review itself
+        logger.exception("Could not record review history for %s", workflow_id or filename)
+
+
+async def _finish(json_obj: dict, cache_key: str) -> bytes:
+    # ===== CREATE EXCEL IN MEMORY =====
+    with stage("excel"):
+        excel_bytes = report_bytes(json_obj)
+
+    cache = get_cache()
+    if cache:
+        with stage("cache_store"):
+            await asyncio.to_thread(cache.set, cache_key, json_obj, excel_bytes)
+    return excel_bytes
+
+
+async def review_llm(workflow_id: str, tool_type: str, content: str, meta: dict, sketch: list = None,
+                     project: str = "", file_hash: str = None) -> dict:
+    """LLM review that only sends changed activities when an earlier version was reviewed.
+
+    Without an earlier version of this workflow, a near-identical workflow that
+    was already reviewed (e.g. another copy of the same template) serves as the
+    baseline instead; meta["similarity"] reports which one and how similar.
+    Versions are only tracked for an explicit workflow_id: a bare filename such as
+    Main.xaml is shared by unrelated projects. Every review still serves as a
+    similarity baseline, under its workflow_id or else its file hash.
+    """
+    store = get_version_store()
+    if store is None:
+        return await review_chunks(tool_type, content, project=project)
+
+    try:
+        with stage("diff"):
+            hashes, data, activities = segment_hashes(content, tool_type)
+    except expat.ExpatError:
+        return await review_chunks(tool_type, content, project=project)
+
+    tag = f"{tool_type}:{get_pool().model_tag}:{PROMPT_VERSION}"
+    previous = await asyncio.to_thread(store.get, workflow_id, tag) if workflow_id else None
+    json_obj = None
+
+    index = get_similarity_index() if sketch else None
+    if previous is None and index is not None:
+        with stage("similarity"):
+            match = await asyncio.to_thread(index.best_match, sketch, tag, exclude=workflow_id)
+        if match and match[1] >= SIMILARITY_THRESHOLD:
+            previous = await asyncio.to_thread(store.get, match[0], tag)
+            if previous:
+                meta["similarity"] = {"matched": match[0], "score": round(match[1], 3)}
+
+    if previous:
+        old_hashes, prev_result = previous
+        changed, removed = diff_segments(old_hashes, hashes)
+        meta["incremental"] = {"changed": len(changed), "removed": len(removed), "total": len(hashes)}
+
+        if not changed and not removed:
+            # Only non-structural noise changed: carry the whole review forward
+            json_obj = prev_result
+        elif len(changed) <= INCREMENTAL_MAX_CHANGED_RATIO * len(hashes):
+            context = changed_context(data, activities, changed)
+            if len(context) <= CHUNK_MAX_CHARS:
+                prompt = INCREMENTAL_PROMPT_TEMPLATE % (
+                    tool_type,
+                    prev_result.get("compliance_score"),
+                    json.dumps(prev_result.get("issues", [])),
+                    json.dumps(removed) if removed else "none",
+                    context,
+                )
+                BYTES.labels("prompt").inc(len(prompt))
+                with stage("llm"):
+                    raw_response = await generate_text(prompt)
+                with stage("json_extract"):
+                    update = extract_json_from_text(raw_response)
+                json_obj = merge_incremental(prev_result, update)
+
+    if json_obj is None:
+        meta.setdefault("incremental", {})["full_review"] = True
+        json_obj = await review_chunks(tool_type, content, project=project)
+
+    baseline = workflow_id or (f"sha256:{file_hash}" if file_hash else None)
+    if baseline:
+        await asyncio.to_thread(store.put, baseline, tag, hashes, json_obj)
+        if index is not None:
+            await asyncio.to_thread(index.put, baseline, tag, sketch)
+    return json_obj
+
+
+async def review_content(filename: str, content: str, mode: str = None, workflow_id: str = None,
+                         prepared: dict = None, project: str = ""):
+    """Run one review. Returns (json_obj, excel_bytes, meta).
+
+    mode: "llm" (Gemini only), "static" (local rule engine only, no Gemini call)
+    or "hybrid" (rule engine findings + Gemini for everything else).
+    workflow_id identifies successive versions of the same workflow; in llm mode
+    only activities changed since the last reviewed version are sent to the model.
+    Without it every upload gets a full review and is recorded in history without an identity.
+    prepared: the output of preprocess() when it already ran elsewhere (e.g. in a
+    worker process); filename/content are then only used for identity.
+    project: summary of the project the file belongs to (project_context), sent
+    with the instructions as a cached shared prefix; ignored when it can't be cached.
+    """
+    mode = resolve_mode(mode)
+    if prepared is None:
+        prepared = await asyncio.to_thread(preprocess, filename, content, mode)
+    tool_type, content, meta, cache_key, cached = await _prepare(prepared, mode, project)
+    if cached:
+        json_obj, excel_bytes = cached
+        await _record_history(workflow_id, filename, prepared, json_obj, meta)
+        return json_obj, excel_bytes, meta
+    findings = prepared["findings"] or []
+
+    # ===== CALL GEMINI (chunked for large workflows) =====
+    if mode == "static":
+        json_obj = findings_to_result(tool_type, findings)
+    elif mode == "hybrid":
+        llm_obj = await review_chunks(tool_type, prepared["residual"], residual_note(findings), project)
+        json_obj = merge_hybrid(findings_to_result(tool_type, findings), llm_obj)
+    else:
+        json_obj = await review_llm(workflow_id, tool_type, content, meta, prepared["sketch"], project,
+                                    prepared.get("file_hash"))
+
+    excel_bytes = await _finish(json_obj, cache_key)
+    await _record_history(workflow_id, filename, prepared, json_obj, meta)
+    return json_obj, excel_bytes, meta
+
+
+def _item_events(json_obj: dict, label: str = None):
+    for key, event in (("issues", "issue"), ("recommendations", "recommendation")):
+        for value in json_obj.get(key, []):
+            yield event, {"value": value, "part": label} if label else {"value": value}
+
+
+async def stream_review(filename: str, content: str, mode: str = None):
+    """Async generator of (event, data) pairs for Server-Sent Events.
+
+    Emits "meta" first, then "issue"/"recommendation" as soon as each one is
+    parsed out of the Gemini stream (static findings come immediately), and a
+    final "result" with the merged report.
+    """
+    mode = resolve_mode(mode)
+    prepared = await asyncio.to_thread(preprocess, filename, content, mode)
+    tool_type, content, meta, cache_key, cached = await _prepare(prepared, mode)
+
+    if cached:
+        json_obj = cached[0]
+        await _record_history(None, filename, prepared, json_obj, meta)
+        yield "meta", {**meta, "tool": tool_type}
+        for event in _item_events(json_obj):
+            yield event
+        yield "result", {"result": json_obj, **meta}
+        return
+
+    findings = prepared["findings"] or []
+    static_obj = findings_to_result(tool_type, findings) if mode != "llm" else None
+
+    with stage("chunk"):
+        llm_content = prepared["residual"] if mode == "hybrid" else content
+        chunks = await asyncio.to_thread(chunk_workflow, llm_content, tool_type) if mode != "static" else []
+    yield "meta", {**meta, "tool": tool_type, "parts": len(chunks)}
+
+    if static_obj:
+        for event in _item_events(static_obj):
+            yield event
+
+    if mode == "static":
+        json_obj = static_obj
+    else:
+        note = residual_note(findings) if mode == "hybrid" else ""
+        total = len(chunks)
+        queue = asyncio.Queue()
+
+        async def _stream_chunk(i, chunk):
+            part = chunk["content"] if total == 1 else f"(Part {i + 1} of {total}: {chunk['label']})\n{chunk['content']}"
+            prompt = WORKFLOW_SECTION % part + note
+            BYTES.labels("prompt").inc(len(prompt))
+            parser = JSONStreamParser()
+            try:
+                with stage("llm"):
+                    async for fragment in stream_text(prompt, review_context(tool_type)):
+                        for kind, key, value in parser.feed(fragment):
+                            if kind == "item":
+                                await queue.put(("item", i, (key, value)))
+                if parser.result is None:
+                    raise ValueError("Unbalanced JSON" if parser.start is not None else "JSON not found")
+                await queue.put(("done", i, parser.result))
+            except Exception as e:
+                await queue.put(("error", i, e))
+
+        tasks = [asyncio.create_task(_stream_chunk(i, c)) for i, c in enumerate(chunks)]
+        results, error = {}, None
+        try:
+            while len(results) < total and error is None:
+                kind, i, value = await queue.get()
+                if kind == "item":
+                    key, item = value
+                    data = {"value": item}
+                    if total > 1:
+                        data["part"] = chunks[i]["label"]
+                    yield ("issue" if key == "issues" else "recommendation"), data
+                elif kind == "done":
+                    results[i] = value
+                else:
+                    error = value
+        finally:
+            for task in tasks:
+                task.cancel()
+        if error is not None:
+            raise error
+
+        if total == 1:
+            llm_obj = results[0]
+        else:
+            llm_obj = merge_results(tool_type, [
+                (c["label"], len(c["content"]), results[i]) for i, c in enumerate(chunks)
+            ])
+        json_obj = merge_hybrid(static_obj, llm_obj) if static_obj else llm_obj
+
+    await _finish(json_obj, cache_key)
+    await _record_history(None, filename, prepared, json_obj, meta)
+    yield "result", {"result": json_obj, **meta}
+
+
+async def review_many(files: list, concurrency: int = BATCH_CONCURRENCY, mode: str = None,
+                      project: str = "") -> list:
+    """Review [(filename, content)] with bounded concurrency.
+
+    Returns one dict per file, in input order; failures are reported per file
+    instead of aborting the whole batch. `project` is shared by every file.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(filename, content):
+        async with semaphore:
+            try:
+                json_obj, _, meta = await review_content(filename, content, mode, project=project)
+                return {"filename": filename, "result": json_obj, **meta}
+            except Exception as e:
+                return {"filename": filename, "error": str(e)}
+
+    return await asyncio.gather(*(_one(name, content) for name, content in files))
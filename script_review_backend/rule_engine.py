@@ -0,0 +1,369 @@
+import os
+import re
+from xml.parsers import expat
+from xml.sax.saxutils import unescape
+
+REVIEW_MODES = ("llm", "static", "hybrid")
+REVIEW_MODE = os.getenv("REVIEW_MODE", "llm")
+DELAY_MAX_SECONDS = int(os.getenv("DELAY_MAX_SECONDS", 30))
+
+SEVERITY_PENALTY = {"high": 20, "medium": 10, "low": 3}
+
+CREDENTIAL_NAME = re.compile(r"pass(word)?|pwd|secret|api_?key|token|credential", re.I)
+WORD = re.compile(r"[A-Za-z_]\w*")
+BP_REFERENCE = re.compile(r"\[([^\[\]]+)\]")
+TIMESPAN = re.compile(r"^(?:(\d+)\.)?(\d{1,2}):(\d{2}):(\d{2})(?:\.\d+)?$")
+
+# Hybrid mode: markup the rules already judged, rewritten before the workflow goes to the model
+MASK = "***"
+ATTRIBUTE = re.compile(r'(\s([\w:.]+)=")([^"]*)(")')
+XAML_VARIABLE = re.compile(r"<Variable\b[^>]*?(?:/>|(?<!/)>.*?</Variable>)", re.S)
+BP_DATA_STAGE = re.compile(r'<stage\b[^>]*\btype="Data"[^>]*(?<!/)>.*?</stage>', re.S)
+BP_DATATYPE = re.compile(r"<datatype>([^<]*)</datatype>")
+BP_INITIAL_VALUE = re.compile(r"(<initialvalue\b[^>]*>)([^<]*)(</initialvalue>)")
+
+# UiPath activities whose DisplayName was left at the designer default
+UIPATH_DEFAULT_NAMES = {
+    "Sequence", "Flowchart", "Assign", "Multiple Assign", "If", "Click", "Type Into", "Get Text",
+    "Log Message", "Message Box", "Invoke Workflow File", "Delay", "Try Catch", "For Each",
+    "While", "Do While", "Switch", "Open Browser", "Attach Browser", "Use Application/Browser",
+    "Element Exists", "Read Range", "Write Range", "Excel Application Scope", "Invoke Code",
+}
+# UiPath elements that only structure other activities (a Catch holding only these is empty)
+UIPATH_CONTAINERS = {"ActivityAction", "DelegateInArgument", "Sequence", "Catch"}
+BP_DEFAULT_NAME = re.compile(
+    r"^(Action|Decision|Calculation|Calc|Note|Data|Collection|Wait|Anchor|Recover|Resume|"
+    r"Exception|Block|Choice|Multiple Calculation|Loop Start|Loop End|Page|Process|Object)\s*\d+$"
+)
+
+
+def _local(name: str) -> str:
+    return name.rsplit(":", 1)[-1]
+
+
+def _timespan_seconds(value: str):
+    m = TIMESPAN.match((value or "").strip())
+    if not m:
+        return None
+    days, hours, minutes, seconds = (int(g or 0) for g in m.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def _is_literal(value: str) -> bool:
+    # UiPath expressions are wrapped in [...]; {x:Null} means "not set"
+    value = (value or "").strip()
+    return bool(value) and not value.startswith("[") and not value.startswith("{")
+
+
+def _is_credential_literal(value: str) -> bool:
+    return _is_literal(value) and value.strip().lower() not in ("true", "false")
+
+
+def _finding(rule: str, severity: str, issue: str, recommendation: str, target: str = None) -> dict:
+    # target: the variable / data item the finding is about, where there is one
+    return {"rule": rule, "severity": severity, "issue": issue, "recommendation": recommendation,
+            "target": target}
+
+
+class _UiPathRules:
+    def __init__(self):
+        self.findings = []
+        self.variables = set()
+        self.words = set()
+        self.has_try_catch = False
+        self.catch_stack = []        # activity counts for open Catch blocks
+        self.text = []
+
+    def start(self, name, attrs):
+        local = _local(name)
+
+        if local == "TryCatch":
+            self.has_try_catch = True
+        if self.catch_stack and local not in UIPATH_CONTAINERS and "." not in local:
+            self.catch_stack = [count + 1 for count in self.catch_stack]
+        if local == "Catch":
+            self.catch_stack.append(0)
+
+        if local == "Variable" and attrs.get("Name"):
+            self.variables.add(attrs["Name"])
+            default = attrs.get("Default", "")
+            if CREDENTIAL_NAME.search(attrs["Name"]) and _is_credential_literal(default):
+                self.findings.append(_finding(
+                    "hardcoded-credential", "high",
+                    f"Variable '{attrs['Name']}' has a hard-coded credential as its default value.",
+                    "Load credentials from Orchestrator assets / Windows Credential Manager (Get Credential).",
+                ))
+
+        display = attrs.get("DisplayName")
+        if display and re.sub(r"\s*\d+$", "", display) in UIPATH_DEFAULT_NAMES:
+            self.findings.append(_finding(
+                "default-activity-name", "low",
+                f"Activity '{display}' ({local}) still uses its default display name.",
+                f"Rename '{display}' to describe what the step does.",
+            ))
+
+        if local == "Delay":
+            seconds = _timespan_seconds(attrs.get("Duration", ""))
+            if seconds is not None and seconds > DELAY_MAX_SECONDS:
+                self.findings.append(_finding(
+                    "long-delay", "medium",
+                    f"Delay '{display or local}' waits a hard-coded {attrs.get('Duration')} ({seconds}s).",
+                    "Replace long fixed delays with element/condition waits or a configurable timeout.",
+                ))
+
+        for key, value in attrs.items():
+            if key == "Name" and local == "Variable":
+                continue
+            if CREDENTIAL_NAME.search(_local(key)) and _is_credential_literal(value):
+                self.findings.append(_finding(
+                    "hardcoded-credential", "high",
+                    f"Hard-coded credential in {local} '{display or ''}' attribute {_local(key)}.",
+                    "Load credentials from Orchestrator assets / Windows Credential Manager (Get Credential).",
+                ))
+            self.words.update(WORD.findall(value))
+
+        self.text.clear()
+
+    def end(self, name):
+        local = _local(name)
+        self.words.update(WORD.findall("".join(self.text)))
+        self.text.clear()
+        if local == "Catch":
+            activities = self.catch_stack.pop()
+            if activities == 0:
+                self.findings.append(_finding(
+                    "empty-catch", "high",
+                    "Catch block is empty; exceptions are swallowed silently.",
+                    "Log the exception (Log Message / Throw / Rethrow) inside every Catch.",
+                ))
+
+    def finish(self):
+        if not self.has_try_catch:
+            self.findings.append(_finding(
+                "missing-try-catch", "high",
+                "Workflow has no Try/Catch error handling.",
+                "Wrap risky activities (UI interaction, file/network I/O) in Try Catch with logging.",
+            ))
+        for var in sorted(self.variables):
+            if var not in self.words:
+                self.findings.append(_finding(
+                    "unused-variable", "low",
+                    f"Variable '{var}' is declared but never used.",
+                    f"Remove unused variable '{var}'.",
+                    target=var,
+                ))
+
+
+class _BluePrismRules:
+    def __init__(self):
+        self.findings = []
+        self.stage = None            # dict for the currently open <stage>
+        self.data_items = set()
+        self.references = set()
+        self.stage_types = set()
+        self.path = []
+        self.text = []
+
+    def start(self, name, attrs):
+        local = _local(name)
+        self.path.append(local)
+        if local == "stage":
+            self.stage = {"name": attrs.get("name", ""), "type": attrs.get("type", ""), "fields": {}}
+            self.stage_types.add(self.stage["type"])
+        for value in attrs.values():
+            self.references.update(BP_REFERENCE.findall(value))
+        self.text.clear()
+
+    def end(self, name):
+        local = self.path.pop()
+        value = "".join(self.text).strip()
+        self.text.clear()
+        self.references.update(BP_REFERENCE.findall(value))
+        if self.stage is not None and local != "stage" and self.path and self.path[-1] == "stage":
+            self.stage["fields"][local] = value
+        if local == "stage" and self.stage is not None:
+            self._check_stage(self.stage)
+            self.stage = None
+
+    def _check_stage(self, stage):
+        name, kind, fields = stage["name"], stage["type"], stage["fields"]
+
+        if BP_DEFAULT_NAME.match(name):
+            self.findings.append(_finding(
+                "default-activity-name", "low",
+                f"{kind or 'Stage'} stage '{name}' still uses its default name.",
+                f"Rename stage '{name}' to describe what it does.",
+            ))
+
+        if kind == "Data":
+            self.data_items.add(name)
+            initial = fields.get("initialvalue", "")
+            if initial and (fields.get("datatype") == "password" or CREDENTIAL_NAME.search(name)):
+                self.findings.append(_finding(
+                    "hardcoded-credential", "high",
+                    f"Data item '{name}' holds a hard-coded credential as its initial value.",
+                    "Fetch credentials from the Blue Prism Credential Manager at run time.",
+                ))
+
+        if kind == "WaitStart":
+            try:
+                timeout = float(fields.get("timeout", ""))
+            except ValueError:
+                timeout = None
+            if timeout is not None and timeout > DELAY_MAX_SECONDS:
+                self.findings.append(_finding(
+                    "long-delay", "medium",
+                    f"Wait stage '{name}' uses a hard-coded {timeout:g}s timeout.",
+                    "Drive wait timeouts from environment variables / config.",
+                ))
+
+    def finish(self):
+        if "Recover" not in self.stage_types:
+            self.findings.append(_finding(
+                "missing-try-catch", "high",
+                "No Recover stage found; exceptions are not handled.",
+                "Add Recover/Resume blocks around pages that interact with applications.",
+            ))
+        elif "Resume" not in self.stage_types:
+            self.findings.append(_finding(
+                "empty-catch", "high",
+                "Recover stage without a matching Resume; the exception is never cleared.",
+                "Pair every Recover stage with a Resume stage and log the exception detail.",
+            ))
+        for item in sorted(self.data_items):
+            if item not in self.references:
+                self.findings.append(_finding(
+                    "unused-variable", "low",
+                    f"Data item '{item}' is never referenced.",
+                    f"Remove unused data item '{item}'.",
+                    target=item,
+                ))
+
+
+def run_rules(content: str, tool_type: str) -> list:
+    """Walk the workflow once and return a list of finding dicts."""
+    if tool_type == "UiPath":
+        rules = _UiPathRules()
+    elif tool_type == "Blue Prism":
+        rules = _BluePrismRules()
+    else:
+        return []
+
+    parser = expat.ParserCreate(encoding="utf-8")
+    parser.StartElementHandler = rules.start
+    parser.EndElementHandler = rules.end
+    parser.CharacterDataHandler = rules.text.append
+    try:
+        parser.Parse((content or "").encode("utf-8"), True)
+    except expat.ExpatError as e:
+        return [_finding(
+            "malformed-xml", "high",
+            f"Workflow is not well-formed XML ({e}).",
+            "Re-export the workflow from the designer.",
+        )]
+
+    rules.finish()
+    return rules.findings
+
+
+def findings_to_result(tool_type: str, findings: list) -> dict:
+    """Convert findings into the {tool, compliance_score, issues, recommendations} schema."""
+    penalty = sum(SEVERITY_PENALTY.get(f["severity"], 0) for f in findings)
+    recs = []
+    for f in findings:
+        if f["recommendation"] not in recs:
+            recs.append(f["recommendation"])
+    return {
+        "tool": tool_type,
+        "compliance_score": max(0, 100 - penalty),
+        "issues": [f"[{f['severity']}] {f['issue']}" for f in findings],
+        "recommendations": recs,
+    }
+
+
+def _attribute(tag: str, name: str):
+    m = re.search(r'\s%s="([^"]*)"' % re.escape(name), tag)
+    return unescape(m.group(1), {"&quot;": '"'}) if m else None
+
+
+def _mask_attribute(m) -> str:
+    # The same test as the hardcoded-credential rule, on the raw (escaped) markup
+    key, value = m.group(2), unescape(m.group(3), {"&quot;": '"'})
+    if CREDENTIAL_NAME.search(_local(key)) and _is_credential_literal(value):
+        return m.group(1) + MASK + m.group(4)
+    return m.group(0)
+
+
+def _residual_variable(markup: str, unused: set) -> str:
+    start_tag = markup.split(">", 1)[0]
+    name = _attribute(start_tag, "Name")
+    if name in unused:
+        return ""
+    if name and CREDENTIAL_NAME.search(name):
+        markup = re.sub(
+            r'(\sDefault=")([^"]*)(")',
+            lambda m: m.group(1) + MASK + m.group(3) if _is_credential_literal(unescape(m.group(2))) else m.group(0),
+            markup, count=1,
+        )
+    return markup
+
+
+def _residual_data_stage(markup: str, unused: set) -> str:
+    name = _attribute(markup.split(">", 1)[0], "name") or ""
+    if name in unused:
+        return ""
+    datatype = BP_DATATYPE.search(markup)
+    if (datatype and datatype.group(1) == "password") or CREDENTIAL_NAME.search(name):
+        markup = BP_INITIAL_VALUE.sub(
+            lambda m: m.group(1) + MASK + m.group(3) if m.group(2).strip() else m.group(0), markup)
+    return markup
+
+
+def residual_content(content: str, tool_type: str, findings: list) -> str:
+    """The workflow as hybrid mode sends it: minus what the rules already settled.
+
+    Variables / data items reported as unused are dropped and hard-coded
+    credentials are masked. Activities stay whole: logic, selectors and logging
+    are exactly what the model is still asked to review.
+    """
+    if any(f["rule"] == "malformed-xml" for f in findings):
+        return content
+    unused = {f["target"] for f in findings if f["rule"] == "unused-variable"}
+    if tool_type == "UiPath":
+        content = XAML_VARIABLE.sub(lambda m: _residual_variable(m.group(0), unused), content)
+        return ATTRIBUTE.sub(_mask_attribute, content)
+    if tool_type == "Blue Prism":
+        return BP_DATA_STAGE.sub(lambda m: _residual_data_stage(m.group(0), unused), content)
+    return content
+
+
+def residual_note(findings: list) -> str:
+    """Prompt suffix for hybrid mode: tells the model which checks are already covered."""
+    rules = sorted({f["rule"] for f in findings} | {
+        "hardcoded-credential", "missing-try-catch", "empty-catch", "long-delay",
+        "unused-variable", "default-activity-name",
+    })
+    return (
+        "\nThe following checks were already run by a static analyser; do NOT report them again: "
+        + ", ".join(rules)
+        + ". Unused variables were removed from the workflow and hard-coded credentials replaced with "
+        + MASK
+        + ". Focus on the remaining aspects (logic, selectors, maintainability, logging, configuration).\n"
+    )
+
+
+def merge_hybrid(static_obj: dict, llm_obj: dict) -> dict:
+    recs = list(static_obj.get("recommendations", []))
+    for rec in llm_obj.get("recommendations", []):
+        if rec not in recs:
+            recs.append(rec)
+    try:
+        score = min(int(static_obj["compliance_score"]), int(llm_obj.get("compliance_score")))
+    except (TypeError, ValueError):
+        score = static_obj["compliance_score"]
+    return {
+        "tool": static_obj.get("tool") or llm_obj.get("tool"),
+        "compliance_score": score,
+        "issues": static_obj.get("issues", []) + llm_obj.get("issues", []),
+        "recommendations": recs,
+    }
@@ -0,0 +1,184 @@
+"""Review every workflow under a project / export directory.
+
+    python scan_project.py path/to/project --out audit.xlsx
+    python scan_project.py path/to/export --out audit.json --mode hybrid --processes 8 --concurrency 16
+
+Files are classified with detect_tool_type; reading, decoding, minifying and
+static rules run in a process pool, model calls run concurrently on the
+event loop (at batch priority, so a shared quota still favours interactive
+users). Every finished file is appended to a JSONL checkpoint next to the
+report; re-running the same command skips files already reviewed whose size
+and modification time are unchanged, so an interrupted nightly audit resumes
+where it stopped. The consolidated report has the same layout as
+/validate-batch (summary + one sheet per file for xlsx).
+
+Before reviewing, the project is summarised once (project.json plus every
+workflow's arguments and invoked files); the summary rides along with the
+reviewer instructions as a cached prompt prefix shared by all files.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from file_utils import detect_tool_type
+from upload_utils import read_stream
+from review_service import preprocess, review_content, resolve_mode
+from project_context import PROJECT_CONTEXT, workflow_signature, build_project_context, load_manifest
+from excel_utils import REPORT_FORMATS, report_bytes
+from gemini_client import close_client
+from rate_limiter import set_priority
+
+# Folders that hold build output, package caches or VCS data, not project workflows
+SKIP_DIRS = {".git", ".svn", ".hg", ".local", ".objects", ".tmp", ".screenshots", "__pycache__", "node_modules"}
+
+
+def find_workflows(root: str):
+    """Yield (relative path, tool type) for every reviewable file, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for name in sorted(filenames):
+            tool_type = detect_tool_type(name, "")
+            if tool_type != "Incorrect file":
+                yield os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/"), tool_type
+
+
+def file_signature(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_size, int(st.st_mtime)]
+
+
+def load_checkpoint(path: str) -> dict:
+    """{relative path: entry} from an append-only JSONL checkpoint (a torn last line is ignored)."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            done[entry["filename"]] = entry
+    return done
+
+
+def _prepare_file(root: str, rel: str, mode: str) -> dict:
+    # Runs in a worker process
+    with open(os.path.join(root, rel), "rb") as f:
+        content = read_stream(f, name=rel)
+    return preprocess(rel, content, mode)
+
+
+def _signature_file(root: str, rel: str, tool_type: str) -> str:
+    # Runs in a worker process
+    with open(os.path.join(root, rel), "rb") as f:
+        return workflow_signature(read_stream(f, name=rel), tool_type)
+
+
+async def _project_context(pool, root: str, workflows: list) -> str:
+    loop = asyncio.get_running_loop()
+    signatures = await asyncio.gather(
+        *(loop.run_in_executor(pool, _signature_file, root, rel, tool_type) for rel, tool_type in workflows),
+        return_exceptions=True,
+    )
+    return build_project_context(
+        [(rel, "" if isinstance(sig, Exception) else sig) for (rel, _), sig in zip(workflows, signatures)],
+        load_manifest(root),
+    )
+
+
+async def scan(args) -> list:
+    set_priority("batch")
+    mode = resolve_mode(args.mode)
+    root_id = os.path.abspath(args.root).replace(os.sep, "/")
+    workflows = list(find_workflows(args.root))
+    checkpoint = load_checkpoint(args.checkpoint)
+
+    results, todo = {}, []
+    for rel, _ in workflows:
+        entry = checkpoint.get(rel)
+        signature = file_signature(os.path.join(args.root, rel))
+        if entry and entry.get("signature") == signature and "error" not in entry:
+            results[rel] = entry
+        else:
+            todo.append((rel, signature))
+    print(f"{len(workflows)} workflow files, {len(results)} already reviewed, {len(todo)} to go", flush=True)
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    progress = {"done": 0, "failed": 0, "started": time.monotonic()}
+
+    with ProcessPoolExecutor(max_workers=args.processes) as pool, \
+            open(args.checkpoint, "a", encoding="utf-8") as log:
+        project = ""
+        if todo and args.project_context and mode != "static":
+            project = await _project_context(pool, args.root, workflows)
+            print(f"Project context: {len(project)} chars shared by every prompt", flush=True)
+
+        async def review_one(rel: str, signature: list):
+            async with semaphore:
+                entry = {"filename": rel, "signature": signature}
+                try:
+                    prepared = await loop.run_in_executor(pool, _prepare_file, args.root, rel, mode)
+                    # Project + relative path: the same rel path in another project is another workflow
+                    workflow_id = f"{root_id}/{rel}"
+                    json_obj, _, meta = await review_content(rel, prepared["content"], mode, workflow_id, prepared,
+                                                             project)
+                    entry.update(result=json_obj, **meta)
+                except Exception as e:
+                    entry["error"] = str(e)
+                    progress["failed"] += 1
+            results[rel] = entry
+            log.write(json.dumps(entry) + "\n")
+            log.flush()
+            progress["done"] += 1
+            if progress["done"] % args.progress_every == 0 or progress["done"] == len(todo):
+                elapsed = time.monotonic() - progress["started"]
+                print(f"  {progress['done']}/{len(todo)} reviewed ({progress['failed']} failed, "
+                      f"{progress['done'] / elapsed:.1f} files/s)", flush=True)
+
+        await asyncio.gather(*(review_one(rel, signature) for rel, signature in todo))
+    await close_client()
+
+    # Walk order, not completion order
+    return [results[rel] for rel, _ in workflows if rel in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Review all UiPath / Blue Prism workflows under a directory")
+    parser.add_argument("root", help="project or export directory")
+    parser.add_argument("--out", default="review_report.xlsx", help="report file (.xlsx, .json or .csv)")
+    parser.add_argument("--checkpoint", default=None, help="progress file (default <out>.checkpoint.jsonl)")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--mode", default=None, help="llm | static | hybrid (default REVIEW_MODE)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="parsing processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="files in flight at once")
+    parser.add_argument("--progress-every", type=int, default=25)
+    parser.add_argument("--no-project-context", dest="project_context", action="store_false",
+                        default=PROJECT_CONTEXT, help="don't share a project summary across prompts")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        parser.error(f"{args.root} is not a directory")
+    fmt = os.path.splitext(args.out)[1].lstrip(".").lower()
+    if fmt not in REPORT_FORMATS:
+        parser.error(f"--out must end in one of: {', '.join('.' + f for f in REPORT_FORMATS)}")
+    args.checkpoint = args.checkpoint or args.out + ".checkpoint.jsonl"
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    results = asyncio.run(scan(args))
+
+    with open(args.out, "wb") as f:
+        f.write(report_bytes(results, fmt, batch=True))
+    failed = sum(1 for r in results if "error" in r)
+    print(f"Report written to {args.out} ({len(results)} files, {failed} failed)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -171,137 +171,240 @@
 #                 except Exception as e:
 #                     st.error(f"Unexpected error: {e}")
 
-import streamlit as st
-import requests
+import os
 import re
-import threading
 import time
-import socket
+import threading
 from typing import List
- 
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
 # -----------------------
 # Configuration
 # -----------------------
-BACKEND_HOST = "127.0.0.1"
-BACKEND_PORT = 8000
-BACKEND_BASE = f"http://{BACKEND_HOST}:{BACKEND_PORT}"
+BACKEND_HOST = os.getenv("BACKEND_HOST", "127.0.0.1")
+BACKEND_PORT = int(os.getenv("BACKEND_PORT", 8000))
+BACKEND_BASE = os.getenv("BACKEND_URL", f"http://{BACKEND_HOST}:{BACKEND_PORT}")
 BACKEND_VALIDATE_URL = f"{BACKEND_BASE}/validate"
- 
+BACKEND_BATCH_URL = f"{BACKEND_BASE}/validate-batch"
+REQUEST_TIMEOUT = (5, float(os.getenv("UI_REQUEST_TIMEOUT", 300)))   # (connect, read)
+BATCH_TIMEOUT = (5, float(os.getenv("UI_BATCH_TIMEOUT", 1800)))
+HEALTH_TTL_SECONDS = 10
+
 # -----------------------
 # Utils
 # -----------------------
 EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
- 
+
+
 def split_and_clean_emails(text: str) -> List[str]:
     if not text:
         return []
     parts = re.split(r"[,\n;]+", text)
     return [p.strip() for p in parts if p.strip()]
- 
+
+
 def validate_emails(emails: List[str]) -> (bool, List[str]):
     invalid = [e for e in emails if not EMAIL_RE.match(e)]
     return (len(invalid) == 0, invalid)
- 
-def is_port_open(host: str, port: int) -> bool:
+
+
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    # requests.Session isn't thread-safe and Streamlit reruns the script on its own threads:
+    # each thread keeps its own keep-alive connection to the backend
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
+
+
+def backend_status() -> dict:
+    """GET /ready on the backend: {"ok": bool, "detail": str}."""
     try:
-        with socket.create_connection((host, port), timeout=1):
-            return True
-    except Exception:
-        return False
- 
+        resp = get_session().get(f"{BACKEND_BASE}/ready", timeout=2)
+    except requests.exceptions.RequestException:
+        return {"ok": False, "detail": "not reachable"}
+    if resp.status_code == 200:
+        return {"ok": True, "detail": "ready"}
+    try:
+        return {"ok": False, "detail": resp.json().get("state", f"HTTP {resp.status_code}")}
+    except ValueError:
+        return {"ok": False, "detail": f"HTTP {resp.status_code}"}
+
+
+def cached_backend_status(force: bool = False) -> dict:
+    # Reruns happen on every widget change; only probe the backend every HEALTH_TTL_SECONDS
+    checked = st.session_state.get("health_checked", 0)
+    if force or time.monotonic() - checked > HEALTH_TTL_SECONDS:
+        st.session_state.health = backend_status()
+        st.session_state.health_checked = time.monotonic()
+    return st.session_state.health
+
+
+@st.cache_resource
 def start_uvicorn_in_thread(module_path: str = "main:app", host: str = BACKEND_HOST, port: int = BACKEND_PORT):
+    # cache_resource: at most one embedded server per Streamlit process
     import uvicorn
+
     def _run():
         uvicorn.run(module_path, host=host, port=port, log_level="info", reload=False)
+
     t = threading.Thread(target=_run, daemon=True)
     t.start()
     return t
- 
+
+
+def ensure_backend(timeout: float = 15) -> bool:
+    if cached_backend_status()["ok"]:
+        return True
+    start_uvicorn_in_thread("main:app", BACKEND_HOST, BACKEND_PORT)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cached_backend_status(force=True)["ok"]:
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def post_files(url: str, name: str, files: list, data: dict, timeout=REQUEST_TIMEOUT) -> dict:
+    """POST a multipart upload; {"name", "body", "seconds"} or {"name", "error"}."""
+    start = time.monotonic()
+    try:
+        resp = get_session().post(url, files=files, data=data, timeout=timeout)
+    except requests.exceptions.ConnectionError:
+        return {"name": name, "error": f"Could not connect to backend at {url}"}
+    except requests.exceptions.ReadTimeout:
+        return {"name": name, "error": "The backend request timed out"}
+    except requests.exceptions.RequestException as e:
+        return {"name": name, "error": f"Request to the backend failed: {e}"}
+    elapsed = time.monotonic() - start
+
+    if resp.status_code == 200:
+        try:
+            return {"name": name, "body": resp.json(), "seconds": elapsed}
+        except ValueError:
+            return {"name": name, "error": f"Backend returned a response that isn't JSON: {resp.text[:200]}"}
+    if resp.status_code == 429:
+        return {"name": name, "error": f"Model quota busy, retry in {resp.headers.get('Retry-After', '?')} s"}
+    try:
+        detail = resp.json().get("detail", resp.text)
+    except ValueError:
+        detail = resp.text
+    return {"name": name, "error": f"Backend returned status {resp.status_code}: {detail}"}
+
+
+def validate_file(name: str, payload: bytes, mimetype: str, data: dict) -> dict:
+    """POST one file to /validate."""
+    files = {"file": (name, payload, mimetype or "application/octet-stream")}
+    return post_files(BACKEND_VALIDATE_URL, name, files, data)
+
+
+def validate_batch(uploads: list, data: dict) -> list:
+    """POST several files to /validate-batch in one request: one combined report and one email.
+
+    Returns one outcome per reviewed workflow (archives are unpacked by the backend).
+    """
+    files = [("files", (f.name, f.getvalue(), f.type or "application/octet-stream")) for f in uploads]
+    outcome = post_files(BACKEND_BATCH_URL, f"{len(uploads)} files", files, data, BATCH_TIMEOUT)
+    if "error" in outcome:
+        return [{"name": f.name, "error": outcome["error"]} for f in uploads]
+    return [
+        {"name": r["filename"], "error": r["error"]} if "error" in r else {"name": r["filename"], "body": r}
+        for r in outcome["body"].get("results", [])
+    ]
+
+
+def show_result(placeholder, outcome: dict):
+    with placeholder.container():
+        if "error" in outcome:
+            st.error(f"**{outcome['name']}**: {outcome['error']}")
+            return
+        result = outcome["body"].get("result", {})
+        details = [f"{outcome['seconds']:.1f} s"] if "seconds" in outcome else []
+        if outcome["body"].get("cached"):
+            details.append("cached")
+        st.success(f"**{outcome['name']}**: compliance score {result.get('compliance_score', '—')}"
+                   + (f" ({', '.join(details)})" if details else ""))
+        with st.expander(f"{len(result.get('issues', []))} issues, "
+                         f"{len(result.get('recommendations', []))} recommendations"):
+            st.json(result)
+
+
 # -----------------------
 # Streamlit UI
 # -----------------------
 st.set_page_config(page_title="RPA Release Validator", page_icon="🧾", layout="centered")
 st.title("RPA Release Validator")
- 
-if "server_started" not in st.session_state:
-    st.session_state.server_started = False
-    st.session_state.server_thread = None
- 
-# # detect or start backend automatically when submitting
-# if is_port_open(BACKEND_HOST, BACKEND_PORT):
-#     st.success(f"Backend detected on port {BACKEND_PORT}")
-# else:
-#     st.info(f"Backend not detected on {BACKEND_PORT}. The app will attempt to start it automatically when you submit the form.")
- 
+
+status = cached_backend_status()
+if status["ok"]:
+    st.caption(f"Backend {BACKEND_BASE}: ready")
+else:
+    st.caption(f"Backend {BACKEND_BASE}: {status['detail']} (it will be started automatically on submit)")
+
 st.markdown("---")
- 
+
 with st.form("upload_form"):
-    st.info("Upload one release/script file (e.g. .bprelease, .bpprocess, .py, etc.)")
-    uploaded_file = st.file_uploader("Choose release file", type=None, accept_multiple_files=False)
- 
+    st.info("Upload one or more release/script files (e.g. .xaml, .bprelease)")
+    uploaded_files = st.file_uploader("Choose release files", type=None, accept_multiple_files=True)
+
     st.write("Enter recipient email address(es). You can paste multiple emails separated by comma, semicolon, or newline.")
     emails_text = st.text_area("Recipient email(s)", height=80, placeholder="alice@example.com, bob@example.com")
     cc_text = st.text_input("CC (optional) — comma/semicolon separated", "")
     bcc_text = st.text_input("BCC (optional) — comma/semicolon separated", "")
- 
+    mode = st.selectbox("Review mode", ["(server default)", "llm", "hybrid", "static"])
+
     submit = st.form_submit_button("Validate & Send")
- 
+
 if submit:
-    if not uploaded_file:
-        st.error("Please upload a release file before submitting.")
+    if not uploaded_files:
+        st.error("Please upload at least one release file before submitting.")
+    elif not ensure_backend():
+        st.error("Failed to start backend automatically. Check Streamlit console for errors.")
     else:
-        # ensure backend is running (start if not)
-        if not st.session_state.server_started and not is_port_open(BACKEND_HOST, BACKEND_PORT):
-            st.info("Starting backend automatically...")
-            st.session_state.server_thread = start_uvicorn_in_thread("main:app", BACKEND_HOST, BACKEND_PORT)
-            for _ in range(15):
-                if is_port_open(BACKEND_HOST, BACKEND_PORT):
-                    st.session_state.server_started = True
-                    break
-                time.sleep(0.5)
- 
-        if not st.session_state.server_started and not is_port_open(BACKEND_HOST, BACKEND_PORT):
-            st.error("Failed to start backend automatically. Check Streamlit console for errors.")
+        to_list = split_and_clean_emails(emails_text)
+        cc_list = split_and_clean_emails(cc_text)
+        bcc_list = split_and_clean_emails(bcc_text)
+
+        all_ok, invalid = validate_emails(to_list + cc_list + bcc_list)
+        if not all_ok:
+            st.error(f"Invalid email address(es): {', '.join(invalid)}")
         else:
-            # parse & validate emails but do not display them yet
-            to_list = split_and_clean_emails(emails_text)
-            cc_list = split_and_clean_emails(cc_text)
-            bcc_list = split_and_clean_emails(bcc_text)
- 
-            all_ok, invalid = validate_emails(to_list + cc_list + bcc_list)
-            if not all_ok:
-                st.error(f"Invalid email address(es): {', '.join(invalid)}")
+            data = {
+                "to_emails": ",".join(to_list),
+                "cc_emails": ",".join(cc_list),
+                "bcc_emails": ",".join(bcc_list),
+            }
+            if mode != "(server default)":
+                data["mode"] = mode
+
+            # Several files go to /validate-batch as one request: the backend reviews them
+            # concurrently as one project and sends a single combined email
+            with st.spinner(f"Reviewing {len(uploaded_files)} file(s)..."):
+                f = uploaded_files[0]
+                if len(uploaded_files) == 1 and not f.name.lower().endswith(".zip"):
+                    outcomes = [validate_file(f.name, f.getvalue(), f.type, data)]
+                else:
+                    outcomes = validate_batch(uploaded_files, data)
+
+            total = len(outcomes)
+            failed = 0
+            for outcome in outcomes:
+                failed += "error" in outcome
+                show_result(st.empty(), outcome)
+
+            if failed:
+                st.warning(f"{total - failed} of {total} file(s) validated; {failed} failed.")
             else:
-                files = {
-                    "file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type or "application/octet-stream")
-                }
-                data = {
-                    "to_emails": ",".join(to_list),
-                    "cc_emails": ",".join(cc_list),
-                    "bcc_emails": ",".join(bcc_list),
-                }
- 
-                try:
-                    with st.spinner("Uploading file and calling backend..."):
-                        resp = requests.post(BACKEND_VALIDATE_URL, files=files, data=data, timeout=120)
- 
-                    if resp.status_code == 200:
-                        st.success("Validation and email send completed successfully.")
-                        # After success, display the "It is sent to:" message with recipients
-                        recipients_display = ", ".join(to_list + cc_list + bcc_list)
-                        if recipients_display:
-                            st.info(f"It is sent to: {recipients_display}")
-                        else:
-                            st.info("It is sent.")
-                    else:
-                        st.error(f"Backend returned status {resp.status_code}")
-                        try:
-                            st.text(resp.text)
-                        except Exception:
-                            st.error("Backend returned an error; check server logs.")
-                except requests.exceptions.ConnectionError:
-                    st.error(f"Could not connect to backend at {BACKEND_VALIDATE_URL}. Check that the server started correctly.")
-                except requests.exceptions.ReadTimeout:
-                    st.error("The backend request timed out. Try again or increase the timeout.")
-                except Exception as e:
-                    st.error(f"Unexpected error: {e}")
\ No newline at end of file
+                st.success(f"All {total} file(s) validated.")
+            recipients_display = ", ".join(to_list + cc_list + bcc_list)
+            if recipients_display and failed < total:
+                st.info(f"Reports are sent to: {recipients_display}")
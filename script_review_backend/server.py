@@ -0,0 +1,79 @@
+"""Production launcher: several worker processes sharing one set of local stores.
+
+    python server.py --workers 8                 # uvicorn process manager
+    gunicorn -c server.py main:app               # or gunicorn with uvicorn workers
+
+Every worker is a separate process with its own event loop, HTTP pool and
+in-memory cache tier. State that must be shared lives in the SQLite files
+(review cache, job queue, workflow versions), which all workers open in WAL
+mode; Prometheus metrics are aggregated through PROMETHEUS_MULTIPROC_DIR.
+On SIGTERM each worker stops accepting connections, lets in-flight requests
+and background jobs finish for up to DRAIN_SECONDS, then exits.
+"""
+import os
+import shutil
+import argparse
+import tempfile
+
+from config import load_config
+
+load_config()
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
+SERVER_WORKERS = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+DRAIN_SECONDS = float(os.getenv("DRAIN_SECONDS", 30))
+
+
+def prepare_environment(workers: int, drain_seconds: float):
+    # Read by the workers at import time, so it must be set before they are spawned
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    os.environ["DRAIN_SECONDS"] = str(drain_seconds)
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "review_metrics")
+    # Stale files from a previous run would be summed into the new counters
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+
+# ===== gunicorn settings (used with `gunicorn -c server.py main:app`) =====
+bind = f"{SERVER_HOST}:{SERVER_PORT}"
+workers = SERVER_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+graceful_timeout = DRAIN_SECONDS + 5
+
+
+def on_starting(server):
+    prepare_environment(server.cfg.workers, DRAIN_SECONDS)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the review API with multiple worker processes")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--drain-seconds", type=float, default=DRAIN_SECONDS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    prepare_environment(args.workers, args.drain_seconds)
+
+    import uvicorn
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        # In-flight requests get the same drain window as background jobs
+        timeout_graceful_shutdown=int(args.drain_seconds),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import time
+import heapq
+import hashlib
+import sqlite3
+import threading
+from xml.parsers import expat
+from config import load_config
+
+from chunk_utils import local_name
+from diff_utils import VERSION_DB_PATH
+
+load_config()
+
+SIMILARITY_REVIEW = os.getenv("SIMILARITY_REVIEW", "1") == "1"
+# Estimated Jaccard similarity above which an earlier review is reused
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", 0.85))
+SKETCH_SIZE = int(os.getenv("SIMILARITY_SKETCH_SIZE", 128))
+SHINGLE_SIZE = 4
+
+# Attribute values that differ between copies of a template without changing what the workflow does
+VOLATILE_ATTRS = {"DisplayName", "Selector", "IdRef", "Name", "name", "stageid", "subsheetid", "Key", "Class"}
+IDENTIFIER = re.compile(r"[A-Za-z_][\w.]*")
+NUMBER = re.compile(r"\d+")
+HASH_MASK = (1 << 63) - 1     # SQLite INTEGER is signed 64-bit
+
+
+def _normalize_value(value: str) -> str:
+    # Renamed variables and different constants shouldn't make two copies look unrelated
+    return NUMBER.sub("0", IDENTIFIER.sub("v", value.strip()))[:64]
+
+
+def workflow_features(content: str) -> set:
+    """Shingles over the normalized element sequence plus normalized attribute values."""
+    tokens, features = [], set()
+    parser = expat.ParserCreate(encoding="utf-8")
+
+    def start(name, attrs):
+        local = local_name(name)
+        tokens.append(f"{local}({','.join(sorted(local_name(a) for a in attrs))})")
+        for attr, value in attrs.items():
+            attr = local_name(attr)
+            if attr not in VOLATILE_ATTRS and not attr.startswith("xmlns"):
+                features.add(f"{local}.{attr}={_normalize_value(value)}")
+
+    parser.StartElementHandler = start
+    parser.Parse(content.encode("utf-8"), True)
+    for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1)):
+        features.add(" ".join(tokens[i:i + SHINGLE_SIZE]))
+    return features
+
+
+def _hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big") & HASH_MASK
+
+
+def minhash_sketch(content: str, size: int = SKETCH_SIZE):
+    """Bottom-k MinHash sketch (the `size` smallest feature hashes, sorted); None if unparseable."""
+    try:
+        features = workflow_features(content)
+    except expat.ExpatError:
+        return None
+    return sorted(heapq.nsmallest(size, {_hash(f) for f in features}))
+
+
+def estimate_similarity(a: list, b: list, size: int = SKETCH_SIZE) -> float:
+    """Jaccard estimate from two bottom-k sketches: share of the union's k smallest found in both."""
+    if not a or not b:
+        return 0.0
+    union = heapq.nsmallest(size, set(a) | set(b))
+    both = set(a) & set(b)
+    return sum(1 for h in union if h in both) / len(union)
+
+
+class SimilarityIndex:
+    """Sketches of reviewed workflows with an inverted index on sketch values.
+
+    Candidates are the workflows sharing the most sketch values with a new one;
+    only those few are scored exactly.
+    """
+
+    def __init__(self, path: str = VERSION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS similarity_sketches (
+                    workflow_id TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    sketch TEXT NOT NULL,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (workflow_id, tag)
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS similarity_values (
+                    value INTEGER NOT NULL,
+                    tag TEXT NOT NULL,
+                    workflow_id TEXT NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_similarity_value ON similarity_values(value, tag)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_similarity_workflow ON similarity_values(workflow_id, tag)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def put(self, workflow_id: str, tag: str, sketch: list):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM similarity_values WHERE workflow_id = ? AND tag = ?", (workflow_id, tag))
+            conn.execute(
+                "INSERT OR REPLACE INTO similarity_sketches VALUES (?, ?, ?, ?)",
+                (workflow_id, tag, json.dumps(sketch), time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO similarity_values VALUES (?, ?, ?)", [(v, tag, workflow_id) for v in sketch]
+            )
+
+    def best_match(self, sketch: list, tag: str, exclude: str = None, candidates: int = 5):
+        """(workflow_id, similarity) of the closest indexed workflow, or None."""
+        if not sketch:
+            return None
+        placeholders = ",".join("?" * len(sketch))
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f"""SELECT v.workflow_id, s.sketch, COUNT(*) AS shared
+                    FROM similarity_values v
+                    JOIN similarity_sketches s ON s.workflow_id = v.workflow_id AND s.tag = v.tag
+                    WHERE v.tag = ? AND v.value IN ({placeholders}) AND v.workflow_id != ?
+                    GROUP BY v.workflow_id ORDER BY shared DESC LIMIT ?""",
+                [tag] + list(sketch) + [exclude or "", candidates],
+            ).fetchall()
+        scored = [(workflow_id, estimate_similarity(sketch, json.loads(other))) for workflow_id, other, _ in rows]
+        return max(scored, key=lambda item: item[1], default=None)
+
+
+_index = None
+
+
+def get_similarity_index():
+    global _index
+    if not SIMILARITY_REVIEW:
+        return None
+    if _index is None:
+        _index = SimilarityIndex()
+    return _index
@@ -0,0 +1,195 @@
+"""Cold-start benchmark: import time of the app and latency of the first request.
+
+    python startup_benchmark.py                       # measure and check the budgets
+    python startup_benchmark.py --runs 10 --out startup.json
+
+Import time is measured in fresh interpreters (median of --runs), together
+with the packages that contribute most to it (`python -X importtime`) and any
+of main.DEFERRED_MODULES that got imported eagerly. Time-to-ready and the
+first and second /validate latencies are measured against a real server.py
+worker talking to the fake Gemini endpoint from fake_services.
+
+Exits with status 1 when a measurement is over its budget, so it can gate CI:
+
+    STARTUP_IMPORT_BUDGET   seconds to `import main`            (default 1.5)
+    STARTUP_READY_BUDGET    seconds from spawn to /ready = 200  (default 5)
+    FIRST_REQUEST_BUDGET    seconds for the first /validate     (default 2)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import httpx
+
+from benchmark import HERE, make_xaml, start_server
+from fake_services import FakeGemini, SMTPSink
+
+IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", 1.5))
+READY_BUDGET = float(os.getenv("STARTUP_READY_BUDGET", 5))
+FIRST_REQUEST_BUDGET = float(os.getenv("FIRST_REQUEST_BUDGET", 2))
+
+PROBE = (
+    "import sys, time, json\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "seconds = time.perf_counter() - start\n"
+    "print(json.dumps({'seconds': seconds,"
+    " 'eager': [m for m in main.DEFERRED_MODULES if m in sys.modules]}))\n"
+)
+
+
+def parse_importtime(stderr: str, top: int) -> list:
+    """Packages ranked by their own import time (self microseconds of all their modules)
+    from `-X importtime` output; cumulative times would only show `main` itself."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue
+        package = name.strip().split(".", 1)[0]
+        totals[package] = totals.get(package, 0) + int(own)
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return [{"module": name, "ms": round(us / 1000, 1)} for name, us in ranked[:top]]
+
+
+def measure_import(env: dict, workdir: str, runs: int, top: int) -> dict:
+    samples, eager, offenders = [], set(), []
+    for i in range(runs):
+        cmd = [sys.executable, "-X", "importtime", "-c", PROBE]
+        proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+        probe = json.loads(proc.stdout.strip().splitlines()[-1])
+        samples.append(probe["seconds"])
+        eager.update(probe["eager"])
+        if i == runs - 1:
+            offenders = parse_importtime(proc.stderr, top)
+    return {
+        "runs": runs,
+        "median": round(statistics.median(samples), 4),
+        "min": round(min(samples), 4),
+        "max": round(max(samples), 4),
+        "eager_deferred_modules": sorted(eager),
+        "top_imports": offenders,
+    }
+
+
+def measure_first_request(args, workdir: str) -> dict:
+    gemini = FakeGemini(latency=args.latency, jitter=0).start()
+    smtp = SMTPSink().start()
+    spawned = time.perf_counter()
+    server = start_server(args, gemini, smtp, workdir)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout) as client:
+            deadline = time.monotonic() + args.timeout
+            while True:
+                try:
+                    if client.get("/ready").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("Server under test did not become ready")
+                time.sleep(0.02)
+            ready = time.perf_counter() - spawned
+
+            latencies = []
+            for i in range(2):
+                content = make_xaml(args.size, seed=i).encode("utf-8")
+                start = time.perf_counter()
+                resp = client.post("/validate", data={"timings": "true"},
+                                   files={"file": (f"startup_{i}.xaml", content, "application/xml")})
+                latencies.append(time.perf_counter() - start)
+                if resp.status_code != 200:
+                    raise RuntimeError(f"/validate returned {resp.status_code}: {resp.text[:500]}")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        gemini.shutdown()
+        smtp.shutdown()
+    return {
+        "ready_seconds": round(ready, 4),
+        "first_request_seconds": round(latencies[0], 4),
+        "second_request_seconds": round(latencies[1], 4),
+    }
+
+
+def check_budgets(results: dict, budgets: dict) -> list:
+    measured = {
+        "import": results["import"]["median"],
+        "ready": results["server"]["ready_seconds"],
+        "first_request": results["server"]["first_request_seconds"],
+    }
+    failures = []
+    print(f"\n{'measurement':<16}{'seconds':>10}{'budget':>10}")
+    for name, value in measured.items():
+        budget = budgets[name]
+        over = value > budget
+        print(f"{name:<16}{value:>10.3f}{budget:>10.3f}{'  OVER' if over else ''}")
+        if over:
+            failures.append(f"{name} took {value:.3f}s (budget {budget:.3f}s)")
+    eager = results["import"]["eager_deferred_modules"]
+    if eager:
+        failures.append(f"deferred modules imported eagerly by main: {', '.join(eager)}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time and first-request latency")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time `import main` in")
+    parser.add_argument("--top", type=int, default=15, help="slowest packages to report")
+    parser.add_argument("--size", type=int, default=20000, help="bytes of the workflow sent to /validate")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency (s)")
+    parser.add_argument("--mode", default="llm", choices=("llm", "static", "hybrid"))
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET)
+    parser.add_argument("--ready-budget", type=float, default=READY_BUDGET)
+    parser.add_argument("--first-request-budget", type=float, default=FIRST_REQUEST_BUDGET)
+    parser.add_argument("--out", default=None, help="result file (default benchmarks/startup-<time>.json)")
+    args = parser.parse_args()
+    # start_server() settings shared with benchmark.py
+    args.workers, args.cache = 1, False
+
+    with tempfile.TemporaryDirectory(prefix="startup-bench-") as workdir:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = HERE + os.pathsep + env.get("PYTHONPATH", "")
+        results = {
+            "python": sys.version.split()[0],
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "import": measure_import(env, workdir, args.runs, args.top),
+            "server": measure_first_request(args, workdir),
+        }
+
+    print(f"import main: median {results['import']['median']:.3f}s over {args.runs} runs")
+    for item in results["import"]["top_imports"]:
+        print(f"  {item['ms']:>8.1f} ms  {item['module']}")
+
+    budgets = {"import": args.import_budget, "ready": args.ready_budget, "first_request": args.first_request_budget}
+    failures = check_budgets(results, budgets)
+    results["budgets"] = budgets
+    results["failures"] = failures
+
+    out = args.out or os.path.join("benchmarks", time.strftime("startup-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Fixtures shared by the tests: the fakes from fake_services and an event loop runner.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import asyncio
+
+import pytest
+
+# The app's modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_services import FakeGemini, SMTPSink  # noqa: E402
+
+
+@pytest.fixture
+def gemini():
+    server = FakeGemini(latency=0, jitter=0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def smtp():
+    server = SMTPSink().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """Run a coroutine on a fresh event loop; the pooled model client is bound to it."""
+    import gemini_client
+    monkeypatch.setattr(gemini_client, "_semaphore", None)
+
+    def _run(coro):
+        async def _main():
+            try:
+                return await coro
+            finally:
+                await gemini_client.close_client()
+        return asyncio.run(_main())
+    return _run
+
+
+@pytest.fixture
+def context_store(tmp_path, monkeypatch):
+    import context_cache
+    store = context_cache.ContextStore(str(tmp_path / "context.sqlite3"))
+    monkeypatch.setattr(context_cache, "CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(context_cache, "_store", store)
+    return store
+
+
+def gemini_url(server: FakeGemini) -> str:
+    return f"{server.url}/v1beta/models/fake:generateContent"
+
+
+@pytest.fixture
+def reviewer(gemini, tmp_path, monkeypatch):
+    """review_service wired to FakeGemini with fresh version/similarity stores and no
+    review cache or history; returns the fake so tests can read its stats."""
+    import context_cache
+    import diff_utils
+    import llm_backends
+    import review_service
+    import similarity_utils
+
+    backend = llm_backends.GeminiBackend(url=gemini_url(gemini), api_key="fake", model="fake", rpm=0, tpm=0)
+    monkeypatch.setattr(llm_backends, "_pool", llm_backends.BackendPool([backend], hedge_after=0, max_retries=0))
+    monkeypatch.setattr(context_cache, "CONTEXT_CACHE_ENABLED", False)
+    monkeypatch.setattr(diff_utils, "INCREMENTAL_REVIEW", True)
+    monkeypatch.setattr(diff_utils, "_store", diff_utils.VersionStore(str(tmp_path / "versions.sqlite3")))
+    monkeypatch.setattr(similarity_utils, "_index", similarity_utils.SimilarityIndex(str(tmp_path / "versions.sqlite3")))
+    monkeypatch.setattr(review_service, "get_cache", lambda: None)
+    monkeypatch.setattr(review_service, "get_history_store", lambda: None)
+    review_service.review_context.cache_clear()
+    yield gemini
+    review_service.review_context.cache_clear()
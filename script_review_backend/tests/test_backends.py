@@ -0,0 +1,99 @@
+import time
+import asyncio
+
+import pytest
+
+from fake_services import FakeGemini
+from llm_backends import BackendPool, CircuitBreaker, CircuitOpenError, GeminiBackend
+
+from .conftest import gemini_url
+
+PROMPT = "<Sequence DisplayName='Main' />"
+
+
+class RecordingBackend(GeminiBackend):
+    """GeminiBackend that remembers whether a call to it was cancelled."""
+
+    cancelled = False
+
+    async def generate(self, prompt, context=None):
+        try:
+            return await super().generate(prompt, context)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def make_backend(server, name, cls=GeminiBackend):
+    return cls(name=name, url=gemini_url(server), api_key="fake", model="fake", rpm=0, tpm=0)
+
+
+@pytest.fixture
+def failing():
+    server = FakeGemini(latency=0, jitter=0, failure_rate=1.0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fails_over_to_the_next_backend(gemini, failing, run):
+    pool = BackendPool([make_backend(failing, "primary"), make_backend(gemini, "secondary")],
+                       hedge_after=0, max_retries=0)
+
+    assert '"compliance_score": 72' in run(pool.generate(PROMPT))
+    assert failing.stats["failures"] == 1
+    assert gemini.stats["calls"] == 1
+
+
+def test_circuit_opens_after_consecutive_failures(failing, run):
+    backend = make_backend(failing, "primary")
+    backend.breaker = CircuitBreaker(failures=2, reset_seconds=60)
+    pool = BackendPool([backend], hedge_after=0, max_retries=0)
+
+    for _ in range(2):
+        with pytest.raises(Exception) as info:
+            run(pool.generate(PROMPT))
+        assert not isinstance(info.value, CircuitOpenError)
+    assert backend.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        run(pool.generate(PROMPT))
+    # Shed locally, the backend isn't called while open
+    assert failing.stats["calls"] == 2
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker(failures=1, reset_seconds=0.05)
+    breaker.failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed"
+
+
+def test_losing_hedge_is_cancelled(gemini, run):
+    slow = FakeGemini(latency=2, jitter=0).start()
+    try:
+        primary = make_backend(slow, "primary", RecordingBackend)
+        pool = BackendPool([primary, make_backend(gemini, "secondary")], hedge_after=0.1, max_retries=0)
+
+        async def hedged():
+            start = time.perf_counter()
+            result = await pool.generate(PROMPT)
+            elapsed = time.perf_counter() - start
+            await asyncio.sleep(0)      # let the cancellation land
+            return result, elapsed
+
+        result, elapsed = run(hedged())
+        assert '"compliance_score": 72' in result
+        assert elapsed < 1
+        assert primary.cancelled
+        # Losing a hedge is not held against the backend
+        assert primary.breaker.failures == 0
+        assert primary.breaker.state == "closed"
+    finally:
+        slow.shutdown()
+        slow.server_close()
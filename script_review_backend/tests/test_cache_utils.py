@@ -0,0 +1,105 @@
+import types
+
+import pytest
+
+import cache_utils
+import review_service
+from benchmark import make_xaml
+from cache_utils import MemoryLRU, ReviewCache, SQLiteCache, make_cache_key
+
+RESULT = {"tool": "UiPath", "compliance_score": 80, "issues": ["a"], "recommendations": []}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_utils, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_key_ignores_line_endings_and_trailing_whitespace():
+    key = make_cache_key("<a>\n  <b/>\n</a>", "UiPath", "gemini", "2:llm")
+    assert make_cache_key("<a>  \r\n  <b/>\r\n</a>\n\n", "UiPath", "gemini", "2:llm") == key
+
+
+@pytest.mark.parametrize("args", [
+    ("<a><b/></a>", "UiPath", "gemini", "2:llm"),
+    ("<a/>", "Blue Prism", "gemini", "2:llm"),
+    ("<a/>", "UiPath", "gpt-4o", "2:llm"),
+    ("<a/>", "UiPath", "gemini", "3:llm"),
+    ("<a/>", "UiPath", "gemini", "2:hybrid"),
+])
+def test_key_depends_on_content_tool_model_prompt_version_and_mode(args):
+    assert make_cache_key(*args) != make_cache_key("<a/>", "UiPath", "gemini", "2:llm")
+
+
+def test_parts_are_delimited():
+    assert make_cache_key("a", "bc", "", "") != make_cache_key("ab", "c", "", "")
+
+
+def test_memory_lru_ttl_and_size(clock):
+    lru = MemoryLRU(max_entries=2, ttl=10)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    # "b" was the least recently used
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+
+    clock[0] += 11
+    assert lru.get("a") is None
+
+
+def test_disk_ttl(tmp_path, clock):
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=10, max_bytes=10 ** 6)
+    disk.set("a", (RESULT, b"xlsx"))
+    clock[0] += 5
+    assert disk.get("a") == (RESULT, b"xlsx")
+
+    clock[0] += 6
+    assert disk.get("a") is None
+    # Expired rows are also swept on write
+    disk.set("b", (RESULT, b"xlsx"))
+    clock[0] += 11
+    disk.set("c", (RESULT, b"xlsx"))
+    with disk._connect() as conn:
+        assert [k for k, in conn.execute("SELECT key FROM review_cache")] == ["c"]
+
+
+def test_disk_evicts_least_recently_used_over_byte_budget(tmp_path, clock):
+    excel = b"x" * 1000
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=3600, max_bytes=3500)
+    for key in ("a", "b", "c"):
+        disk.set(key, (RESULT, excel))
+        clock[0] += 1
+    disk.get("a")
+    clock[0] += 1
+    disk.set("d", (RESULT, excel))
+
+    assert disk.get("b") is None
+    assert all(disk.get(key) is not None for key in ("a", "c", "d"))
+
+
+def test_review_cache_refills_memory_from_disk(tmp_path):
+    cache = ReviewCache(str(tmp_path / "cache.sqlite3"), ttl=3600, memory_entries=4, disk_max_bytes=10 ** 6)
+    cache.set("a", RESULT, b"xlsx")
+    cache.memory.clear()
+    assert cache.get("a") == (RESULT, b"xlsx")
+    assert cache.memory.get("a") == (RESULT, b"xlsx")
+
+
+def test_review_is_cached_per_mode(reviewer, run, tmp_path, monkeypatch):
+    cache = ReviewCache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(review_service, "get_cache", lambda: cache)
+    content = make_xaml(5000, seed=1)
+
+    _, _, meta = run(review_service.review_content("Main.xaml", content, "llm"))
+    assert not meta["cached"]
+    _, _, meta = run(review_service.review_content("Other.xaml", content, "llm"))
+    assert meta["cached"]
+    assert reviewer.stats["calls"] == 1
+
+    _, _, meta = run(review_service.review_content("Main.xaml", content, "hybrid"))
+    assert not meta["cached"]
+    assert reviewer.stats["calls"] == 2
@@ -0,0 +1,95 @@
+import re
+from xml.parsers import expat
+
+import pytest
+
+from benchmark import make_bprelease, make_xaml
+from chunk_utils import CHUNK_MAX_CHARS, chunk_workflow, merge_results
+
+NS = ('xmlns="http://schemas.microsoft.com/netfx/2009/xaml/activities" '
+      'xmlns:x="http://schemas.microsoft.com/winfx/2006/xaml"')
+
+
+def assign(n: int, pad: int = 200) -> str:
+    return (f'<Assign DisplayName="Assign {n}"><Assign.Value><InArgument x:TypeArguments="x:String">'
+            f'"{"v" * pad}"</InArgument></Assign.Value></Assign>')
+
+
+def well_formed(chunk: str) -> bool:
+    # Chunks hold runs of sibling elements; prefixes are declared on the original root
+    # and the residual chunk may still start with the file's XML declaration
+    parser = expat.ParserCreate()
+    try:
+        parser.Parse("<chunk>" + re.sub(r"<\?xml[^>]*\?>", "", chunk) + "</chunk>", True)
+    except expat.ExpatError:
+        return False
+    return True
+
+
+def names(chunks: list) -> list:
+    return [n for c in chunks for n in re.findall(r'DisplayName="(Assign \d+)"', c["content"])]
+
+
+@pytest.mark.parametrize("content, tool", [
+    (make_xaml(300000, seed=1), "UiPath"),
+    (make_bprelease(300000, seed=1), "Blue Prism"),
+])
+def test_chunks_stay_under_the_limit_and_well_formed(content, tool):
+    chunks = chunk_workflow(content, tool, max_chars=20000)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk["content"]) <= 20000
+        assert well_formed(chunk["content"])
+
+
+def test_default_limit():
+    chunks = chunk_workflow(make_xaml(4 * CHUNK_MAX_CHARS, seed=2), "UiPath")
+    assert len(chunks) >= 4
+    assert max(len(c["content"]) for c in chunks) <= CHUNK_MAX_CHARS
+
+
+def test_small_workflow_is_one_chunk():
+    content = make_xaml(5000, seed=1)
+    assert chunk_workflow(content, "UiPath", max_chars=20000) == [{"label": "workflow", "content": content}]
+
+
+def test_oversized_element_is_split_between_its_children():
+    # One Sequence and no nested boundaries: only its Assign children can be split apart
+    content = f'<Activity {NS}><Sequence DisplayName="Main">{"".join(assign(i) for i in range(200))}</Sequence></Activity>'
+    chunks = chunk_workflow(content, "UiPath", max_chars=5000)
+
+    assert len(chunks) > 1
+    assert names(chunks) == [f"Assign {i}" for i in range(200)]
+    for chunk in chunks:
+        assert len(chunk["content"]) <= 5000
+        assert well_formed(chunk["content"])
+        assert chunk["content"].count('<Sequence DisplayName="Main">') == chunk["content"].count("</Sequence>")
+
+
+def test_parent_activities_are_kept_in_a_residual_chunk():
+    nested = "".join(f'<Sequence DisplayName="Step {s}">{"".join(assign(s * 100 + i) for i in range(20))}</Sequence>'
+                     for s in range(4))
+    content = (f'<Activity {NS}><Sequence DisplayName="Main">{assign(9999)}{nested}{assign(9998)}'
+               f'</Sequence></Activity>')
+    chunks = chunk_workflow(content, "UiPath", max_chars=6000)
+
+    [residual] = [c for c in chunks if "Assign 9999" in c["content"]]
+    assert "Assign 9998" in residual["content"]
+    assert "<!-- split out: Sequence 'Step 0' ... Sequence 'Step 3' (4 elements) -->" in residual["content"]
+    assert sorted(names(chunks)) == sorted([f"Assign {s * 100 + i}" for s in range(4) for i in range(20)]
+                                           + ["Assign 9999", "Assign 9998"])
+
+
+def test_merged_score_is_weighted_by_chunk_size():
+    merged = merge_results("UiPath", [
+        ("part a", 3000, {"compliance_score": 90, "issues": ["A", "shared"], "recommendations": ["R"]}),
+        ("part b", 1000, {"compliance_score": 50, "issues": ["shared"], "recommendations": ["R", "S"]}),
+        ("part c", 500, {"compliance_score": "n/a", "issues": [], "recommendations": []}),
+    ])
+    assert merged["compliance_score"] == 80
+    assert merged["issues"] == ["[part a] A", "[part a] shared"]
+    assert merged["recommendations"] == ["R", "S"]
+
+
+def test_merge_without_any_score():
+    assert merge_results("UiPath", [("part", 10, {"issues": []})])["compliance_score"] == 0
@@ -0,0 +1,120 @@
+import httpx
+import pytest
+
+import context_cache
+from context_cache import SharedContext, compose
+from llm_backends import BackendPool, GeminiBackend, OpenAICompatibleBackend
+
+from .conftest import gemini_url
+
+PREFIX = "Review instructions. " * 400        # ~2000 tokens, above CONTEXT_CACHE_MIN_TOKENS
+PROMPT = "<Sequence DisplayName='Main' />"
+
+
+def make_backend(server):
+    return GeminiBackend(url=gemini_url(server), api_key="fake", model="fake", rpm=0, tpm=0)
+
+
+def test_context_is_uploaded_once_and_referenced(gemini, context_store, run):
+    backend = make_backend(gemini)
+    context = SharedContext(PREFIX)
+
+    async def two_calls():
+        await backend.generate(PROMPT, context)
+        await backend.generate(PROMPT, context)
+    run(two_calls())
+
+    assert gemini.stats["cache_creates"] == 1
+    assert gemini.stats["cached_calls"] == 2
+    # Only the workflow part travels with each request
+    assert gemini.stats["prompt_chars"] == 2 * len(PROMPT)
+    assert context_store.get(context.digest, backend.cache_scope) is not None
+
+
+def test_handle_is_shared_between_backends(gemini, context_store, run):
+    # Another worker process: new backend object, same handle store
+    context = SharedContext(PREFIX)
+    run(make_backend(gemini).generate(PROMPT, context))
+    run(make_backend(gemini).generate(PROMPT, context))
+
+    assert gemini.stats["cache_creates"] == 1
+    assert gemini.stats["cached_calls"] == 2
+
+
+def test_expired_handle_falls_back_inline(gemini, context_store, run):
+    backend = make_backend(gemini)
+    context = SharedContext(PREFIX)
+    run(backend.generate(PROMPT, context))
+    name = context_store.get(context.digest, backend.cache_scope)
+    gemini.caches.clear()       # expired or deleted on the provider side
+
+    run(backend.generate(PROMPT, context))
+
+    assert gemini.stats["cache_misses"] == 1
+    assert gemini.stats["prompt_chars"] == 2 * len(PROMPT) + len(compose(PROMPT, context))
+    assert context_store.get(context.digest, backend.cache_scope) != name
+
+
+@pytest.mark.parametrize("status, expired", [(403, True), (404, True), (500, False)])
+def test_only_403_and_404_drop_the_handle(gemini, context_store, run, status, expired):
+    backend = make_backend(gemini)
+    context = SharedContext(PREFIX)
+    context_store.put(context.digest, backend.cache_scope, "cachedContents/old", 2e9)
+    request = httpx.Request("POST", gemini_url(gemini))
+    error = httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+    assert run(backend._expired(context, "cachedContents/old", error)) is expired
+    assert (context_store.get(context.digest, backend.cache_scope) is None) is expired
+
+
+def test_refused_upload_is_sent_inline_and_not_retried(context_store, run):
+    from fake_services import FakeGemini
+    server = FakeGemini(latency=0, jitter=0, min_cache_tokens=10 ** 6).start()
+    try:
+        backend = make_backend(server)
+        context = SharedContext(PREFIX)
+        run(backend.generate(PROMPT, context))
+        run(backend.generate(PROMPT, context))
+        assert server.stats["cache_creates"] == 0
+        assert server.stats["calls"] == 2
+        assert server.stats["prompt_chars"] == 2 * len(compose(PROMPT, context))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_cache_only_part_is_left_out_inline():
+    context = SharedContext("instructions\n", cache_only="project summary\n")
+    assert context.text == "instructions\nproject summary\n"
+    assert compose("workflow", context) == "instructions\nworkflow"
+
+
+class TestProjectContext:
+    @pytest.fixture(autouse=True)
+    def _fresh(self, monkeypatch):
+        import review_service
+        review_service.review_context.cache_clear()
+        yield
+        review_service.review_context.cache_clear()
+
+    def use_pool(self, monkeypatch, backends):
+        import llm_backends
+        monkeypatch.setattr(llm_backends, "_pool", BackendPool(backends))
+
+    def test_attached_when_it_can_be_cached(self, gemini, monkeypatch):
+        from review_service import review_context
+        self.use_pool(monkeypatch, [make_backend(gemini)])
+        assert review_context("UiPath", PREFIX).cache_only == PREFIX
+
+    def test_dropped_below_the_minimum_cacheable_size(self, gemini, monkeypatch):
+        from review_service import review_context
+        self.use_pool(monkeypatch, [make_backend(gemini)])
+        monkeypatch.setattr(context_cache, "CONTEXT_CACHE_MIN_TOKENS", 10 ** 6)
+        context = review_context("UiPath", PREFIX)
+        assert context.cache_only == ""
+        assert context.digest == review_context("UiPath").digest
+
+    def test_dropped_without_a_caching_backend(self, gemini, monkeypatch):
+        from review_service import review_context
+        self.use_pool(monkeypatch, [OpenAICompatibleBackend("local", gemini.url + "/v1", "fake")])
+        assert review_context("UiPath", PREFIX).cache_only == ""
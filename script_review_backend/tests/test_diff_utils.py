@@ -0,0 +1,89 @@
+import review_service
+from benchmark import make_xaml
+from diff_utils import diff_segments, merge_incremental, segment_hashes
+
+WORKFLOW = make_xaml(20000, seed=1)
+ONE_EDIT = WORKFLOW.replace('"value ', '"edited value ', 1)
+# Touches every generated activity (view-state attributes are stripped before diffing)
+MANY_EDITS = (WORKFLOW.replace('"value ', '"edited value ').replace("app='app", "app='new")
+              .replace('Level="Info"', 'Level="Warn"').replace('"Sub\\', '"Lib\\'))
+
+
+def test_segment_hashes_key_activities_by_path():
+    hashes, _, _ = segment_hashes(WORKFLOW, "UiPath")
+    assert "(root)" in hashes
+    assert "Sequence 'Main'" in hashes
+    assert "Sequence 'Main'/Click 'Click 131'" in hashes
+    # A child's markup is cut out of its parent, so editing it only changes the child
+    edited, _, _ = segment_hashes(ONE_EDIT, "UiPath")
+    changed, removed = diff_segments(hashes, edited)
+    assert len(changed) == 1 and changed[0].startswith("Sequence 'Main'/")
+    assert removed == []
+
+
+def test_identically_named_siblings_are_disambiguated():
+    content = ('<Activity xmlns="http://schemas.microsoft.com/netfx/2009/xaml/activities">'
+               '<Sequence DisplayName="Main"><WriteLine DisplayName="Log" Text="a" />'
+               '<WriteLine DisplayName="Log" Text="b" /></Sequence></Activity>')
+    hashes, _, _ = segment_hashes(content, "UiPath")
+    assert {"Sequence 'Main'/WriteLine 'Log'", "Sequence 'Main'/WriteLine 'Log'#1"} <= set(hashes)
+
+
+def test_diff_segments():
+    old = {"a": "1", "b": "2", "c": "3"}
+    new = {"a": "1", "b": "changed", "d": "4"}
+    assert diff_segments(old, new) == (["b", "d"], ["c"])
+    assert diff_segments(old, dict(old)) == ([], [])
+
+
+def test_merge_incremental():
+    previous = {"tool": "UiPath", "compliance_score": 60,
+                "issues": ["old 1", "old 2"], "recommendations": ["rec 1"]}
+    update = {"compliance_score": 75, "issues": ["old 1", "new"],
+              "recommendations": ["rec 1", "rec 2"], "resolved_issues": ["old 2"]}
+    assert merge_incremental(previous, update) == {
+        "tool": "UiPath",
+        "compliance_score": 75,
+        "issues": ["old 1", "new"],
+        "recommendations": ["rec 1", "rec 2"],
+    }
+    # A reply without a score keeps the previous one
+    assert merge_incremental(previous, {})["compliance_score"] == 60
+
+
+def review(run, content, workflow_id="proj/Main.xaml"):
+    json_obj, _, meta = run(review_service.review_content("Main.xaml", content, "llm", workflow_id))
+    return json_obj, meta
+
+
+def test_unchanged_reupload_sends_nothing(reviewer, run):
+    first, _ = review(run, WORKFLOW)
+    # Whitespace between elements is not part of any activity's identity
+    json_obj, meta = review(run, WORKFLOW + "\n")
+
+    assert meta["incremental"] == {"changed": 0, "removed": 0, "total": meta["incremental"]["total"]}
+    assert json_obj == first
+    assert reviewer.stats["calls"] == 1
+
+
+def test_single_changed_activity_sends_only_that_activity(reviewer, run):
+    review(run, WORKFLOW)
+    full_prompt = reviewer.stats["prompt_chars"]
+    _, meta = review(run, ONE_EDIT)
+
+    assert meta["incremental"]["changed"] == 1
+    assert "full_review" not in meta["incremental"]
+    assert reviewer.stats["calls"] == 2
+    assert reviewer.stats["prompt_chars"] - full_prompt < full_prompt / 5
+
+
+def test_large_change_ratio_falls_back_to_full_review(reviewer, run):
+    review(run, WORKFLOW)
+    full_prompt = reviewer.stats["prompt_chars"]
+    _, meta = review(run, MANY_EDITS)
+
+    incremental = meta["incremental"]
+    assert incremental["changed"] > review_service.INCREMENTAL_MAX_CHANGED_RATIO * incremental["total"]
+    assert incremental["full_review"]
+    # The whole (preprocessed) workflow was sent again
+    assert reviewer.stats["prompt_chars"] - full_prompt >= full_prompt * 0.9
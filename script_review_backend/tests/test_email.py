@@ -0,0 +1,79 @@
+import socket
+
+import pytest
+
+import email_utils
+from email_utils import EmailSender, build_message
+
+
+@pytest.fixture(autouse=True)
+def plain_smtp(monkeypatch):
+    # The sink speaks neither STARTTLS nor AUTH
+    monkeypatch.setattr(email_utils, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(email_utils, "SMTP_USER", None)
+    monkeypatch.setattr(email_utils, "SMTP_PASSWORD", None)
+
+
+def message(n: int = 0):
+    return build_message(["to@example.com"], ["cc@example.com"], f"Review {n}", "Report attached",
+                         b"report", f"report_{n}.xlsx")
+
+
+def test_sender_delivers_every_message_over_one_connection(smtp):
+    sender = EmailSender("127.0.0.1", smtp.server_address[1], threads=1)
+    for i in range(5):
+        sender.submit(message(i), ["to@example.com", "cc@example.com", "bcc@example.com"])
+    sender.stop()
+
+    assert sender.stats["sent"] == 5
+    assert smtp.stats["messages"] == 5
+    assert smtp.stats["recipients"] == 15
+    assert smtp.stats["connections"] == 1
+
+
+def test_unreachable_server_is_retried_then_given_up():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    sender = EmailSender("127.0.0.1", port, threads=1, max_retries=2, backoff=0)
+    sender.submit(message(), ["to@example.com"])
+    sender.stop()
+
+    assert sender.stats == {"queued": 1, "sent": 0, "failed": 1, "retries": 2}
+
+
+def test_send_email_uses_a_fresh_connection(smtp, monkeypatch):
+    monkeypatch.setattr(email_utils, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(email_utils, "SMTP_PORT", str(smtp.server_address[1]))
+    email_utils.send_email(["to@example.com"], [], ["bcc@example.com"], "Review", "Report attached",
+                           b"report", "report.xlsx")
+
+    assert smtp.stats["messages"] == 1
+    assert smtp.stats["recipients"] == 2
+
+
+def test_missing_starttls_fails_without_retrying(smtp, monkeypatch):
+    monkeypatch.setattr(email_utils, "SMTP_STARTTLS", True)
+    sender = EmailSender("127.0.0.1", smtp.server_address[1], threads=1, max_retries=3, backoff=0)
+    sender.submit(message(), ["to@example.com"])
+    sender.stop()
+
+    assert sender.stats == {"queued": 1, "sent": 0, "failed": 1, "retries": 0}
+    assert smtp.stats["connections"] == 1
+
+
+def test_rejected_credentials_fail_without_retrying(monkeypatch):
+    import smtplib
+    attempts = []
+
+    def connect(host, port):
+        attempts.append(host)
+        raise smtplib.SMTPAuthenticationError(535, b"5.7.8 Authentication credentials invalid")
+
+    monkeypatch.setattr(email_utils, "connect_smtp", connect)
+    sender = EmailSender("127.0.0.1", 25, threads=1, max_retries=3, backoff=0)
+    sender.submit(message(), ["to@example.com"])
+    sender.stop()
+
+    assert sender.stats["failed"] == 1 and sender.stats["retries"] == 0
+    assert len(attempts) == 1
@@ -0,0 +1,73 @@
+import time
+import sqlite3
+
+import pytest
+
+from history_store import HistoryStore
+
+
+@pytest.fixture
+def history(tmp_path):
+    return HistoryStore(str(tmp_path / "history.sqlite3"))
+
+
+def review(score: int, tool: str = "UiPath") -> dict:
+    return {"tool": tool, "compliance_score": score, "issues": [], "recommendations": []}
+
+
+def add_before_and_after(history, first: list, second: list) -> float:
+    """Record `first` [(workflow_id, score, mode, tool)], then `second`; returns the time between."""
+    for workflow_id, score, mode, tool in first:
+        history.add(workflow_id, "Main.xaml", review(score, tool), mode=mode)
+    time.sleep(0.01)
+    since = time.time()
+    time.sleep(0.01)
+    for workflow_id, score, mode, tool in second:
+        history.add(workflow_id, "Main.xaml", review(score, tool), mode=mode)
+    return since
+
+
+def test_drop_against_the_last_review_before_the_window(history):
+    since = add_before_and_after(history, [("p/Main.xaml", 72, "llm", "UiPath")],
+                                 [("p/Main.xaml", 50, "llm", "UiPath")])
+    [row] = history.regressions(since)
+    assert (row["workflow_id"], row["baseline_score"], row["latest_score"], row["drop"]) == \
+        ("p/Main.xaml", 72, 50, 22)
+
+
+def test_scores_of_different_modes_are_not_compared(history):
+    since = add_before_and_after(history, [("p/Main.xaml", 72, "llm", "UiPath")],
+                                 [("p/Main.xaml", 38, "hybrid", "UiPath")])
+    assert history.regressions(since) == []
+
+
+def test_tool_filter_applies_to_the_baseline(history):
+    since = add_before_and_after(history, [("p/Main.xaml", 95, "llm", "Blue Prism")],
+                                 [("p/Main.xaml", 60, "llm", "UiPath"), ("p/Main.xaml", 58, "llm", "UiPath")])
+    [row] = history.regressions(since, tool="UiPath")
+    assert row["baseline_score"] == 60
+
+
+def test_reviews_without_a_workflow_id_are_left_out(history):
+    since = add_before_and_after(history, [(None, 90, "llm", "UiPath")], [(None, 40, "llm", "UiPath")])
+    assert history.regressions(since) == []
+    assert history.query()["items"][0]["workflow_id"] is None
+
+
+def test_old_table_requiring_a_workflow_id_is_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            """CREATE TABLE reviews (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, workflow_id TEXT NOT NULL, filename TEXT, tool TEXT,
+                compliance_score REAL, issues TEXT NOT NULL, recommendations TEXT NOT NULL,
+                issue_count INTEGER NOT NULL, recommendation_count INTEGER NOT NULL, file_hash TEXT,
+                mode TEXT, cached INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL)"""
+        )
+        conn.execute("INSERT INTO reviews VALUES (1, 'p/Main.xaml', 'Main.xaml', 'UiPath', 80, '[]', '[]', 0, 0,"
+                     " NULL, 'llm', 0, 1)")
+
+    history = HistoryStore(path)
+    history.add(None, "Main.xaml", review(70))
+
+    assert [item["workflow_id"] for item in history.query()["items"]] == [None, "p/Main.xaml"]
@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import pytest
+
+import job_queue
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobRunner, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def age(store, job_id, seconds):
+    # Pretend the job's lease was last renewed that long ago
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (time.time() - seconds, job_id))
+
+
+def test_claim_hands_out_each_job_once_oldest_first(store):
+    first = store.enqueue("A.xaml", "<a/>", {"mode": "llm"})
+    second = store.enqueue("B.xaml", "<b/>", {})
+
+    job = store.claim("w1")
+    assert job == {"id": first, "filename": "A.xaml", "content": "<a/>", "options": {"mode": "llm"}}
+    assert store.claim("w2")["id"] == second
+    assert store.claim("w1") is None
+    assert store.get(first)["status"] == RUNNING
+
+
+def test_complete_and_fail(store):
+    ok, bad = store.enqueue("A.xaml", "<a/>", {}), store.enqueue("B.xaml", "<b/>", {})
+    store.claim(), store.claim()
+    store.complete(ok, {"compliance_score": 90}, b"xlsx")
+    store.fail(bad, "boom")
+
+    assert store.get(ok)["status"] == DONE and store.get(ok)["result"] == {"compliance_score": 90}
+    assert store.get_excel(ok) == b"xlsx"
+    assert store.get(bad)["status"] == FAILED and store.get(bad)["error"] == "boom"
+    assert store.get_excel(bad) is None
+    with store._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM jobs WHERE content IS NOT NULL").fetchone()[0] == 0
+
+
+def test_only_expired_leases_are_requeued(store):
+    stale, live = store.enqueue("A.xaml", "<a/>", {}), store.enqueue("B.xaml", "<b/>", {})
+    store.claim("crashed"), store.claim("alive")
+    age(store, stale, 120)
+    age(store, live, 120)
+    store.heartbeat("alive")
+
+    assert store.requeue_running(older_than=60) == 1
+    assert store.get(stale)["status"] == QUEUED
+    assert store.get(live)["status"] == RUNNING
+    assert store.claim("other")["id"] == stale
+
+
+def test_requeue_by_owner(store):
+    mine, theirs = store.enqueue("A.xaml", "<a/>", {}), store.enqueue("B.xaml", "<b/>", {})
+    store.claim("me"), store.claim("them")
+
+    assert store.requeue_running(owner="me") == 1
+    assert store.get(mine)["status"] == QUEUED
+    assert store.get(theirs)["status"] == RUNNING
+
+
+async def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_runner_processes_jobs(store, run):
+    async def handler(job):
+        if job["filename"] == "Bad.xaml":
+            raise ValueError("not a workflow")
+        return {"file": job["filename"]}, b"xlsx"
+
+    async def main():
+        runner = JobRunner(store, handler, workers=2, owner="w1")
+        runner.start()
+        ids = [store.enqueue(name, "<a/>", {}) for name in ("A.xaml", "Bad.xaml", "C.xaml")]
+        runner.notify()
+        await wait_for(lambda: all(store.get(i)["status"] in (DONE, FAILED) for i in ids))
+        await runner.stop()
+        return ids
+
+    a, bad, c = run(main())
+    assert store.get(a)["result"] == {"file": "A.xaml"}
+    assert store.get(c)["status"] == DONE
+    assert store.get(bad)["error"] == "not a workflow"
+
+
+def test_start_requeues_jobs_of_a_crashed_worker(store, run, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", 60)
+    job_id = store.enqueue("A.xaml", "<a/>", {})
+    store.claim("crashed")
+    age(store, job_id, 120)
+
+    async def handler(job):
+        return {}, b""
+
+    async def main():
+        runner = JobRunner(store, handler, workers=1, owner="w1")
+        runner.start()
+        await wait_for(lambda: store.get(job_id)["status"] == DONE)
+        await runner.stop()
+
+    run(main())
+
+
+def test_stop_drains_running_jobs(store, run):
+    async def handler(job):
+        await asyncio.sleep(0.2)
+        return {"ok": True}, b"xlsx"
+
+    async def main():
+        runner = JobRunner(store, handler, workers=1, owner="w1")
+        runner.start()
+        job_id = store.enqueue("A.xaml", "<a/>", {})
+        runner.notify()
+        await wait_for(lambda: runner.active == 1)
+        await runner.stop(drain_timeout=5)
+        return job_id
+
+    assert store.get(run(main()))["status"] == DONE
+
+
+def test_stop_requeues_jobs_that_outlive_the_drain(store, run):
+    async def handler(job):
+        await asyncio.sleep(30)
+
+    async def main():
+        runner = JobRunner(store, handler, workers=1, owner="w1")
+        runner.start()
+        job_id = store.enqueue("A.xaml", "<a/>", {})
+        runner.notify()
+        await wait_for(lambda: runner.active == 1)
+        await runner.stop(drain_timeout=0.1)
+        # Nothing is claimed after stop()
+        store.enqueue("B.xaml", "<b/>", {})
+        await asyncio.sleep(0.1)
+        return job_id
+
+    job_id = run(main())
+    assert store.get(job_id)["status"] == QUEUED
+    with store._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0] == 2
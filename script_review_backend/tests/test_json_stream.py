@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from fake_services import FAKE_REVIEW
+from file_utils import JSONStreamParser, extract_json_from_text
+from gemini_client import stream_gemini_api
+
+REVIEW = {
+    "tool": "UiPath",
+    "compliance_score": 64,
+    "issues": ["Selector uses {idx} and [brackets]", 'Message says "done} too early"', "Path C:\\temp\\out"],
+    "recommendations": ["Use {{anchors}}"],
+}
+
+
+def feed_all(text: str, size: int) -> list:
+    parser = JSONStreamParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return events
+
+
+def items(events: list, key: str) -> list:
+    return [value for kind, k, value in events if kind == "item" and k == key]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 10 ** 6])
+def test_split_across_fragments(size):
+    events = feed_all(json.dumps(REVIEW), size)
+    assert events[-1] == ("done", None, REVIEW)
+    assert items(events, "issues") == REVIEW["issues"]
+    assert items(events, "recommendations") == REVIEW["recommendations"]
+    assert ("field", "compliance_score", 64) in events
+
+
+def test_braces_and_brackets_inside_strings_are_ignored():
+    text = '{"issues": ["a } b ] c { d ["], "compliance_score": 1}'
+    assert extract_json_from_text(text) == {"issues": ["a } b ] c { d ["], "compliance_score": 1}
+
+
+def test_escaped_quotes_do_not_end_a_string():
+    text = r'{"issues": ["say \"hi}\" twice", "x\\"], "tool": "UiPath"}'
+    assert extract_json_from_text(text)["issues"] == ['say "hi}" twice', "x\\"]
+
+
+def test_prose_and_fences_around_the_object():
+    text = "Here is the review:\n```json\n" + json.dumps(REVIEW, indent=2) + "\n```\nLet me know {if} needed."
+    assert extract_json_from_text(text) == REVIEW
+
+
+def test_nothing_after_the_object_is_parsed():
+    parser = JSONStreamParser()
+    parser.feed('{"tool": "UiPath"} {"tool": "Blue Prism"}')
+    assert parser.feed('{"tool": "other"}') == []
+    assert parser.result == {"tool": "UiPath"}
+
+
+@pytest.mark.parametrize("text, error", [("no json here", "JSON not found"), ('{"issues": ["open"', "Unbalanced JSON")])
+def test_missing_or_truncated_object(text, error):
+    with pytest.raises(ValueError, match=error):
+        extract_json_from_text(text)
+
+
+def test_sse_events_are_reassembled(gemini, run):
+    async def collect():
+        url = f"{gemini.url}/v1beta/models/fake:streamGenerateContent"
+        return [fragment async for fragment in stream_gemini_api("review this", url, "fake")]
+
+    fragments = run(collect())
+    assert len(fragments) > 1
+    assert json.loads("".join(fragments)) == FAKE_REVIEW
+
+
+def test_stream_review_pushes_items_before_the_result(reviewer, run):
+    import review_service
+    from benchmark import make_xaml
+
+    async def collect():
+        return [event async for event in review_service.stream_review("Main.xaml", make_xaml(5000, 1), "llm")]
+
+    events = run(collect())
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "meta" and kinds[-1] == "result"
+    assert [data["value"] for kind, data in events if kind == "issue"] == FAKE_REVIEW["issues"]
+    assert events[-1][1]["result"]["compliance_score"] == FAKE_REVIEW["compliance_score"]
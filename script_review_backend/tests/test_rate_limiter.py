@@ -0,0 +1,59 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimited, RateLimiter, RateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RateStore(str(tmp_path / "rate.sqlite3"))
+
+
+def test_request_bucket_starts_full_then_runs_dry(store):
+    for _ in range(60):
+        assert store.take("gemini", 60, 0, 0) == 0
+    wait = store.take("gemini", 60, 0, 0)
+    assert 0 < wait <= 1
+
+
+def test_token_bucket_waits_for_refill(store):
+    assert store.take("gemini", 0, 600, 500) == 0
+    # 100 tokens left, refilling at 10/s
+    assert store.take("gemini", 0, 600, 500) == pytest.approx(40, abs=1)
+
+
+def test_dry_run_takes_nothing(store):
+    assert store.take("gemini", 0, 600, 500, dry_run=True) == 0
+    assert store.take("gemini", 0, 600, 600) == 0
+
+
+def test_oversized_call_runs_once_the_bucket_is_full(store):
+    assert store.take("gemini", 0, 600, 6000) == 0
+    assert store.take("gemini", 0, 600, 10) > 0
+
+
+def test_pause_blocks_until_retry_after(store):
+    store.pause("gemini", 5)
+    assert store.take("gemini", 60, 0, 0) == pytest.approx(5, abs=0.5)
+
+
+def test_buckets_are_per_backend(store):
+    store.pause("gemini", 5)
+    assert store.take("local", 60, 0, 0) == 0
+
+
+def test_limiter_admits_within_quota(store, run):
+    limiter = RateLimiter("gemini", rpm=60, tpm=0, store=store)
+    run(limiter.acquire(100))
+    assert limiter.queued == 0
+
+
+def test_limiter_sheds_calls_that_would_wait_too_long(store, run, monkeypatch):
+    monkeypatch.setitem(rate_limiter.MAX_WAIT_SECONDS, "interactive", 0.1)
+    limiter = RateLimiter("gemini", rpm=0, tpm=600, store=store)
+    run(limiter.acquire(600, "interactive"))
+
+    with pytest.raises(RateLimited) as info:
+        run(limiter.acquire(600, "interactive"))
+    assert info.value.retry_after > 0.1
+    assert limiter.queued == 0
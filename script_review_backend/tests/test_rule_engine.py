@@ -0,0 +1,84 @@
+from xml.parsers import expat
+
+from rule_engine import residual_content, run_rules
+
+WORKFLOW = """<Activity xmlns="http://schemas.microsoft.com/netfx/2009/xaml/activities"
+    xmlns:x="http://schemas.microsoft.com/winfx/2006/xaml">
+  <Sequence DisplayName="Log in">
+    <Sequence.Variables>
+      %s
+    </Sequence.Variables>
+  </Sequence>
+</Activity>"""
+
+
+def credential_issues(variable: str) -> list:
+    findings = run_rules(WORKFLOW % variable, "UiPath")
+    return [f["issue"] for f in findings if f["rule"] == "hardcoded-credential"]
+
+
+def test_credential_variable_with_literal_default_is_reported():
+    issues = credential_issues('<Variable x:TypeArguments="x:String" Default="hunter2" Name="ApiToken" />')
+    assert issues == ["Variable 'ApiToken' has a hard-coded credential as its default value."]
+
+
+def test_expression_and_boolean_defaults_are_not_credentials():
+    assert not credential_issues('<Variable x:TypeArguments="x:String" Default="[in_Password]" Name="Password" />')
+    assert not credential_issues('<Variable x:TypeArguments="x:Boolean" Default="True" Name="UseToken" />')
+
+
+def test_literal_default_on_other_variables_is_fine():
+    assert not credential_issues('<Variable x:TypeArguments="x:String" Default="ACME" Name="Customer" />')
+
+
+RESIDUAL_XAML = """<Activity xmlns="http://schemas.microsoft.com/netfx/2009/xaml/activities"
+    xmlns:ui="http://schemas.uipath.com/workflow/activities"
+    xmlns:x="http://schemas.microsoft.com/winfx/2006/xaml">
+  <Sequence DisplayName="Log in">
+    <Sequence.Variables>
+      <Variable x:TypeArguments="x:String" Default="hunter2" Name="ApiToken" />
+      <Variable x:TypeArguments="x:String" Name="Leftover">
+        <Variable.Default><Literal x:TypeArguments="x:String" Value="unused" /></Variable.Default>
+      </Variable>
+      <Variable x:TypeArguments="x:String" Default="ACME" Name="Customer" />
+    </Sequence.Variables>
+    <ui:TypeInto DisplayName="Enter customer" Text="[Customer]" />
+    <ui:TypeInto DisplayName="Enter token" Text="[ApiToken]" />
+    <ui:TypeSecureText DisplayName="Enter password" Password="s3cret" />
+  </Sequence>
+</Activity>"""
+
+RESIDUAL_BPRELEASE = """<process name="Login">
+  <stage stageid="1" name="Password" type="Data"><datatype>password</datatype><initialvalue>s3cret</initialvalue></stage>
+  <stage stageid="2" name="Leftover" type="Data"><datatype>text</datatype><initialvalue>x</initialvalue></stage>
+  <stage stageid="3" name="Customer" type="Data"><datatype>text</datatype><initialvalue>ACME</initialvalue></stage>
+  <stage stageid="4" name="Log in" type="Calculation"><calculation expression="[Customer] &amp; [Password]" stage="Customer" /></stage>
+</process>"""
+
+
+def test_residual_drops_unused_variables_and_masks_credentials():
+    findings = run_rules(RESIDUAL_XAML, "UiPath")
+    residual = residual_content(RESIDUAL_XAML, "UiPath", findings)
+
+    assert "Leftover" not in residual
+    assert 'Default="ACME" Name="Customer"' in residual
+    assert "hunter2" not in residual and 'Default="***" Name="ApiToken"' in residual
+    assert "s3cret" not in residual and 'Password="***"' in residual
+    # Activities are sent whole and the result still parses
+    assert residual.count("<ui:Type") == 3
+    expat.ParserCreate().Parse(residual, True)
+
+
+def test_residual_blue_prism_data_items():
+    findings = run_rules(RESIDUAL_BPRELEASE, "Blue Prism")
+    residual = residual_content(RESIDUAL_BPRELEASE, "Blue Prism", findings)
+
+    assert 'name="Leftover"' not in residual
+    assert "<initialvalue>ACME</initialvalue>" in residual
+    assert "s3cret" not in residual and "<initialvalue>***</initialvalue>" in residual
+    expat.ParserCreate().Parse(residual, True)
+
+
+def test_malformed_workflow_is_sent_unchanged():
+    content = "<Activity><Sequence DisplayName='x'>"
+    assert residual_content(content, "UiPath", run_rules(content, "UiPath")) == content
@@ -0,0 +1,49 @@
+import pytest
+
+import review_service
+from benchmark import make_xaml
+
+WORKFLOW = make_xaml(20000, seed=1)
+# Another copy of the same template with one Assign value edited
+COPY = WORKFLOW.replace('"value ', '"edited value ', 1)
+
+
+@pytest.fixture(autouse=True)
+def similarity_on(monkeypatch):
+    monkeypatch.setattr(review_service, "SIMILARITY_REVIEW", True)
+
+
+def review(run, filename, content, workflow_id=None):
+    json_obj, _, meta = run(review_service.review_content(filename, content, "llm", workflow_id))
+    return json_obj, meta
+
+
+def test_upload_without_workflow_id_feeds_the_index(reviewer, run):
+    review(run, "Main.xaml", WORKFLOW)
+    _, meta = review(run, "Main.xaml", COPY)
+
+    assert meta["similarity"]["matched"].startswith("sha256:")
+    assert meta["similarity"]["score"] >= review_service.SIMILARITY_THRESHOLD
+    assert meta["incremental"]["changed"] == 1
+    # The second call only carried the changed activity
+    assert reviewer.stats["calls"] == 2
+    assert reviewer.stats["prompt_chars"] < 2 * len(WORKFLOW)
+
+
+def test_versions_are_still_only_tracked_by_workflow_id(reviewer, run):
+    review(run, "Main.xaml", WORKFLOW)
+    _, meta = review(run, "Main.xaml", COPY, workflow_id="proj/Main.xaml")
+    # Found through the index, not as an earlier version of proj/Main.xaml
+    assert "similarity" in meta
+
+    _, meta = review(run, "Main.xaml", WORKFLOW, workflow_id="proj/Main.xaml")
+    assert "similarity" not in meta
+    assert meta["incremental"]["changed"] == 1
+
+
+def test_unrelated_workflow_gets_a_full_review(reviewer, run):
+    review(run, "Main.xaml", WORKFLOW)
+    _, meta = review(run, "Other.xaml", make_xaml(20000, seed=2))
+
+    assert "similarity" not in meta
+    assert meta["incremental"]["full_review"]
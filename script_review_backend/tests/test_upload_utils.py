@@ -0,0 +1,109 @@
+import io
+import zipfile
+
+import pytest
+from starlette.datastructures import UploadFile
+
+import upload_utils
+from upload_utils import StreamDecoder, UploadTooLarge, detect_encoding, read_archive, read_stream, read_upload
+
+XAML = '<?xml version="1.0"?><Activity DisplayName="Café – naïve ✓"><Sequence /></Activity>'
+
+
+@pytest.mark.parametrize("raw, encoding", [
+    (b"\xef\xbb\xbf" + XAML.encode("utf-8"), "utf-8-sig"),
+    (b"\xff\xfe" + XAML.encode("utf-16-le"), "utf-16"),
+    (b"\xfe\xff" + XAML.encode("utf-16-be"), "utf-16"),
+    (XAML.encode("utf-16-le"), "utf-16-le"),
+    (XAML.encode("utf-16-be"), "utf-16-be"),
+    (b'<?xml version="1.0" encoding="windows-1252"?><a/>', "cp1252"),
+    # Designers write utf-16 into the declaration of files saved as UTF-8
+    (b'<?xml version="1.0" encoding="utf-16"?><a/>', "utf-8"),
+    (b'<?xml version="1.0" encoding="no-such-codec"?><a/>', "utf-8"),
+    (XAML.encode("utf-8"), "utf-8"),
+])
+def test_detect_encoding(raw, encoding):
+    assert detect_encoding(raw[:1024]) == encoding
+
+
+@pytest.mark.parametrize("codec", ["utf-8-sig", "utf-16"])
+def test_bom_is_stripped(codec):
+    assert read_stream(io.BytesIO(XAML.encode(codec))) == XAML
+
+
+def test_declared_encoding_is_used():
+    raw = '<?xml version="1.0" encoding="windows-1252"?><a b="€"/>'.encode("cp1252")
+    assert read_stream(io.BytesIO(raw)) == raw.decode("cp1252")
+
+
+def test_multibyte_character_split_across_chunks():
+    raw = XAML.encode("utf-8")
+    split = raw.index("✓".encode("utf-8")) + 1
+    decoder = StreamDecoder()
+    decoder.feed(raw[:split])
+    decoder.feed(raw[split:])
+    assert decoder.finish() == XAML
+
+
+def test_stream_reads_in_small_chunks(monkeypatch):
+    monkeypatch.setattr(upload_utils, "UPLOAD_CHUNK_BYTES", 3)
+    assert read_stream(io.BytesIO(XAML.encode("utf-16"))) == XAML
+    assert read_stream(io.BytesIO(XAML.encode("utf-8"))) == XAML
+
+
+def test_invalid_utf8_falls_back_to_latin1():
+    raw = b"<a>\xff\xfe not utf-8 \x80</a>"
+    assert read_stream(io.BytesIO(raw)) == raw.decode("latin1")
+
+
+def test_stream_decoder_enforces_limit():
+    decoder = StreamDecoder(max_bytes=10, name="Main.xaml")
+    decoder.feed(b"0123456789")
+    with pytest.raises(UploadTooLarge, match="Main.xaml"):
+        decoder.feed(b"x")
+
+
+def test_read_upload(run, monkeypatch):
+    monkeypatch.setattr(upload_utils, "UPLOAD_CHUNK_BYTES", 5)
+    raw = XAML.encode("utf-8")
+    upload = UploadFile(io.BytesIO(raw), filename="Main.xaml")
+    assert run(read_upload(upload)) == XAML
+
+    upload = UploadFile(io.BytesIO(raw), filename="Main.xaml")
+    with pytest.raises(UploadTooLarge):
+        run(read_upload(upload, max_bytes=len(raw) - 1))
+
+
+def make_zip(members: dict) -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+def test_read_archive_keeps_workflow_files():
+    archive = make_zip({
+        "Main.xaml": XAML.encode("utf-8"),
+        "sub/Login.XAML": XAML.encode("utf-16"),
+        "Release.bprelease": b"<bpr:release/>",
+        "project.json": b"{}",
+        "sub/": b"",
+    })
+    assert read_archive(archive) == [
+        ("Main.xaml", XAML),
+        ("sub/Login.XAML", XAML),
+        ("Release.bprelease", "<bpr:release/>"),
+    ]
+
+
+def test_read_archive_caps_declared_size():
+    # Highly compressible members: the archive is tiny, the declared sizes add up past the cap
+    archive = make_zip({"A.xaml": b" " * 600, "B.xaml": b" " * 600, "big.bin": b" " * 10000})
+    assert len(archive.getvalue()) < 1000
+    with pytest.raises(UploadTooLarge, match="Archive"):
+        read_archive(archive, max_bytes=1000)
+    # Non-workflow members don't count towards the limit
+    archive = make_zip({"A.xaml": b" " * 600, "big.bin": b" " * 10000})
+    assert [name for name, _ in read_archive(archive, max_bytes=1000)] == ["A.xaml"]
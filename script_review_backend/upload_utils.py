@@ -0,0 +1,141 @@
+import os
+import re
+import time
+import codecs
+import zipfile
+
+from metrics_utils import record, BYTES
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+WORKFLOW_EXTENSIONS = (".xaml", ".bprelease")
+
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+XML_DECL_ENCODING = re.compile(rb"""^\s*<\?xml[^>]*encoding=["']([\w.-]+)["']""")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def detect_encoding(head: bytes) -> str:
+    """Pick a codec from the first bytes of a file (BOM, NUL pattern, XML declaration)."""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    # UTF-16 without BOM: every other byte of ASCII markup is NUL
+    if len(head) >= 4 and head[0] == 0 and head[2] == 0:
+        return "utf-16-be"
+    if len(head) >= 4 and head[1] == 0 and head[3] == 0:
+        return "utf-16-le"
+    m = XML_DECL_ENCODING.match(head)
+    if m:
+        declared = m.group(1).decode("ascii").lower()
+        # Designers often write encoding="utf-16" into files saved as UTF-8
+        if not declared.startswith("utf-16"):
+            try:
+                return codecs.lookup(declared).name
+            except LookupError:
+                pass
+    return "utf-8"
+
+
+class StreamDecoder:
+    """Incrementally decode byte chunks into text with a hard size limit."""
+
+    def __init__(self, max_bytes: int = UPLOAD_MAX_BYTES, encoding: str = None, name: str = ""):
+        self.max_bytes = max_bytes
+        self.encoding = encoding
+        self.name = name
+        self.size = 0
+        self._decoder = None
+        self._parts = []
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"{self.name or 'Upload'} exceeds the {self.max_bytes} byte limit")
+        if self._decoder is None:
+            self.encoding = self.encoding or detect_encoding(chunk[:1024])
+            self._decoder = codecs.getincrementaldecoder(self.encoding)("strict")
+        self._parts.append(self._decoder.decode(chunk))
+
+    def finish(self) -> str:
+        if self._decoder is not None:
+            self._parts.append(self._decoder.decode(b"", final=True))
+        text = "".join(self._parts)
+        self._parts = []
+        return text
+
+
+def read_stream(fileobj, max_bytes: int = UPLOAD_MAX_BYTES, name: str = "") -> str:
+    """Decode a seekable binary file object chunk by chunk (latin1 fallback)."""
+    for encoding in (None, "latin1"):
+        fileobj.seek(0)
+        decoder = StreamDecoder(max_bytes, encoding, name)
+        try:
+            while True:
+                chunk = fileobj.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    return decoder.finish()
+                decoder.feed(chunk)
+        except (UnicodeDecodeError, LookupError):
+            continue
+
+
+async def read_upload(file, max_bytes: int = UPLOAD_MAX_BYTES) -> str:
+    """Read a FastAPI UploadFile in chunks without holding the raw bytes in memory.
+
+    Starlette already spools large uploads to a temp file; we decode straight from
+    that spool and re-read it with latin1 if the detected encoding turns out wrong.
+    """
+    read_seconds = decode_seconds = 0.0
+    try:
+        for encoding in (None, "latin1"):
+            await file.seek(0)
+            decoder = StreamDecoder(max_bytes, encoding, file.filename)
+            try:
+                while True:
+                    t0 = time.perf_counter()
+                    chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                    t1 = time.perf_counter()
+                    read_seconds += t1 - t0
+                    if not chunk:
+                        text = decoder.finish()
+                        BYTES.labels("upload").inc(decoder.size)
+                        return text
+                    decoder.feed(chunk)
+                    decode_seconds += time.perf_counter() - t1
+            except (UnicodeDecodeError, LookupError):
+                continue
+    finally:
+        record("upload_read", read_seconds)
+        record("decode", decode_seconds)
+
+
+def is_archive(filename: str) -> bool:
+    return (filename or "").lower().endswith(".zip")
+
+
+def read_archive(fileobj, max_bytes: int = UPLOAD_MAX_BYTES) -> list:
+    """Return [(filename, content)] for the workflow files inside a zip archive.
+
+    max_bytes bounds the total uncompressed size so a zip bomb can't blow up memory.
+    """
+    entries = []
+    total = 0
+    with zipfile.ZipFile(fileobj) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(WORKFLOW_EXTENSIONS):
+                continue
+            total += info.file_size
+            if total > max_bytes:
+                raise UploadTooLarge(f"Archive contents exceed the {max_bytes} byte limit")
+            with zf.open(info) as member:
+                entries.append((info.filename, read_stream(member, max_bytes, info.filename)))
+    return entries
+